@@ -0,0 +1,144 @@
+import argparse
+import concurrent.futures
+import contextlib
+import glob
+import os
+import time
+import traceback
+import centerline_generation
+
+"""
+This script runs centerline_generation.py for every combination of a set of tracks and a set of vehicle parameter files
+in a process pool. Every job exports into its own folder <output_dir>/<map_name>_<params>/ (including its console log),
+a summary table of all jobs is printed and written to <output_dir>/summary.csv.
+"""
+
+
+def run_job(map_path: str,
+            veh_params_file: str,
+            output_dir: str,
+            export_format: str,
+            no_cache: bool) -> dict:
+    """
+    Run a single job (executed in a worker process). Failures are reported in the summary instead of being raised.
+    """
+
+    map_name = os.path.splitext(os.path.basename(map_path))[0]
+    job_dir = os.path.join(output_dir, map_name + "_" + os.path.splitext(veh_params_file)[0])
+    os.makedirs(job_dir, exist_ok=True)
+
+    summary = {"map_name": map_name,
+               "veh_params_file": veh_params_file,
+               "status": "ok",
+               "output_dir": job_dir}
+
+    t_start = time.perf_counter()
+
+    with open(os.path.join(job_dir, "log.txt"), 'w') as fh, contextlib.redirect_stdout(fh):
+        try:
+            summary.update(centerline_generation.generate_centerline(map_name=map_name,
+                                                                     map_path=map_path,
+                                                                     veh_params_file=veh_params_file,
+                                                                     output_dir=job_dir,
+                                                                     export_format=export_format,
+                                                                     no_plots=True,
+                                                                     no_cache=no_cache))
+        except Exception as e:
+            traceback.print_exc(file=fh)
+            summary["status"] = "failed: " + (str(e).splitlines()[0] if str(e) else type(e).__name__)
+
+    summary["runtime"] = time.perf_counter() - t_start
+
+    return summary
+
+
+def run_batch(map_paths: list,
+              veh_params_files: list,
+              output_dir: str,
+              export_format: str = 'csv',
+              max_workers: int = None,
+              no_cache: bool = False) -> list:
+    """
+    Run all combinations of tracks and vehicle parameter files with at most max_workers concurrent jobs (number of CPUs
+    if None) and return the summaries of the jobs in the order of the combinations.
+    """
+
+    jobs = [(map_path, veh_params_file) for map_path in map_paths for veh_params_file in veh_params_files]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_job, map_path, veh_params_file, output_dir, export_format, no_cache)
+                   for map_path, veh_params_file in jobs]
+
+        return [future.result() for future in futures]
+
+
+def write_summary(summaries: list,
+                  file_path: str) -> str:
+    """
+    Write the job summaries to a .csv file and return them as text table.
+    """
+
+    columns = ["map_name", "veh_params_file", "status", "no_points", "track_length", "kappa_max", "runtime"]
+    rows = []
+
+    for summary in summaries:
+        row = []
+
+        for column in columns:
+            value = summary.get(column, "")
+            row.append("%.3f" % value if isinstance(value, float) else str(value))
+
+        rows.append(row)
+
+    with open(file_path, 'w') as fh:
+        fh.write(",".join(columns) + "\n")
+
+        for row in rows:
+            fh.write(",".join(row) + "\n")
+
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+
+    return "\n".join(["  ".join(entry.ljust(width) for entry, width in zip(row, widths))
+                      for row in [columns] + rows])
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Generate the centerlines of several tracks with several vehicle '
+                                                 'parameter files in parallel.')
+    parser.add_argument('--tracks', type=str, nargs='+', default=['grob_tracks/*.csv'],
+                        help='Track files (glob patterns are expanded), defaults to all tracks in grob_tracks/')
+    parser.add_argument('--veh_params_files', type=str, nargs='+', default=None,
+                        help='Vehicle parameter files in params/, defaults to all .ini files in params/')
+    parser.add_argument('--output_dir', type=str, default='outputs/batch', help='Folder of the job folders')
+    parser.add_argument('--export_format', type=str, default='csv', choices=['csv', 'npy'],
+                        help='Format of the exported files')
+    parser.add_argument('--max_workers', type=int, default=None,
+                        help='Maximum number of concurrent jobs, defaults to the number of CPUs')
+    parser.add_argument('--no_cache', action='store_true', help='Do not use the stage cache')
+    args = parser.parse_args(argv)
+
+    module_path = os.path.dirname(os.path.abspath(__file__))
+
+    map_paths = sorted(set(path for pattern in args.tracks for path in glob.glob(pattern)))
+    veh_params_files = args.veh_params_files
+    if veh_params_files is None:
+        veh_params_files = sorted(os.path.basename(path) for path in glob.glob(os.path.join(module_path, "params",
+                                                                                            "*.ini")))
+
+    if not map_paths:
+        raise ValueError("No track files found!")
+
+    t_start = time.perf_counter()
+    summaries = run_batch(map_paths=[os.path.abspath(path) for path in map_paths],
+                          veh_params_files=veh_params_files,
+                          output_dir=os.path.abspath(args.output_dir),
+                          export_format=args.export_format,
+                          max_workers=args.max_workers,
+                          no_cache=args.no_cache)
+
+    print(write_summary(summaries=summaries, file_path=os.path.join(args.output_dir, "summary.csv")))
+    print("INFO: Finished %i jobs in %.2fs" % (len(summaries), time.perf_counter() - t_start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+Startup benchmark guarding against import regressions of the command line interface. Run it from the repository root:
+
+python -m benchmarks.bench_startup --max_help_ms 300
+
+It starts centerline_generation.py in fresh interpreters and measures the wall time (fastest of repeats runs) of
+- --help (no numeric dependency may be imported)
+- a plot-disabled run replayed from the stage cache (scipy and matplotlib must not be imported)
+- a plot-disabled run without cache (matplotlib must not be imported)
+
+The script exits with code 1 if a forbidden module was imported or a time exceeds its limit.
+"""
+
+# code run in the probe interpreters, prints the loaded heavy modules as last line
+PROBE = """
+import sys, json
+sys.path.insert(0, %r)
+import centerline_generation
+try:
+    centerline_generation.main(sys.argv[1:])
+except SystemExit:
+    pass
+print(json.dumps(sorted(name for name in ("numpy", "scipy", "matplotlib") if name in sys.modules)))
+"""
+
+
+def run_probe(argv: list,
+              repeats: int) -> tuple:
+    """
+    Run centerline_generation.main(argv) repeats times in fresh interpreters and return the fastest wall time in ms and
+    the heavy modules loaded by the last run.
+    """
+
+    repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    modules = []
+
+    for _ in range(repeats):
+        t_start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", PROBE % repo_path] + argv, cwd=repo_path,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        times.append((time.perf_counter() - t_start) * 1000.0)
+
+        if result.returncode != 0:
+            raise RuntimeError("Startup probe %s failed:\n%s" % (" ".join(argv), result.stderr))
+
+        modules = json.loads(result.stdout.strip().splitlines()[-1])
+
+    return min(times), modules
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of centerline_generation.py.')
+    parser.add_argument('--map_name', type=str, default='e7_floor5_square', help='Track of the pipeline runs')
+    parser.add_argument('--repeats', type=int, default=5, help='Runs per probe (the fastest one is reported)')
+    parser.add_argument('--max_help_ms', type=float, default=None, help='Limit of the --help startup time in ms')
+    parser.add_argument('--max_cached_ms', type=float, default=None,
+                        help='Limit of the time of a run replayed from the stage cache in ms')
+    args = parser.parse_args(argv)
+
+    failures = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_argv = ["--map_name", args.map_name, "--no_plots", "--output_dir", tmp_dir,
+                    "--cache_dir", os.path.join(tmp_dir, "cache")]
+
+        # the uncached run fills the stage cache of the cached run
+        probes = [("help", ["--help"], ("numpy", "scipy", "matplotlib"), args.max_help_ms),
+                  ("uncached", run_argv + ["--no_cache"], ("matplotlib",), None),
+                  ("fill_cache", run_argv, ("matplotlib",), None),
+                  ("cached", run_argv, ("scipy", "matplotlib"), args.max_cached_ms)]
+
+        for name, probe_argv, forbidden, max_ms in probes:
+            wall_ms, modules = run_probe(argv=probe_argv, repeats=1 if name == "fill_cache" else args.repeats)
+
+            if name == "fill_cache":
+                continue
+
+            print("%-10s %9.1f ms  imported: %s" % (name, wall_ms, ", ".join(modules) or "-"))
+
+            for module in forbidden:
+                if module in modules:
+                    failures.append("%s imports %s" % (name, module))
+
+            if max_ms is not None and wall_ms > max_ms:
+                failures.append("%s takes %.1f ms (limit %.1f ms)" % (name, wall_ms, max_ms))
+
+    for failure in failures:
+        print("REGRESSION: " + failure)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
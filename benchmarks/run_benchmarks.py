@@ -0,0 +1,326 @@
+import numpy as np
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import scipy
+import centerline_generation
+from benchmarks import synthetic_tracks
+from helper_functions import calc_splines, calc_spline_lengths, interp_splines, calc_head_curv_an, interp_track
+from helper_functions import check_normals_crossing, spline_approximation, check_traj, stage_profiler
+from helper_functions import calc_splines_segmented
+
+"""
+Benchmark harness (runs offline on the CPU). Run it from the repository root:
+
+python -m benchmarks.run_benchmarks --sizes 1000 10000 --baseline benchmark_baseline.json
+
+It measures wall time, CPU time and peak traced memory of
+- the helper functions on synthetic tracks of the given sizes (keys functions/<function>/<shape>/<no_points>)
+- every stage of the end-to-end pipeline on the shipped tracks in grob_tracks/ and on the synthetic tracks (keys
+  pipeline/<track>/<stage>)
+
+For every function and stage the empirical complexity exponent p of time ~ no_points^p is fitted over the sizes. If a
+baseline (the results file of an earlier run) is given, stages slower than threshold times the baseline are reported as
+regressions and the script exits with code 1.
+"""
+
+# vehicle parameters of the pipeline benchmarks (the synthetic tracks have a point spacing of 0.1m)
+BENCH_PARS = {"stepsize_opts": {"stepsize_prep": 0.1, "stepsize_reg": 0.3, "stepsize_interp_after_opt": 0.2},
+              "reg_smooth_opts": {"k_reg": 3, "s_reg": 1},
+              "veh_params": {"length": 0.568, "width": 0.296, "curvlim": 3.0}}
+
+
+def bench_functions(shapes: list,
+                    sizes: list,
+                    repeats: int) -> dict:
+    """
+    Benchmark the helper functions on the synthetic tracks.
+    """
+
+    results = {}
+
+    for shape in shapes:
+        for no_points in sizes:
+            track = synthetic_tracks.gen_track(shape=shape, no_points=no_points)
+            path_cl = np.vstack((track[:, :2], track[0, :2]))
+
+            # inputs of the functions are the outputs of the previous ones
+            data = {}
+            funcs = [("interp_track",
+                      lambda: interp_track.interp_track(track=track, stepsize=0.1)),
+                     ("spline_approximation",
+                      lambda: spline_approximation.spline_approximation(track=track, k_reg=3, s_reg=1,
+                                                                        stepsize_prep=0.1, stepsize_reg=0.3)),
+                     ("calc_splines",
+                      lambda: data.update(zip(("coeffs_x", "coeffs_y", "_", "normvec"),
+                                              calc_splines.calc_splines(path=path_cl)))),
+                     ("calc_splines_segmented",
+                      lambda: calc_splines_segmented.calc_splines_segmented(path=path_cl, no_segments=4)),
+                     ("calc_spline_lengths",
+                      lambda: data.update(spline_lengths=calc_spline_lengths.calc_spline_lengths(
+                          coeffs_x=data["coeffs_x"], coeffs_y=data["coeffs_y"]))),
+                     ("interp_splines",
+                      lambda: data.update(zip(("points", "inds", "t", "s"),
+                                              interp_splines.interp_splines(coeffs_x=data["coeffs_x"],
+                                                                            coeffs_y=data["coeffs_y"],
+                                                                            spline_lengths=data["spline_lengths"],
+                                                                            stepsize_approx=0.2)))),
+                     ("calc_head_curv_an",
+                      lambda: data.update(zip(("psi", "kappa"),
+                                              calc_head_curv_an.calc_head_curv_an(coeffs_x=data["coeffs_x"],
+                                                                                  coeffs_y=data["coeffs_y"],
+                                                                                  ind_spls=data["inds"],
+                                                                                  t_spls=data["t"])))),
+                     ("check_normals_crossing",
+                      lambda: check_normals_crossing.check_normals_crossing(track=track,
+                                                                            normvec_normalized=data["normvec"])),
+                     ("check_traj",
+                      lambda: check_traj.check_traj(reftrack=track,
+                                                    reftrack_normvec_normalized=data["normvec"],
+                                                    trajectory=np.column_stack((data["s"], data["points"],
+                                                                                data["psi"], data["kappa"])),
+                                                    length_veh=0.568,
+                                                    width_veh=0.296,
+                                                    debug=False,
+                                                    curvlim=3.0))]
+
+            for name, func in funcs:
+                results["functions/%s/%s/%i" % (name, shape, no_points)] = \
+                    dict(_time_call(func=func, repeats=repeats), no_points=no_points)
+
+    return results
+
+
+def bench_pipeline(track_files: dict,
+                   repeats: int,
+                   tmp_dir: str) -> dict:
+    """
+    Benchmark the stages of the end-to-end pipeline on the given tracks {name: (file path, number of points)}.
+    """
+
+    results = {}
+
+    for name, (file_path, no_points) in track_files.items():
+        records = {}
+
+        def run(profiler: stage_profiler.StageProfiler) -> None:
+            with _quiet():
+                centerline_generation.generate_centerline(map_name=name,
+                                                          map_path=file_path,
+                                                          output_dir=tmp_dir,
+                                                          no_plots=True,
+                                                          no_cache=True,
+                                                          debug=False,
+                                                          profiler=profiler,
+                                                          pars=BENCH_PARS)
+
+        # timing runs without memory tracing (the fastest run counts), one run with memory tracing
+        for _ in range(repeats):
+            profiler = stage_profiler.StageProfiler(trace_memory=False)
+            with profiler.stage("total"):
+                run(profiler=profiler)
+
+            for record in profiler.records:
+                key = "pipeline/%s/%s" % (name, record["path"])
+                if key not in records or record["wall_time"] < records[key]["wall_time"]:
+                    records[key] = {"wall_time": record["wall_time"],
+                                    "cpu_time": record["cpu_time"],
+                                    "no_points": no_points}
+
+        profiler = stage_profiler.StageProfiler(trace_memory=True)
+        with profiler.stage("total"):
+            run(profiler=profiler)
+        profiler.close()
+
+        for record in profiler.records:
+            records["pipeline/%s/%s" % (name, record["path"])]["peak_memory"] = record["peak_memory"]
+
+        results.update(records)
+
+    return results
+
+
+def fit_complexity(results: dict,
+                   min_time: float = 1e-4) -> dict:
+    """
+    Fit the exponent p of wall_time ~ no_points^p (least squares in log-log scale) for every function/stage measured on
+    the synthetic tracks at two or more sizes. Measurements below min_time are ignored (timer resolution).
+    """
+
+    groups = {}
+
+    for key, result in results.items():
+        parts = key.split("/")
+
+        if parts[0] == "functions":
+            group = "/".join(parts[:3])
+        elif parts[0] == "pipeline" and parts[1].rsplit("_", 1)[0] in synthetic_tracks.SHAPES:
+            group = "pipeline/%s/%s" % (parts[1].rsplit("_", 1)[0], "/".join(parts[2:]))
+        else:
+            continue
+
+        if result["wall_time"] >= min_time:
+            groups.setdefault(group, []).append((result["no_points"], result["wall_time"]))
+
+    complexity = {}
+
+    for group, values in sorted(groups.items()):
+        values = np.array(values, dtype=float)
+
+        if np.unique(values[:, 0]).size >= 2:
+            complexity[group] = float(np.polyfit(np.log(values[:, 0]), np.log(values[:, 1]), 1)[0])
+
+    return complexity
+
+
+def compare_baseline(results: dict,
+                     baseline: dict,
+                     threshold: float,
+                     min_delta: float) -> list:
+    """
+    Return the keys [key, wall time baseline, wall time, ratio] of all measurements slower than threshold times the
+    baseline (and at least min_delta seconds slower to ignore the noise of very fast stages).
+    """
+
+    regressions = []
+
+    for key, result in sorted(results.items()):
+        if key not in baseline:
+            continue
+
+        t_base = baseline[key]["wall_time"]
+        t_new = result["wall_time"]
+
+        if t_new > threshold * t_base and t_new - t_base > min_delta:
+            regressions.append([key, t_base, t_new, t_new / t_base])
+
+    return regressions
+
+
+def _time_call(func,
+               repeats: int) -> dict:
+    # fastest of repeats runs without memory tracing, afterwards one run with memory tracing
+    result = {"wall_time": np.inf, "cpu_time": np.inf}
+
+    for _ in range(repeats):
+        profiler = stage_profiler.StageProfiler(trace_memory=False)
+        with profiler.stage("call"), _quiet():
+            func()
+
+        result["wall_time"] = min(result["wall_time"], profiler.records[0]["wall_time"])
+        result["cpu_time"] = min(result["cpu_time"], profiler.records[0]["cpu_time"])
+
+    profiler = stage_profiler.StageProfiler(trace_memory=True)
+    with profiler.stage("call"), _quiet():
+        func()
+    profiler.close()
+
+    result["peak_memory"] = profiler.records[0]["peak_memory"]
+
+    return result
+
+
+@contextlib.contextmanager
+def _quiet():
+    # suppress the console output of the pipeline
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the helper functions and the centerline pipeline.')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e3, 1e4, 1e5, 1e6],
+                        help='Numbers of points of the synthetic tracks')
+    parser.add_argument('--shapes', type=str, nargs='+', default=list(synthetic_tracks.SHAPES),
+                        choices=synthetic_tracks.SHAPES, help='Shapes of the synthetic tracks')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of timing runs (the fastest one counts)')
+    parser.add_argument('--no_functions', action='store_true', help='Skip the benchmarks of the helper functions')
+    parser.add_argument('--no_pipeline', action='store_true', help='Skip the benchmarks of the pipeline')
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='Results file')
+    parser.add_argument('--baseline', type=str, default='', help='Results file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Report a regression if a measurement is slower than threshold times the baseline')
+    parser.add_argument('--min_delta', type=float, default=0.005,
+                        help='Ignore regressions smaller than this number of seconds')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes]
+    module_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+
+    if not args.no_functions:
+        results.update(bench_functions(shapes=args.shapes, sizes=sizes, repeats=args.repeats))
+
+    if not args.no_pipeline:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            track_files = {}
+
+            for file_path in sorted(glob.glob(os.path.join(module_path, "grob_tracks", "*.csv"))):
+                name = os.path.splitext(os.path.basename(file_path))[0]
+                track_files[name] = (file_path, np.loadtxt(file_path, comments='#', delimiter=',').shape[0])
+
+            for shape in args.shapes:
+                for no_points in sizes:
+                    file_path = os.path.join(tmp_dir, "%s_%i.csv" % (shape, no_points))
+                    np.savetxt(file_path, synthetic_tracks.gen_track(shape=shape, no_points=no_points), fmt='%.6f',
+                               delimiter=',', header='x_m,y_m,w_tr_right_m,w_tr_left_m')
+                    track_files["%s_%i" % (shape, no_points)] = (file_path, no_points)
+
+            # the shipped tracks are real-world data, failing ones (e.g. crossed normals) are skipped
+            for name in list(track_files):
+                try:
+                    results.update(bench_pipeline(track_files={name: track_files[name]}, repeats=args.repeats,
+                                                  tmp_dir=tmp_dir))
+                except (IOError, RuntimeError, ValueError) as e:
+                    print("WARNING: Pipeline benchmark of %s failed: %s" % (name, e))
+
+    complexity = fit_complexity(results=results)
+
+    report = {"meta": {"python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "scipy": scipy.__version__,
+                       "machine": platform.machine(),
+                       "processor": platform.processor(),
+                       "sizes": sizes,
+                       "repeats": args.repeats},
+              "results": results,
+              "complexity": complexity}
+
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+
+    # print summary
+    print("%-70s %10s %10s %12s" % ("benchmark", "wall [s]", "cpu [s]", "peak [MB]"))
+    for key, result in sorted(results.items()):
+        print("%-70s %10.4f %10.4f %12.2f" % (key, result["wall_time"], result["cpu_time"],
+                                              result["peak_memory"] / 1e6))
+
+    print("\n%-70s %10s" % ("complexity", "exponent"))
+    for group, exponent in complexity.items():
+        print("%-70s %10.2f" % (group, exponent))
+
+    if args.baseline:
+        with open(args.baseline, 'r') as fh:
+            baseline = json.load(fh)["results"]
+
+        regressions = compare_baseline(results=results, baseline=baseline, threshold=args.threshold,
+                                       min_delta=args.min_delta)
+
+        if regressions:
+            print("\nREGRESSIONS (threshold %.2f):" % args.threshold)
+            for key, t_base, t_new, ratio in regressions:
+                print("%-70s %10.4f -> %10.4f (%.2fx)" % (key, t_base, t_new, ratio))
+
+            sys.exit(1)
+
+        print("\nINFO: No regressions compared to %s" % args.baseline)
+
+
+if __name__ == "__main__":
+    main()
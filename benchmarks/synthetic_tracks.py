@@ -0,0 +1,82 @@
+import numpy as np
+import math
+
+"""
+Parametric test tracks for the benchmarks. All tracks are closed (unclosed representation, i.e. the first point is not
+repeated), have about spacing meters between their points and vary their track widths along the track.
+"""
+
+SHAPES = ("oval", "hairpin", "figure_eight")
+
+
+def gen_track(shape: str,
+              no_points: int,
+              spacing: float = 0.1,
+              width: float = 1.0) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Generate a parametric track with no_points points.
+
+    Inputs:
+    shape:          "oval" (stadium with two straights), "hairpin" (five tight turns) or "figure_eight"
+    no_points:      number of points of the track
+    spacing:        approximate distance between two points in m (the track length scales with no_points)
+    width:          mean track width in m
+
+    Outputs:
+    track:          [x_m, y_m, w_tr_right_m, w_tr_left_m]
+    """
+
+    t = np.linspace(0.0, 2 * math.pi, no_points, endpoint=False)
+
+    if shape == "oval":
+        # stadium: straights of length 2 * r connected by half circles of radius r
+        x, y = _calc_stadium(t=t)
+    elif shape == "hairpin":
+        r = 1.0 + 0.4 * np.cos(5 * t)
+        x, y = r * np.cos(t), r * np.sin(t)
+    elif shape == "figure_eight":
+        # lemniscate of Gerono (the track crosses itself in the origin)
+        x, y = np.cos(t), np.sin(t) * np.cos(t)
+    else:
+        raise ValueError("Unknown track shape %s!" % shape)
+
+    # scale the shape such that the points are about spacing meters apart
+    length = np.sum(np.hypot(np.diff(np.append(x, x[0])), np.diff(np.append(y, y[0]))))
+    scale = no_points * spacing / length
+
+    # varied track widths (the right and left widths vary with different frequencies)
+    w_tr_right = width / 2 * (1.0 + 0.3 * np.sin(3 * t))
+    w_tr_left = width / 2 * (1.0 + 0.3 * np.cos(7 * t))
+
+    return np.column_stack((x * scale, y * scale, w_tr_right, w_tr_left))
+
+
+def _calc_stadium(t: np.ndarray) -> tuple:
+    # arc length parametrization of a stadium with radius 1 and straights of length 2
+    s = t / (2 * math.pi) * (4.0 + 2 * math.pi)
+    x = np.empty(t.size)
+    y = np.empty(t.size)
+
+    # straight (bottom), half circle (right), straight (top), half circle (left)
+    bounds = np.array([2.0, 2.0 + math.pi, 4.0 + math.pi])
+    part = np.searchsorted(bounds, s, side="right")
+
+    m = part == 0
+    x[m], y[m] = -1.0 + s[m], -1.0
+    m = part == 1
+    x[m], y[m] = 1.0 + np.sin(s[m] - 2.0), -np.cos(s[m] - 2.0)
+    m = part == 2
+    x[m], y[m] = 1.0 - (s[m] - 2.0 - math.pi), 1.0
+    m = part == 3
+    x[m], y[m] = -1.0 - np.sin(s[m] - 4.0 - math.pi), np.cos(s[m] - 4.0 - math.pi)
+
+    return x, y
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
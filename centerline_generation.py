@@ -1,200 +1,524 @@
-import numpy as np
 import time
 import json
 import configparser
 import argparse
 import os
-from helper_functions import import_track, prep_track, calc_spline_lengths, interp_splines, calc_head_curv_an
-from helper_functions import check_traj, export_traj_splines, calc_splines, result_plots
+from helper_functions import stage_profiler
 
 """
 This script has to be executed for smmothing the centerline and get the cubic spline interpretation.
 """
 
 
-# Create the parser and add arguments with defaults and explicit names
-parser = argparse.ArgumentParser(description='Generate interpolated and smoothed track centerlines.')
-parser.add_argument('--map_name', type=str, default='e7_floor5_square', help='Name of the map (default: Hockenheim_map)')
-parser.add_argument('--map_path', type=str, default='', help='Path to the map centerline (should be a .csv), defaults to tracks/<map_name>.csv')
-parser.add_argument('--export_path', type=str, default='', help='Path to copy from the filepath in the /outputs')
-
-args = parser.parse_args()
-
-# Use the arguments
-MAP_NAME = args.map_name
-MAP_PATH = args.map_path
-EXPORT_PATH = args.export_path
-
-# ----------------------------------------------------------------------------------------------------------------------
-# USER INPUT -----------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-# choose vehicle parameter file 
-# "f110.ini" for F1TENTH
-# "rosbot.ini" for Rosbot
-file_paths = {"veh_params_file": "f110.ini"}                    
-
-# select track file (including centerline coordinates + track widths) 
-file_paths["track_name"] = MAP_NAME
-
-# initialization of paths 
-file_paths["module"] = os.path.dirname(os.path.abspath(__file__))
-file_paths["module"] = file_paths["module"].replace('\\', '/')
-if MAP_PATH == '':
-    MAP_PATH = os.path.join(file_paths["module"], "grob_tracks", file_paths["track_name"] + ".csv")
-file_paths["track_file"] = MAP_PATH
-
-# create outputs folder(s) 
-os.makedirs(file_paths["module"] + f"/outputs", exist_ok=True)
-file_paths["traj_export"] = os.path.join(file_paths["module"], f"outputs", f"{MAP_NAME}_centerline.csv")
-file_paths["spline_export"] = os.path.join(file_paths["module"], f"outputs", f"{MAP_NAME}_splines.csv")
-
-# ----------------------------------------------------------------------------------------------------------------------
-# IMPORT VEHICLE DEPENDENT PARAMETERS ----------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-# load vehicle parameter file into a "pars" dict 
-parser = configparser.ConfigParser()
-pars = {}
-
-if not parser.read(os.path.join(file_paths["module"], f"params", file_paths["veh_params_file"])):
-    raise ValueError('Specified config file does not exist or is empty!')
-
-pars["stepsize_opts"] = json.loads(parser.get('GENERAL_OPTIONS', 'stepsize_opts'))
-pars["reg_smooth_opts"] = json.loads(parser.get('GENERAL_OPTIONS', 'reg_smooth_opts'))
-pars["veh_params"] = json.loads(parser.get('GENERAL_OPTIONS', 'veh_params'))
-
-# set import options 
-imp_opts = {"flip_imp_track": True,                # flip imported track to reverse direction
-            "set_new_start": True,                  # set new starting point (changes order, not coordinates)
-            "new_start": np.array([0.0, 0.0]),      # [x_m, y_m]
-            "min_track_width": None,                # [m] minimum enforced track width (set None to deactivate)
-            "num_laps": 1}                          # number of laps to be driven (significant with powertrain-option),
-                                                    # only relevant in mintime-optimization
-# debug and plot options 
-debug = True                                    # print console messages
-plot_opts = {"centerline": True,                # plot interpolated and smoothed centerline
-             "imported_bounds": True,           # plot imported bounds (analyze difference to interpolated bounds)
-             "spline_normals": True}           # plot spline normals to check for crossings
-
-# ----------------------------------------------------------------------------------------------------------------------
-# IMPORT TRACK ---------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-# save start time
-t_start = time.perf_counter()
-
-# import track from new starting point
-reftrack_imp = import_track.import_track(imp_opts=imp_opts,
-                                         file_path=file_paths["track_file"],
-                                         width_veh=pars["veh_params"]["width"])
-
-# ----------------------------------------------------------------------------------------------------------------------
-# PREPARE REFTRACK -----------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-reftrack_interp, normvec_normalized_interp, a_interp, coeffs_x_interp, coeffs_y_interp = \
-    prep_track.prep_track(reftrack_imp=reftrack_imp,
-                          reg_smooth_opts=pars["reg_smooth_opts"],
-                          stepsize_opts=pars["stepsize_opts"],
-                          debug=debug,
-                          min_width=imp_opts["min_track_width"],
-                          original_figname = "original_centerline.png",
-                          linear_interpolated_figname = "linear_interpolated_centerline.png",
-                          cubic_spline_figname = "cubic_spline_smoothed_centerline.png")
-
-# ----------------------------------------------------------------------------------------------------------------------
-# INTERPOLATE SPLINES TO SMALL DISTANCES BETWEEN CENTERLINE POINTS -------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-# calculate spline lengths     len(spline_lengths_centerline) = coeffs_x.shape[0]
-spline_lengths_centerline = calc_spline_lengths.calc_spline_lengths(coeffs_x=coeffs_x_interp, coeffs_y=coeffs_y_interp)
-
-# interpolate splines for evenly spaced centerline points
-centerline_interp, spline_inds_centerline_interp, t_values_centerline_interp, s_centerline_interp = \
-    interp_splines.interp_splines(spline_lengths=spline_lengths_centerline,
-                                    coeffs_x=coeffs_x_interp,
-                                    coeffs_y=coeffs_y_interp,
-                                    incl_last_point=False,
-                                    stepsize_approx=pars["stepsize_opts"]["stepsize_interp_after_opt"])
-
-# calculate element lengths
-#s_tot_centerline = float(np.sum(spline_lengths_centerline))
-#el_lengths_centerline_interp = np.diff(s_centerline_interp)
-#el_lengths_centerline_interp_cl = np.append(el_lengths_centerline_interp, s_tot_centerline - s_centerline_interp[-1])
-
-# ----------------------------------------------------------------------------------------------------------------------
-# CALCULATE HEADING AND CURVATURE --------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-# calculate heading and curvature (analytically)
-psi_vel, kappa = calc_head_curv_an.calc_head_curv_an(coeffs_x=coeffs_x_interp,
-                                                             coeffs_y=coeffs_y_interp,
-                                                             ind_spls=spline_inds_centerline_interp,
-                                                             t_spls=t_values_centerline_interp)
-
-# ----------------------------------------------------------------------------------------------------------------------
-# DATA POSTPROCESSING --------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-# arrange data into one trajectory
-trajectory = np.column_stack((s_centerline_interp,centerline_interp,psi_vel,kappa))            # [n_new * (1 + 2 + 1 + 1)]
-
-spline_data = np.column_stack((spline_lengths_centerline, coeffs_x_interp, coeffs_y_interp))   # [n * (1 + 4 + 4)]
-
-# create a closed race trajectory array
-#traj_centerline_cl = np.vstack((trajectory, trajectory[0, :]))
-#traj_centerline_cl[-1, 0] = np.sum(spline_data[:, 0])  # set correct length
-
-# print end time
-print("INFO: Runtime from import to final trajectory was %.2fs" % (time.perf_counter() - t_start))
-
-# ----------------------------------------------------------------------------------------------------------------------
-# CHECK TRAJECTORY -----------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-bound1, bound2 = check_traj.check_traj(reftrack=reftrack_interp,
+def parse_args(argv: list = None) -> argparse.Namespace:
+    # Create the parser and add arguments with defaults and explicit names
+    parser = argparse.ArgumentParser(description='Generate interpolated and smoothed track centerlines.')
+    parser.add_argument('--map_name', type=str, default='e7_floor5_square', help='Name of the map (default: Hockenheim_map)')
+    parser.add_argument('--map_path', type=str, default='', help='Path to the map centerline (should be a .csv), defaults to tracks/<map_name>.csv')
+    parser.add_argument('--export_path', type=str, default='', help='Path to copy from the filepath in the /outputs')
+    parser.add_argument('--veh_params_file', type=str, default='f110.ini',
+                        help='Vehicle parameter file in params/, e.g. f110.ini for F1TENTH or rosbot.ini for Rosbot')
+    parser.add_argument('--output_dir', type=str, default='', help='Folder of the exported files, defaults to outputs/')
+    parser.add_argument('--no_plots', action='store_true', help='Compute-only run without creating any figures')
+    parser.add_argument('--export_format', type=str, default='csv', choices=['csv', 'npy'],
+                        help='Format of the exported files: ;-separated text or binary (memory-mappable) numpy array')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Run all stages instead of replaying unchanged stages from the stage cache')
+    parser.add_argument('--cache_dir', type=str, default='', help='Folder of the stage cache, defaults to .stage_cache')
+    parser.add_argument('--cache_max_mb', type=float, default=1024.0, help='Maximum size of the stage cache in MB')
+    parser.add_argument('--new_start', type=float, nargs=2, default=[0.0, 0.0], metavar=('X', 'Y'),
+                        help='Starting point [x_m, y_m], the closest track point becomes the first one')
+    parser.add_argument('--no_flip', action='store_true', help='Keep the driving direction of the track file')
+    parser.add_argument('--reorient_after_smoothing', action='store_true',
+                        help='Apply the starting point and the driving direction to the cached smoothed track instead'
+                             ' of the imported track, i.e. changing them does not run the smoothing again')
+    parser.add_argument('--stepsizes', type=float, nargs='+', default=None,
+                        help='Additionally export the resampled centerline at each of these stepsizes in m (e.g. coarse'
+                             ' for planning, fine for control) from the same splines')
+    parser.add_argument('--autotune_smoothing', action='store_true',
+                        help='Search the least smoothing without crossing normals instead of failing on them')
+    parser.add_argument('--max_deviation', type=float, default=0.2,
+                        help='Maximum deviation in m of the smoothed from the imported track for --autotune_smoothing')
+    parser.add_argument('--max_memory_mb', type=float, default=None,
+                        help='Memory budget in MB of the spline calculation, the dense, banded or segmented strategy is'
+                             ' chosen to fit into it and the run fails before the smoothing if none fits')
+    parser.add_argument('--profile_json', type=str, default='',
+                        help='Write wall time, CPU time, peak memory and array sizes of every stage to this .json file')
+    parser.add_argument('--profile_prometheus', type=str, default='',
+                        help='Write the stage metrics in the Prometheus text format to this file')
+
+    return parser.parse_args(argv)
+
+
+def load_veh_params(file_path: str) -> dict:
+    # load vehicle parameter file into a "pars" dict
+    parser = configparser.ConfigParser()
+    pars = {}
+
+    if not parser.read(file_path):
+        raise ValueError('Specified config file does not exist or is empty!')
+
+    pars["stepsize_opts"] = json.loads(parser.get('GENERAL_OPTIONS', 'stepsize_opts'))
+    pars["reg_smooth_opts"] = json.loads(parser.get('GENERAL_OPTIONS', 'reg_smooth_opts'))
+    pars["veh_params"] = json.loads(parser.get('GENERAL_OPTIONS', 'veh_params'))
+
+    return pars
+
+
+def generate_centerline(map_name: str,
+                        map_path: str = '',
+                        veh_params_file: str = 'f110.ini',
+                        output_dir: str = '',
+                        export_format: str = 'csv',
+                        no_plots: bool = False,
+                        no_cache: bool = False,
+                        cache_dir: str = '',
+                        cache_max_mb: float = 1024.0,
+                        autotune_smoothing: bool = False,
+                        max_deviation: float = 0.2,
+                        max_memory_mb: float = None,
+                        stepsizes: list = None,
+                        new_start: list = (0.0, 0.0),
+                        flip: bool = True,
+                        reorient_after_smoothing: bool = False,
+                        debug: bool = True,
+                        profiler: stage_profiler.StageProfiler = None,
+                        pars: dict = None) -> dict:
+    """
+    Smooth the centerline of a track, export the trajectory and spline data and return a summary of the run. See
+    parse_args for the inputs, the stages are recorded by profiler if given. The vehicle dependent parameters are
+    loaded from veh_params_file unless they are given by pars (same structure as returned by load_veh_params).
+    """
+
+    # numeric dependencies are imported on first use, i.e. parsing the arguments (e.g. --help) stays fast
+    import numpy as np
+    from helper_functions import import_track, prep_track, calc_spline_lengths, interp_splines, calc_head_curv_an
+    from helper_functions import check_traj, export_traj_splines, calc_splines, artifact_sink, stage_cache
+    from helper_functions import autotune_smoothing as autotune, calc_adaptive_dists, reorient_splines
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # USER INPUT -------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # choose vehicle parameter file
+    # "f110.ini" for F1TENTH
+    # "rosbot.ini" for Rosbot
+    file_paths = {"veh_params_file": veh_params_file}
+
+    # select track file (including centerline coordinates + track widths)
+    file_paths["track_name"] = map_name
+
+    # initialization of paths
+    file_paths["module"] = os.path.dirname(os.path.abspath(__file__))
+    file_paths["module"] = file_paths["module"].replace('\\', '/')
+    if map_path == '':
+        map_path = os.path.join(file_paths["module"], "grob_tracks", file_paths["track_name"] + ".csv")
+    file_paths["track_file"] = map_path
+
+    # create outputs folder(s)
+    if output_dir == '':
+        output_dir = os.path.join(file_paths["module"], "outputs")
+    os.makedirs(output_dir, exist_ok=True)
+    file_paths["traj_export"] = os.path.join(output_dir, f"{map_name}_centerline.{export_format}")
+    file_paths["spline_export"] = os.path.join(output_dir, f"{map_name}_splines.{export_format}")
+    file_paths["trajectory_export"] = os.path.join(output_dir, f"{map_name}_trajectory.{export_format}")
+    file_paths["resolution_exports"] = {stepsize: os.path.join(output_dir, f"{map_name}_trajectory_{stepsize:g}m."
+                                                                           f"{export_format}")
+                                        for stepsize in stepsizes or []}
+    file_paths["metadata_export"] = os.path.join(output_dir, f"{map_name}_metadata.json")
+
+    # stage cache (outputs of unchanged stages are replayed instead of being recalculated)
+    if cache_dir == '':
+        cache_dir = os.path.join(file_paths["module"], ".stage_cache")
+
+    cache = None if no_cache else stage_cache.StageCache(cache_dir=cache_dir, max_bytes=int(cache_max_mb * 1e6))
+
+    def run_stage(stage: str, inputs: dict, func) -> tuple:
+        # replay stage from the stage cache if its inputs did not change (figures are only created if the stage runs)
+        with stage_profiler.profile_stage(profiler, stage):
+            if cache is None:
+                outputs, key = func(), None
+            else:
+                outputs, key = cache.run(stage=stage, inputs=inputs, func=func, debug=debug)
+
+            stage_profiler.record_arrays(profiler, **{"output_%i" % i: output for i, output in enumerate(outputs)})
+
+        return outputs, key
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # IMPORT VEHICLE DEPENDENT PARAMETERS ------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    if pars is None:
+        pars = load_veh_params(file_path=os.path.join(file_paths["module"], "params", file_paths["veh_params_file"]))
+
+    # set import options 
+    imp_opts = {"flip_imp_track": flip,                # flip imported track to reverse direction
+                "set_new_start": new_start is not None, # set new starting point (changes order, not coordinates)
+                "new_start": np.array(new_start if new_start is not None else [0.0, 0.0]),  # [x_m, y_m]
+                "min_track_width": None,                # [m] minimum enforced track width (set None to deactivate)
+                "num_laps": 1}                          # number of laps to be driven (significant with powertrain-option),
+                                                        # only relevant in mintime-optimization
+
+    # apply direction and starting point to the smoothed track instead (the import and smoothing stages do not depend
+    # on them then, i.e. they are replayed from the stage cache if only direction or starting point change)
+    reorient_opts = {"flip": imp_opts["flip_imp_track"],
+                     "new_start": imp_opts["new_start"] if imp_opts["set_new_start"] else None}
+
+    if reorient_after_smoothing:
+        imp_opts["flip_imp_track"] = False
+        imp_opts["set_new_start"] = False
+        imp_opts["new_start"] = np.array([0.0, 0.0])
+
+    # debug and plot options 
+    plot_opts = {"centerline": True,                # plot interpolated and smoothed centerline
+                 "imported_bounds": True,           # plot imported bounds (analyze difference to interpolated bounds)
+                 "spline_normals": True,            # plot spline normals to check for crossings
+                 "intermediate_steps": True}        # plot original, linearly interpolated and smoothed centerline
+
+    if no_plots:
+        plot_opts = dict.fromkeys(plot_opts, False)
+
+    # figures of intermediate steps are recorded during the computation and rendered afterwards (None deactivates them)
+    artifacts = [] if plot_opts["intermediate_steps"] else None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # IMPORT TRACK -----------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # save start time
+    t_start = time.perf_counter()
+
+    # import track from new starting point
+    with open(file_paths["track_file"], 'rb') as fh:
+        track_file_content = fh.read()
+
+    (reftrack_imp,), key_import = \
+        run_stage(stage="import_track",
+                  inputs={"track_file": track_file_content,
+                          "imp_opts": imp_opts,
+                          "width_veh": pars["veh_params"]["width"]},
+                  func=lambda: (import_track.import_track(imp_opts=imp_opts,
+                                                          file_path=file_paths["track_file"],
+                                                          width_veh=pars["veh_params"]["width"]),))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # PREPARE REFTRACK -------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    smoothing_key = autotune.SMOOTHING_KEYS[pars["reg_smooth_opts"].get("method", "splprep")]
+
+    def prep_reftrack() -> tuple:
+        stats = {}
+
+        if autotune_smoothing:
+            # least smoothing without crossing normals (figures of the intermediate steps are not created)
+            prep_outputs, reg_smooth_opts, stepsize_opts, stats = \
+                autotune.autotune_smoothing(reftrack_imp=reftrack_imp,
+                                            reg_smooth_opts=pars["reg_smooth_opts"],
+                                            stepsize_opts=pars["stepsize_opts"],
+                                            max_deviation=max_deviation,
+                                            max_memory_mb=max_memory_mb,
+                                            min_width=imp_opts["min_track_width"],
+                                            debug=debug)
+        else:
+            reg_smooth_opts = pars["reg_smooth_opts"]
+            stepsize_opts = pars["stepsize_opts"]
+            prep_outputs = prep_track.prep_track(reftrack_imp=reftrack_imp,
+                                                 reg_smooth_opts=reg_smooth_opts,
+                                                 stepsize_opts=stepsize_opts,
+                                                 debug=debug,
+                                                 min_width=imp_opts["min_track_width"],
+                                                 original_figname="original_centerline.png",
+                                                 linear_interpolated_figname="linear_interpolated_centerline.png",
+                                                 cubic_spline_figname="cubic_spline_smoothed_centerline.png",
+                                                 artifacts=artifacts,
+                                                 stats=stats,
+                                                 max_memory_mb=max_memory_mb,
+                                                 profiler=profiler)
+
+        # used smoothing parameters, deviations and spline calculation (recorded in the metadata)
+        return prep_outputs + (np.array([reg_smooth_opts.get(smoothing_key, 1.0), stepsize_opts["stepsize_reg"],
+                                         stats["mean_deviation"], stats["max_deviation"],
+                                         stats["spline_memory_mb"]]),
+                               np.array(stats["spline_strategy"]))
+
+    try:
+        (reftrack_interp, normvec_normalized_interp, a_interp, coeffs_x_interp, coeffs_y_interp, smoothing,
+         spline_strategy), key_prep = run_stage(stage="prep_track",
+                                 inputs={"reftrack_imp": key_import,
+                                         "reg_smooth_opts": pars["reg_smooth_opts"],
+                                         "stepsize_prep": pars["stepsize_opts"]["stepsize_prep"],
+                                         "stepsize_reg": pars["stepsize_opts"]["stepsize_reg"],
+                                         "min_width": imp_opts["min_track_width"],
+                                         "autotune": [autotune_smoothing, max_deviation],
+                                         "max_memory_mb": max_memory_mb},
+                                 func=prep_reftrack)
+
+    finally:
+        # render figures of intermediate steps (also in case of crossed normals)
+        if artifacts:
+            artifact_sink.render_artifacts(artifacts=artifacts)
+
+    if reorient_after_smoothing:
+        (reftrack_interp, normvec_normalized_interp, coeffs_x_interp, coeffs_y_interp), key_prep = \
+            run_stage(stage="reorient_splines",
+                      inputs={"splines": key_prep,
+                              "reorient_opts": reorient_opts},
+                      func=lambda: reorient_splines.reorient_splines(reftrack=reftrack_interp,
+                                                                     normvec_normalized=normvec_normalized_interp,
+                                                                     coeffs_x=coeffs_x_interp,
+                                                                     coeffs_y=coeffs_y_interp,
+                                                                     **reorient_opts))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # INTERPOLATE SPLINES TO SMALL DISTANCES BETWEEN CENTERLINE POINTS -------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # curvature adaptive sampling (dict of the arguments of calc_adaptive_dists) instead of a fixed stepsize if given
+    adaptive_interp = pars["stepsize_opts"].get("adaptive_interp")
+
+    def interp_centerline() -> tuple:
+        # calculate spline lengths     len(spline_lengths_centerline) = coeffs_x.shape[0]
+        spline_lengths = calc_spline_lengths.calc_spline_lengths(coeffs_x=coeffs_x_interp, coeffs_y=coeffs_y_interp)
+
+        if adaptive_interp:
+            # interpolate splines for centerline points with a curvature dependent spacing
+            dists = calc_adaptive_dists.calc_adaptive_dists(coeffs_x=coeffs_x_interp,
+                                                            coeffs_y=coeffs_y_interp,
+                                                            spline_lengths=spline_lengths,
+                                                            **adaptive_interp)
+
+            return (spline_lengths,) + interp_splines.interp_splines(spline_lengths=spline_lengths,
+                                                                     coeffs_x=coeffs_x_interp,
+                                                                     coeffs_y=coeffs_y_interp,
+                                                                     incl_last_point=False,
+                                                                     dists_fixed=dists)
+
+        # interpolate splines for evenly spaced centerline points
+        return (spline_lengths,) + \
+            interp_splines.interp_splines(spline_lengths=spline_lengths,
+                                          coeffs_x=coeffs_x_interp,
+                                          coeffs_y=coeffs_y_interp,
+                                          incl_last_point=False,
+                                          stepsize_approx=pars["stepsize_opts"]["stepsize_interp_after_opt"])
+
+    (spline_lengths_centerline, centerline_interp, spline_inds_centerline_interp, t_values_centerline_interp,
+     s_centerline_interp), key_interp = \
+        run_stage(stage="interp_splines",
+                  inputs={"splines": key_prep,
+                          "stepsize_interp_after_opt": pars["stepsize_opts"]["stepsize_interp_after_opt"],
+                          "adaptive_interp": adaptive_interp},
+                  func=interp_centerline)
+
+    # calculate element lengths
+    #s_tot_centerline = float(np.sum(spline_lengths_centerline))
+    #el_lengths_centerline_interp = np.diff(s_centerline_interp)
+    #el_lengths_centerline_interp_cl = np.append(el_lengths_centerline_interp, s_tot_centerline - s_centerline_interp[-1])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # CALCULATE HEADING AND CURVATURE ----------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # calculate heading and curvature (analytically)
+    (psi_vel, kappa), key_curv = \
+        run_stage(stage="calc_head_curv_an",
+                  inputs={"points": key_interp},
+                  func=lambda: calc_head_curv_an.calc_head_curv_an(coeffs_x=coeffs_x_interp,
+                                                                   coeffs_y=coeffs_y_interp,
+                                                                   ind_spls=spline_inds_centerline_interp,
+                                                                   t_spls=t_values_centerline_interp))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # DATA POSTPROCESSING ----------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # arrange data into one trajectory
+    trajectory = np.column_stack((s_centerline_interp,centerline_interp,psi_vel,kappa))            # [n_new * (1 + 2 + 1 + 1)]
+
+    spline_data = np.column_stack((spline_lengths_centerline, coeffs_x_interp, coeffs_y_interp))   # [n * (1 + 4 + 4)]
+
+    # create a closed race trajectory array
+    #traj_centerline_cl = np.vstack((trajectory, trajectory[0, :]))
+    #traj_centerline_cl[-1, 0] = np.sum(spline_data[:, 0])  # set correct length
+
+    # print end time
+    print("INFO: Runtime from import to final trajectory was %.2fs" % (time.perf_counter() - t_start))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # CHECK TRAJECTORY -------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def check_trajectory() -> tuple:
+        stats = {}
+        bounds = check_traj.check_traj(reftrack=reftrack_interp,
                                        reftrack_normvec_normalized=normvec_normalized_interp,
                                        length_veh=pars["veh_params"]["length"],
                                        width_veh=pars["veh_params"]["width"],
                                        debug=debug,
                                        trajectory=trajectory,
-                                       curvlim=pars["veh_params"]["curvlim"])
-
-# ----------------------------------------------------------------------------------------------------------------------
-# EXPORT ---------------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-# export trajectory and spline data  to CSV
-export_traj_splines.export_traj_splines(file_paths=file_paths,
-                                        spline_data=spline_data,
-                                        reftrack=reftrack_interp,
-                                        normvec_normalized=normvec_normalized_interp)
-
-print("INFO: Finished export of trajectory:", time.strftime("%H:%M:%S"))
-
-
-# ----------------------------------------------------------------------------------------------------------------------
-# PLOT RESULTS ---------------------------------------------------------------------------------------------------------
-# ----------------------------------------------------------------------------------------------------------------------
-
-# get bound of imported map (for reference in final plot)
-bound1_imp = None
-bound2_imp = None
-
-if plot_opts["imported_bounds"]:
-    # try to extract four times as many points as in the interpolated version (in order to hold more details)
-    n_skip = max(int(reftrack_imp.shape[0] / (bound1.shape[0] * 4)), 1)
-
-    _, _, _, normvec_imp = calc_splines.calc_splines(path=np.vstack((reftrack_imp[::n_skip, 0:2],
-                                                                         reftrack_imp[0, 0:2])))
-
-    bound1_imp = reftrack_imp[::n_skip, :2] + normvec_imp * np.expand_dims(reftrack_imp[::n_skip, 2], 1)
-    bound2_imp = reftrack_imp[::n_skip, :2] - normvec_imp * np.expand_dims(reftrack_imp[::n_skip, 3], 1)
-
-# plot results
-result_plots.result_plots(plot_opts=plot_opts,
-                          refline=reftrack_interp[:, :2],
-                          bound1_imp=bound1_imp,
-                          bound2_imp=bound2_imp,
-                          bound1_interp=bound1,
-                          bound2_interp=bound2)
+                                       curvlim=pars["veh_params"]["curvlim"],
+                                       stats=stats,
+                                       report=False)
+
+        return bounds + (np.array([stats["min_dist"], stats["kappa_max"]]),)
+
+    (bound1, bound2, check_results), key_check = \
+        run_stage(stage="check_traj",
+                  inputs={"trajectory": key_curv,
+                          "length_veh": pars["veh_params"]["length"],
+                          "width_veh": pars["veh_params"]["width"],
+                          "curvlim": pars["veh_params"]["curvlim"]},
+                  func=check_trajectory)
+
+    # the warnings are the actual result of the check -> printed also if the stage was replayed from the stage cache
+    check_traj.report_check_traj(min_dist=float(check_results[0]),
+                                 kappa_max=float(check_results[1]),
+                                 curvlim=pars["veh_params"]["curvlim"],
+                                 debug=debug)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # MULTI-RESOLUTION PRODUCTS ----------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # resample the same splines at every requested stepsize (sharing the spline lengths of the interpolation above, they
+    # only depend on the splines, i.e. a changed main stepsize does not recalculate the resolutions)
+    def resample_centerline(stepsize: float) -> tuple:
+        points, spline_inds, t_values, dists = interp_splines.interp_splines(spline_lengths=spline_lengths_centerline,
+                                                                             coeffs_x=coeffs_x_interp,
+                                                                             coeffs_y=coeffs_y_interp,
+                                                                             incl_last_point=False,
+                                                                             stepsize_approx=stepsize)
+        psi, kappa_res = calc_head_curv_an.calc_head_curv_an(coeffs_x=coeffs_x_interp,
+                                                             coeffs_y=coeffs_y_interp,
+                                                             ind_spls=spline_inds,
+                                                             t_spls=t_values)
+
+        return (np.column_stack((dists, points, psi, kappa_res)),)
+
+    resolutions = {}
+
+    for stepsize in file_paths["resolution_exports"]:
+        (resolutions[stepsize],), _ = run_stage(stage="resample_%gm" % stepsize,
+                                                inputs={"splines": key_prep, "stepsize": stepsize},
+                                                func=lambda: resample_centerline(stepsize=stepsize))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # EXPORT -----------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    metadata = {"map_name": map_name,
+                "veh_params_file": veh_params_file,
+                "reg_smooth_opts": dict(pars["reg_smooth_opts"], **{smoothing_key: float(smoothing[0])}),
+                "stepsize_opts": dict(pars["stepsize_opts"], stepsize_reg=float(smoothing[1])),
+                "autotune_smoothing": autotune_smoothing,
+                "resolutions": [{"stepsize": stepsize,
+                                 "no_points": resolutions[stepsize].shape[0],
+                                 "file": os.path.basename(file_paths["resolution_exports"][stepsize])}
+                                for stepsize in resolutions],
+                "mean_deviation": float(smoothing[2]),
+                "max_deviation": float(smoothing[3]),
+                "spline_strategy": str(spline_strategy),
+                "spline_memory_mb": float(smoothing[4])}
+
+    # export trajectory and spline data  to CSV
+    with stage_profiler.profile_stage(profiler, "export"):
+        export_traj_splines.export_traj_splines(file_paths=file_paths,
+                                                spline_data=spline_data,
+                                                reftrack=reftrack_interp,
+                                                normvec_normalized=normvec_normalized_interp,
+                                                file_format=export_format,
+                                                trajectory=trajectory,
+                                                metadata=metadata)
+
+        for stepsize, trajectory_res in resolutions.items():
+            export_traj_splines.export_trajectory(file_path=file_paths["resolution_exports"][stepsize],
+                                                  trajectory=trajectory_res,
+                                                  file_format=export_format)
+
+    print("INFO: Finished export of trajectory:", time.strftime("%H:%M:%S"))
+
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # PLOT RESULTS -----------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # get bound of imported map (for reference in final plot)
+    bound1_imp = None
+    bound2_imp = None
+
+    if plot_opts["imported_bounds"]:
+        # try to extract four times as many points as in the interpolated version (in order to hold more details)
+        n_skip = max(int(reftrack_imp.shape[0] / (bound1.shape[0] * 4)), 1)
+
+        _, _, _, normvec_imp = calc_splines.calc_splines(path=np.vstack((reftrack_imp[::n_skip, 0:2],
+                                                                             reftrack_imp[0, 0:2])))
+
+        bound1_imp = reftrack_imp[::n_skip, :2] + normvec_imp * np.expand_dims(reftrack_imp[::n_skip, 2], 1)
+        bound2_imp = reftrack_imp[::n_skip, :2] - normvec_imp * np.expand_dims(reftrack_imp[::n_skip, 3], 1)
+
+    # plot results (matplotlib is only imported if a figure is requested)
+    if plot_opts["centerline"] or plot_opts["spline_normals"]:
+        from helper_functions import result_plots
+
+        result_plots.result_plots(plot_opts=plot_opts,
+                                  refline=reftrack_interp[:, :2],
+                                  bound1_imp=bound1_imp,
+                                  bound2_imp=bound2_imp,
+                                  bound1_interp=bound1,
+                                  bound2_interp=bound2)
+
+    return {"map_name": map_name,
+            "veh_params_file": veh_params_file,
+            "no_points": trajectory.shape[0],
+            "track_length": float(np.sum(spline_lengths_centerline)),
+            "kappa_max": float(np.amax(np.abs(kappa))),
+            "runtime": time.perf_counter() - t_start,
+            "traj_export": file_paths["traj_export"],
+            "spline_export": file_paths["spline_export"],
+            "trajectory_export": file_paths["trajectory_export"],
+            "metadata_export": file_paths["metadata_export"],
+            smoothing_key: metadata["reg_smooth_opts"][smoothing_key],
+            "stepsize_reg": metadata["stepsize_opts"]["stepsize_reg"],
+            "spline_strategy": metadata["spline_strategy"]}
+
+
+def main(argv: list = None) -> None:
+    args = parse_args(argv)
+
+    profiler = None
+    if args.profile_json or args.profile_prometheus:
+        profiler = stage_profiler.StageProfiler()
+
+    try:
+        generate_centerline(map_name=args.map_name,
+                            map_path=args.map_path,
+                            veh_params_file=args.veh_params_file,
+                            output_dir=args.output_dir,
+                            export_format=args.export_format,
+                            no_plots=args.no_plots,
+                            no_cache=args.no_cache,
+                            cache_dir=args.cache_dir,
+                            cache_max_mb=args.cache_max_mb,
+                            autotune_smoothing=args.autotune_smoothing,
+                            max_deviation=args.max_deviation,
+                            max_memory_mb=args.max_memory_mb,
+                            stepsizes=args.stepsizes,
+                            new_start=args.new_start,
+                            flip=not args.no_flip,
+                            reorient_after_smoothing=args.reorient_after_smoothing,
+                            profiler=profiler)
+
+    finally:
+        # write the report also if a stage failed
+        if profiler is not None:
+            profiler.close()
+
+            if args.profile_json:
+                profiler.write_json(file_path=args.profile_json)
+            if args.profile_prometheus:
+                profiler.write_prometheus(file_path=args.profile_prometheus, labels={"map_name": args.map_name})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import numpy as np
+
+
+def record_artifact(artifacts: list,
+                    figname: str,
+                    title: str,
+                    lines: list,
+                    equal_aspect: bool = False,
+                    xlabel: str = "x",
+                    ylabel: str = "y") -> None:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    This function records the data of a figure for later rendering instead of plotting it during the computation. The
+    numeric functions only touch the artifacts list, i.e. they never import matplotlib themselves. Nothing is recorded
+    if artifacts is None (compute-only mode).
+
+    Inputs:
+    artifacts:      list collecting the recorded figures (None to deactivate recording)
+    figname:        file name the figure is saved to when rendered (None to not save it)
+    title:          figure title
+    lines:          list of tuples (xy, fmt, linewidth) with xy being [x, y] coordinates of a line (several lines can be
+                    separated by a row of NaNs), fmt the matplotlib format string and linewidth the line width
+    equal_aspect:   flag to set an equal aspect ratio of the axes
+    xlabel:         label of the x axis
+    ylabel:         label of the y axis
+    """
+
+    if artifacts is None:
+        return
+
+    artifacts.append({"figname": figname,
+                      "title": title,
+                      "lines": [(np.array(xy), fmt, linewidth) for xy, fmt, linewidth in lines],
+                      "equal_aspect": equal_aspect,
+                      "xlabel": xlabel,
+                      "ylabel": ylabel})
+
+
+def render_artifacts(artifacts: list,
+                     dpi: int = 300,
+                     show: bool = True) -> None:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    This function renders the figures recorded by record_artifact and saves them to their file names.
+
+    Inputs:
+    artifacts:      list of the recorded figures
+    dpi:            resolution of the saved figures
+    show:           flag to show the figures after saving them (otherwise they are closed)
+    """
+
+    import matplotlib.pyplot as plt
+
+    for artifact in artifacts:
+        fig = plt.figure()
+
+        for xy, fmt, linewidth in artifact["lines"]:
+            plt.plot(xy[:, 0], xy[:, 1], fmt, linewidth=linewidth)
+
+        plt.grid()
+
+        if artifact["equal_aspect"]:
+            plt.gca().set_aspect("equal", "datalim")
+
+        plt.xlabel(artifact["xlabel"])
+        plt.ylabel(artifact["ylabel"])
+        plt.title(artifact["title"])
+
+        if artifact["figname"] is not None:
+            plt.savefig(artifact["figname"], dpi=dpi)
+
+        if not show:
+            plt.close(fig)
+
+    if show:
+        plt.show()
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
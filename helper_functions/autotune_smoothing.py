@@ -0,0 +1,185 @@
+import numpy as np
+import concurrent.futures
+from helper_functions import prep_track
+
+# smoothing parameter of the smoothing engines (see spline_approximation)
+SMOOTHING_KEYS = {"splprep": "s_reg", "pspline": "lambda"}
+
+# factors applied to the smoothing parameter and to stepsize_reg of the parameter file to obtain the candidates
+SMOOTHING_FACTORS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+STEPSIZE_FACTORS = (1.0, 2.0, 4.0, 8.0)
+
+
+def autotune_smoothing(reftrack_imp: np.ndarray,
+                       reg_smooth_opts: dict,
+                       stepsize_opts: dict,
+                       max_deviation: float,
+                       min_width: float = None,
+                       max_memory_mb: float = None,
+                       max_workers: int = None,
+                       debug: bool = True) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Search the least smoothed configuration of the smoothing parameter (s_reg or lambda, see SMOOTHING_KEYS) and of
+    stepsize_reg for which prep_track does not find crossing normals and the maximum deviation of the smoothed track
+    from the imported track stays within max_deviation.
+
+    The candidates (see calc_schedule) are evaluated in parallel in a process pool. Once a candidate passes, all more
+    smoothed candidates which did not start yet are cancelled and only the less smoothed ones are awaited. Candidates
+    whose spline calculation does not fit into max_memory_mb are dropped before (see prep_track.select_spline_strategy).
+
+    Inputs:
+    reftrack_imp:       imported track [x_m, y_m, w_tr_right_m, w_tr_left_m]
+    reg_smooth_opts:    parameters for the spline approximation of the parameter file (start of the schedule)
+    stepsize_opts:      stepsizes of the parameter file (start of the schedule)
+    max_deviation:      [m] maximum allowed deviation of the smoothed track from the imported track
+    min_width:          [m] minimum enforced track width (None to deactivate)
+    max_memory_mb:      [MB] memory budget of the spline calculation of every candidate (None for no limit)
+    max_workers:        maximum number of concurrently evaluated candidates (number of CPUs if None)
+    debug:              print the result of every evaluated candidate
+
+    Outputs:
+    prep_outputs:       outputs of prep_track for the chosen candidate
+    reg_smooth_opts:    chosen parameters for the spline approximation
+    stepsize_opts:      chosen stepsizes
+    stats:              deviations and spline calculation of the chosen candidate (see spline_approximation and
+                        prep_track)
+    """
+
+    schedule = calc_schedule(reg_smooth_opts=reg_smooth_opts, stepsize_opts=stepsize_opts)
+    smoothing_key = SMOOTHING_KEYS[reg_smooth_opts.get("method", "splprep")]
+
+    # drop the candidates exceeding the memory budget (fail before starting the pool if none is left)
+    if max_memory_mb is not None:
+        schedule = [candidate for candidate in schedule
+                    if _fits_memory(reftrack_imp=reftrack_imp,
+                                    reg_smooth_opts=candidate[0],
+                                    stepsize_opts=candidate[1],
+                                    max_memory_mb=max_memory_mb)]
+
+        if not schedule:
+            raise MemoryError("No smoothing candidate fits into the memory budget of %gMB, increase the budget or"
+                              " stepsize_reg!" % max_memory_mb)
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    futures = [executor.submit(_eval_candidate, reftrack_imp, reg_smooth_opts_cand, stepsize_opts_cand, min_width,
+                               max_deviation, max_memory_mb)
+               for reg_smooth_opts_cand, stepsize_opts_cand in schedule]
+    results = {}
+    best = None
+
+    try:
+        pending = set(futures)
+
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                if future.cancelled():
+                    continue
+
+                i = futures.index(future)
+                results[i] = future.result()
+
+                if debug:
+                    print("INFO: Smoothing candidate %s=%g, stepsize_reg=%g: %s"
+                          % (smoothing_key, schedule[i][0][smoothing_key], schedule[i][1]["stepsize_reg"],
+                             results[i][2] or "passed"))
+
+                if results[i][0] is not None and (best is None or i < best):
+                    best = i
+
+                    for future_cancel in futures[i + 1:]:
+                        future_cancel.cancel()
+
+            # finished as soon as all less smoothed candidates failed
+            if best is not None and all(i in results for i in range(best)):
+                break
+
+    finally:
+        for future in futures:
+            future.cancel()
+
+        # candidates which are already running cannot be interrupted, they finish in the background
+        executor.shutdown(wait=False)
+
+    if best is None:
+        raise IOError("No smoothing candidate passed the normals crossing check within the deviation budget of %.2fm,"
+                      " check input!" % max_deviation)
+
+    if debug:
+        print("INFO: Chose smoothing %s=%g, stepsize_reg=%g (maximum deviation %.2fm)"
+              % (smoothing_key, schedule[best][0][smoothing_key], schedule[best][1]["stepsize_reg"],
+                 results[best][1]["max_deviation"]))
+
+    return results[best][0], schedule[best][0], schedule[best][1], results[best][1]
+
+
+def calc_schedule(reg_smooth_opts: dict,
+                  stepsize_opts: dict) -> list:
+    """
+    Return the candidates [(reg_smooth_opts, stepsize_opts), ...] ordered from least to most smoothed, i.e. by the sum
+    of the indices of their factors in SMOOTHING_FACTORS and STEPSIZE_FACTORS (ties are ordered by the stepsize).
+    """
+
+    smoothing_key = SMOOTHING_KEYS[reg_smooth_opts.get("method", "splprep")]
+    smoothing = reg_smooth_opts.get(smoothing_key, 1.0)
+
+    inds = sorted(((i, j) for i in range(len(SMOOTHING_FACTORS)) for j in range(len(STEPSIZE_FACTORS))),
+                  key=lambda ij: (ij[0] + ij[1], ij[1]))
+
+    return [(dict(reg_smooth_opts, **{smoothing_key: smoothing * SMOOTHING_FACTORS[i]}),
+             dict(stepsize_opts, stepsize_reg=stepsize_opts["stepsize_reg"] * STEPSIZE_FACTORS[j]))
+            for i, j in inds]
+
+
+def _fits_memory(reftrack_imp: np.ndarray,
+                 reg_smooth_opts: dict,
+                 stepsize_opts: dict,
+                 max_memory_mb: float) -> bool:
+    # True if the spline calculation of the candidate is expected to fit into the memory budget
+    try:
+        prep_track.select_spline_strategy(reftrack_imp=reftrack_imp,
+                                          reg_smooth_opts=reg_smooth_opts,
+                                          stepsize_opts=stepsize_opts,
+                                          max_memory_mb=max_memory_mb)
+    except MemoryError:
+        return False
+
+    return True
+
+
+def _eval_candidate(reftrack_imp: np.ndarray,
+                    reg_smooth_opts: dict,
+                    stepsize_opts: dict,
+                    min_width: float,
+                    max_deviation: float,
+                    max_memory_mb: float) -> tuple:
+    # evaluated in a worker process, returns (prep_outputs or None, stats, reason of the failure or None)
+    stats = {}
+
+    try:
+        prep_outputs = prep_track.prep_track(reftrack_imp=reftrack_imp,
+                                             reg_smooth_opts=reg_smooth_opts,
+                                             stepsize_opts=stepsize_opts,
+                                             debug=False,
+                                             min_width=min_width,
+                                             stats=stats,
+                                             max_memory_mb=max_memory_mb)
+    except IOError:
+        return None, stats, "crossing normals"
+    except MemoryError as e:
+        return None, stats, "memory budget exceeded (%s)" % e
+
+    if stats["max_deviation"] > max_deviation:
+        return None, stats, "maximum deviation %.2fm exceeds the budget" % stats["max_deviation"]
+
+    return prep_outputs, stats, None
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
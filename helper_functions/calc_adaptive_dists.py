@@ -0,0 +1,87 @@
+import numpy as np
+import math
+from helper_functions import interp_splines, calc_head_curv_an
+
+
+def calc_adaptive_dists(coeffs_x: np.ndarray,
+                        coeffs_y: np.ndarray,
+                        spline_lengths: np.ndarray,
+                        max_chord_error: float = 0.005,
+                        max_heading_step: float = 0.1,
+                        stepsize_min: float = 0.05,
+                        stepsize_max: float = 2.0) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Calculate curvature adaptive sampling distances along a closed spline path (to be interpolated by interp_splines with
+    dists_fixed). The allowed stepsize at a point follows from its curvature kappa such that the chord error of a step
+    (h² * kappa / 8) and the heading change of a step (h * kappa) stay within the tolerances. The curvature change
+    within a step is taken into account by using |kappa| + |dkappa| * h instead of kappa. The points are distributed
+    according to the resulting point density, i.e. straights get few points and tight corners many.
+
+    Inputs:
+    coeffs_x:           coefficient matrix of the x splines with size (no_splines x 4)
+    coeffs_y:           coefficient matrix of the y splines with size (no_splines x 4)
+    spline_lengths:     lengths of the splines
+    max_chord_error:    [m] maximum distance between a step (chord) and the path
+    max_heading_step:   [rad] maximum heading change per step
+    stepsize_min:       [m] minimum stepsize (also spacing of the curvature evaluation)
+    stepsize_max:       [m] maximum stepsize (e.g. on straights)
+
+    Outputs:
+    dists:              distances along the path of the points (starting at 0.0, without the total length)
+    """
+
+    if not 0.0 < stepsize_min <= stepsize_max:
+        raise ValueError("stepsize_min must be positive and must not exceed stepsize_max!")
+
+    # evaluate curvature and its derivative on a fine grid (including the end point of the path)
+    _, spline_inds, t_values, dists_probe = interp_splines.interp_splines(coeffs_x=coeffs_x,
+                                                                          coeffs_y=coeffs_y,
+                                                                          spline_lengths=spline_lengths,
+                                                                          incl_last_point=True,
+                                                                          stepsize_approx=stepsize_min)
+    _, kappa, dkappa = calc_head_curv_an.calc_head_curv_an(coeffs_x=coeffs_x,
+                                                           coeffs_y=coeffs_y,
+                                                           ind_spls=spline_inds,
+                                                           t_spls=t_values,
+                                                           calc_dcurv=True)
+
+    # allowed stepsize from the curvature, then again with the curvature expected at the end of such a step
+    stepsizes = _calc_stepsizes(kappa=np.abs(kappa),
+                                max_chord_error=max_chord_error,
+                                max_heading_step=max_heading_step,
+                                stepsize_max=stepsize_max)
+    stepsizes = _calc_stepsizes(kappa=np.abs(kappa) + np.abs(dkappa) * stepsizes,
+                                max_chord_error=max_chord_error,
+                                max_heading_step=max_heading_step,
+                                stepsize_max=stepsize_max)
+    stepsizes = np.maximum(stepsizes, stepsize_min)
+
+    # cumulated number of steps (integral of the point density 1 / stepsize), the points are placed at equal increments
+    steps_cum = np.insert(np.cumsum(np.diff(dists_probe) * 0.5 * (1.0 / stepsizes[:-1] + 1.0 / stepsizes[1:])), 0, 0.0)
+    no_steps = max(math.ceil(steps_cum[-1]), 3)
+
+    return np.interp(np.arange(no_steps) * steps_cum[-1] / no_steps, steps_cum, dists_probe)
+
+
+def _calc_stepsizes(kappa: np.ndarray,
+                    max_chord_error: float,
+                    max_heading_step: float,
+                    stepsize_max: float) -> np.ndarray:
+    # stepsize limited by chord error and heading change (stepsize_max on straights)
+    stepsizes = np.full(kappa.size, stepsize_max)
+    curved = kappa > 0.0
+
+    stepsizes[curved] = np.minimum(stepsizes[curved],
+                                   np.minimum(np.sqrt(8.0 * max_chord_error / kappa[curved]),
+                                              max_heading_step / kappa[curved]))
+
+    return stepsizes
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
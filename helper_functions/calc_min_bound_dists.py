@@ -1,12 +1,13 @@
 import numpy as np
-import math
 
 
 def calc_min_bound_dists(trajectory: np.ndarray,
                          bound1: np.ndarray,
                          bound2: np.ndarray,
                          length_veh: float,
-                         width_veh: float) -> np.ndarray:
+                         width_veh: float,
+                         polyline_dists: bool = False,
+                         bounds_index: dict = None) -> np.ndarray:
     """
     Created by:
     Alexander Heilmeier
@@ -21,6 +22,10 @@ def calc_min_bound_dists(trajectory: np.ndarray,
     bound1/2:       arrays containing the track boundaries [x, y]
     length_veh:     real vehicle length in m
     width_veh:      real vehicle width in m
+    polyline_dists: if True, the distances to the (closed) boundary polylines are calculated instead of the distances
+                    to the boundary points
+    bounds_index:   spatial index of the boundaries created by calc_bounds_index (optional, e.g. to check several
+                    trajectories against the same boundaries). bound1/2 are not used if it is provided.
 
     Outputs:
     min_dists:      minimum distance to boundaries for every trajectory point
@@ -30,42 +35,92 @@ def calc_min_bound_dists(trajectory: np.ndarray,
     # CALCULATE MINIMUM DISTANCES --------------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
 
-    bounds = np.vstack((bound1, bound2))
+    if bounds_index is None:
+        bounds_index = calc_bounds_index(bound1=bound1, bound2=bound2)
 
-    # calculate static vehicle edge positions [x, y] for psi = 0
-    fl = np.array([-width_veh / 2, length_veh / 2])
-    fr = np.array([width_veh / 2, length_veh / 2])
-    rl = np.array([-width_veh / 2, -length_veh / 2])
-    rr = np.array([width_veh / 2, -length_veh / 2])
+    # calculate static vehicle edge positions [x, y] for psi = 0 (fl, fr, rl, rr)
+    edges = np.array([[-width_veh / 2, length_veh / 2],
+                      [width_veh / 2, length_veh / 2],
+                      [-width_veh / 2, -length_veh / 2],
+                      [width_veh / 2, -length_veh / 2]])
 
-    # loop through all the raceline points
-    min_dists = np.zeros(trajectory.shape[0])
-    mat_rot = np.zeros((2, 2))
+    # calculate positions of vehicle edges for all the raceline points at once (no_points x 4 x 2)
+    cos_psi = np.expand_dims(np.cos(trajectory[:, 3]), axis=1)
+    sin_psi = np.expand_dims(np.sin(trajectory[:, 3]), axis=1)
 
-    for i in range(trajectory.shape[0]):
-        mat_rot[0, 0] = math.cos(trajectory[i, 3])
-        mat_rot[0, 1] = -math.sin(trajectory[i, 3])
-        mat_rot[1, 0] = math.sin(trajectory[i, 3])
-        mat_rot[1, 1] = math.cos(trajectory[i, 3])
+    edges_glob = np.zeros((trajectory.shape[0], 4, 2))
+    edges_glob[:, :, 0] = trajectory[:, 1:2] + cos_psi * edges[:, 0] - sin_psi * edges[:, 1]
+    edges_glob[:, :, 1] = trajectory[:, 2:3] + sin_psi * edges[:, 0] + cos_psi * edges[:, 1]
+    edges_glob = np.reshape(edges_glob, (-1, 2))
 
-        # calculate positions of vehicle edges
-        fl_ = trajectory[i, 1:3] + np.matmul(mat_rot, fl)
-        fr_ = trajectory[i, 1:3] + np.matmul(mat_rot, fr)
-        rl_ = trajectory[i, 1:3] + np.matmul(mat_rot, rl)
-        rr_ = trajectory[i, 1:3] + np.matmul(mat_rot, rr)
+    # get minimum distances of vehicle edges to any boundary point
+    edge_dists = bounds_index["points_tree"].query(edges_glob)[0]
 
-        # get minimum distances of vehicle edges to any boundary point
-        fl__mindist = np.sqrt(np.power(bounds[:, 0] - fl_[0], 2) + np.power(bounds[:, 1] - fl_[1], 2))
-        fr__mindist = np.sqrt(np.power(bounds[:, 0] - fr_[0], 2) + np.power(bounds[:, 1] - fr_[1], 2))
-        rl__mindist = np.sqrt(np.power(bounds[:, 0] - rl_[0], 2) + np.power(bounds[:, 1] - rl_[1], 2))
-        rr__mindist = np.sqrt(np.power(bounds[:, 0] - rr_[0], 2) + np.power(bounds[:, 1] - rr_[1], 2))
+    if polyline_dists:
+        # the closest polyline segment must have its center within the distance to the closest boundary point plus
+        # half of the maximum segment length
+        radii = edge_dists + bounds_index["seg_half_length_max"] * (1.0 + 1e-9)
 
-        # save overall minimum distance of current vehicle position
-        min_dists[i] = np.amin((fl__mindist, fr__mindist, rl__mindist, rr__mindist))
+        try:
+            cands = bounds_index["seg_tree"].query_ball_point(edges_glob, r=radii)
+        except (TypeError, ValueError):
+            # scipy < 1.6 does not support an individual radius for every point
+            cands = [bounds_index["seg_tree"].query_ball_point(edge, r=radius)
+                     for edge, radius in zip(edges_glob, radii)]
+
+        no_cands = np.array([len(cand) for cand in cands])
+        idx_edge = np.repeat(np.arange(edges_glob.shape[0]), no_cands)
+        idx_seg = np.concatenate(cands).astype(int)
+
+        # distances between the edges and the candidate segments
+        seg_start = bounds_index["seg_start"][idx_seg]
+        seg_vec = bounds_index["seg_end"][idx_seg] - seg_start
+        seg_len_sq = np.sum(np.power(seg_vec, 2), axis=1)
+        rel = edges_glob[idx_edge] - seg_start
+
+        t = np.sum(rel * seg_vec, axis=1) / np.where(seg_len_sq > 0.0, seg_len_sq, 1.0)
+        t = np.clip(t, 0.0, 1.0)
+        cand_dists = np.hypot(*(rel - np.expand_dims(t, axis=1) * seg_vec).T)
+
+        edge_dists = np.minimum.reduceat(cand_dists, np.cumsum(no_cands) - no_cands)
+
+    # save overall minimum distance of every vehicle position
+    min_dists = np.amin(np.reshape(edge_dists, (-1, 4)), axis=1)
 
     return min_dists
 
 
+def calc_bounds_index(bound1: np.ndarray,
+                      bound2: np.ndarray) -> dict:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Build the spatial index of the track boundaries used by calc_min_bound_dists. It can be reused for several
+    trajectories on the same track.
+
+    Inputs:
+    bound1/2:       arrays containing the track boundaries [x, y] (unclosed)
+
+    Outputs:
+    bounds_index:   dict containing a KD-tree over the boundary points ("points_tree") and over the centers of the
+                    closed boundary polylines' segments ("seg_tree") as well as the segments themselves
+    """
+
+    from scipy import spatial
+
+    bounds = np.vstack((bound1[:, :2], bound2[:, :2]))
+    seg_start = bounds
+    seg_end = np.vstack((np.roll(bound1[:, :2], -1, axis=0), np.roll(bound2[:, :2], -1, axis=0)))
+
+    return {"points_tree": spatial.cKDTree(bounds),
+            "seg_tree": spatial.cKDTree(0.5 * (seg_start + seg_end)),
+            "seg_start": seg_start,
+            "seg_end": seg_end,
+            "seg_half_length_max": 0.5 * float(np.amax(np.hypot(*(seg_end - seg_start).T)))}
+
+
 # testing --------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
     pass
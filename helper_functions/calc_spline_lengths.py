@@ -1,17 +1,18 @@
 import numpy as np
-import math
 
 
 def calc_spline_lengths(coeffs_x: np.ndarray,
                         coeffs_y: np.ndarray,
                         quickndirty: bool = False,
-                        no_interp_points: int = 15) -> np.ndarray:
+                        gauss_order: int = 5,
+                        rel_tol: float = None) -> np.ndarray:
     """
     author:
     Alexander Heilmeier
 
     .. description::
-    Calculate spline lengths for third order splines defining x- and y-coordinates by usage of intermediate steps.
+    Calculate spline lengths for third order splines defining x- and y-coordinates by Gauss-Legendre quadrature of the
+    analytic speed |P'(t)| = sqrt(x'(t)² + y'(t)²) on t = [0, 1].
 
     .. inputs::
     :param coeffs_x:            coefficient matrix of the x splines with size (no_splines x 4).
@@ -19,10 +20,14 @@ def calc_spline_lengths(coeffs_x: np.ndarray,
     :param coeffs_y:            coefficient matrix of the y splines with size (no_splines x 4).
     :type coeffs_y:             np.ndarray
     :param quickndirty:         True returns lengths based on distance between first and last spline point instead of
-                                using interpolation.
+                                using quadrature.
     :type quickndirty:          bool
-    :param no_interp_points:    length calculation is carried out with the given number of interpolation steps.
-    :type no_interp_points:     int
+    :param gauss_order:         number of Gauss-Legendre nodes per spline (exact for polynomials up to order
+                                2 * gauss_order - 1).
+    :type gauss_order:          int
+    :param rel_tol:             if set, the order is doubled (starting with gauss_order) for all splines whose length
+                                changes by more than rel_tol (relative) until all lengths have converged.
+    :type rel_tol:              float
 
     .. outputs::
     :return spline_lengths:     length of every spline segment.
@@ -40,44 +45,57 @@ def calc_spline_lengths(coeffs_x: np.ndarray,
     if coeffs_x.shape[0] != coeffs_y.shape[0]:
         raise RuntimeError("Coefficient matrices must have the same length!")
 
+    if gauss_order < 1:
+        raise RuntimeError("gauss_order must be at least 1!")
+
     # catch case with only one spline
     if coeffs_x.size == 4 and coeffs_x.shape[0] == 4:
         coeffs_x = np.expand_dims(coeffs_x, 0)
         coeffs_y = np.expand_dims(coeffs_y, 0)
 
-    # get number of splines and create output array
-    no_splines = coeffs_x.shape[0]
-    spline_lengths = np.zeros(no_splines)
-
     # ------------------------------------------------------------------------------------------------------------------
     # CALCULATE LENGHTS ------------------------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
 
     if quickndirty:
-        for i in range(no_splines):
-            spline_lengths[i] = math.sqrt(math.pow(np.sum(coeffs_x[i]) - coeffs_x[i, 0], 2)
-                                          + math.pow(np.sum(coeffs_y[i]) - coeffs_y[i, 0], 2))
+        spline_lengths = np.hypot(np.sum(coeffs_x[:, 1:], axis=1), np.sum(coeffs_y[:, 1:], axis=1))
 
     else:
-        # loop through all the splines and calculate intermediate coordinates
-        t_steps = np.linspace(0.0, 1.0, no_interp_points)
-        spl_coords = np.zeros((no_interp_points, 2))
-
-        for i in range(no_splines):
-            spl_coords[:, 0] = coeffs_x[i, 0] \
-                               + coeffs_x[i, 1] * t_steps \
-                               + coeffs_x[i, 2] * np.power(t_steps, 2) \
-                               + coeffs_x[i, 3] * np.power(t_steps, 3)
-            spl_coords[:, 1] = coeffs_y[i, 0] \
-                               + coeffs_y[i, 1] * t_steps \
-                               + coeffs_y[i, 2] * np.power(t_steps, 2) \
-                               + coeffs_y[i, 3] * np.power(t_steps, 3)
-
-            spline_lengths[i] = np.sum(np.sqrt(np.sum(np.power(np.diff(spl_coords, axis=0), 2), axis=1)))
+        spline_lengths = _calc_gauss_lengths(coeffs_x=coeffs_x, coeffs_y=coeffs_y, gauss_order=gauss_order)
+
+        if rel_tol is not None:
+            # refine only the splines that have not converged yet (the order is limited to keep the effort bounded)
+            inds = np.arange(spline_lengths.size)
+
+            while inds.size > 0 and gauss_order < 128:
+                gauss_order *= 2
+                lengths_tmp = _calc_gauss_lengths(coeffs_x=coeffs_x[inds],
+                                                  coeffs_y=coeffs_y[inds],
+                                                  gauss_order=gauss_order)
+
+                converged = np.abs(lengths_tmp - spline_lengths[inds]) <= rel_tol * lengths_tmp
+                spline_lengths[inds] = lengths_tmp
+                inds = inds[np.invert(converged)]
 
     return spline_lengths
 
 
+def _calc_gauss_lengths(coeffs_x: np.ndarray,
+                        coeffs_y: np.ndarray,
+                        gauss_order: int) -> np.ndarray:
+
+    # Gauss-Legendre nodes and weights transformed from [-1, 1] to [0, 1]
+    nodes, weights = np.polynomial.legendre.leggauss(gauss_order)
+    t = 0.5 * (nodes + 1.0)
+    weights = 0.5 * weights
+
+    # first derivatives of all splines at all nodes (no_splines x gauss_order, Horner scheme)
+    x_d = (3 * coeffs_x[:, 3:4] * t + 2 * coeffs_x[:, 2:3]) * t + coeffs_x[:, 1:2]
+    y_d = (3 * coeffs_y[:, 3:4] * t + 2 * coeffs_y[:, 2:3]) * t + coeffs_y[:, 1:2]
+
+    return np.dot(np.sqrt(x_d * x_d + y_d * y_d), weights)
+
+
 # testing --------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
     pass
@@ -1,12 +1,30 @@
 import numpy as np
 import math
+import os
+
+# memory estimates of the strategies (peak of the numpy allocations): bytes per spline of the banded solution and of
+# the stitching of the segmented solution (plus the banded solutions of the concurrent segments), bytes per squared
+# number of splines of the dense LES matrix M (4 * no_splines rows and columns) and bytes per worker process of the
+# segmented solution (interpreter with numpy and scipy if the process is spawned)
+MEMORY_BANDED = 288.0
+MEMORY_SEGMENTED = 200.0
+MEMORY_DENSE = 128.0
+MEMORY_WORKER = 50.0 * 1024.0 ** 2
+
+# maximum number of splines per segment if the number of segments is chosen automatically
+SEGMENT_SPLINES_MAX = 10000
 
 
 def calc_splines(path: np.ndarray,
                  el_lengths: np.ndarray = None,
                  psi_s: float = None,
                  psi_e: float = None,
-                 use_dist_scaling: bool = True) -> tuple:
+                 use_dist_scaling: bool = True,
+                 calc_les_mat: bool = False,
+                 max_memory_mb: float = None,
+                 no_segments: int = None,
+                 segment_overlap: int = 32,
+                 stats: dict = None) -> tuple:
     """
     author:
     Tim Stahl & Alexander Heilmeier
@@ -37,13 +55,28 @@ def calc_splines(path: np.ndarray,
     :param use_dist_scaling:    bool flag to indicate if heading and curvature scaling should be performed. This should
                                 be done if the distances between the points in the path are not equal.
     :type use_dist_scaling:     bool
+    :param calc_les_mat:        bool flag to indicate if the dense LES matrix M should be built and returned. It is not
+                                required to solve for the coefficients and takes O(no_splines²) memory.
+    :type calc_les_mat:         bool
+    :param max_memory_mb:       [MB] memory budget, the strategy is chosen such that its estimated memory fits into it
+                                (see select_strategy), None for no limit.
+    :type max_memory_mb:        float
+    :param no_segments:         number of segments of the segmented strategy (closed paths only): None to use it only
+                                if the banded strategy does not fit into the budget, 1 to never use it, > 1 to prefer
+                                it.
+    :type no_segments:          int
+    :param segment_overlap:     number of points the segments overlap on both sides (see calc_splines_segmented).
+    :type segment_overlap:      int
+    :param stats:               dict the used strategy and its estimated memory in MB (keys "strategy" and "memory_mb")
+                                are written to, None to deactivate.
+    :type stats:                dict
 
     .. outputs::
     :return x_coeff:            spline coefficients of the x-component.
     :rtype x_coeff:             np.ndarray
     :return y_coeff:            spline coefficients of the y-component.
     :rtype y_coeff:             np.ndarray
-    :return M:                  LES coefficients.
+    :return M:                  LES coefficients (None if calc_les_mat is False).
     :rtype M:                   np.ndarray
     :return normvec_normalized: normalized normal vectors [x, y].
     :rtype normvec_normalized:  np.ndarray
@@ -55,6 +88,14 @@ def calc_splines(path: np.ndarray,
     automatically if the path was inserted closed.
 
     Coefficient matrices have the form a_0i, a_1i * t, a_2i * t^2, a_3i * t^3.
+
+    The coefficients are not obtained from the dense system M but from the equivalent (cyclic) tridiagonal system in
+    the second derivatives at the spline starting points, which is solved for x and y together in O(no_splines).
+
+    The strategy is chosen from the number of splines before any large allocation: "dense" if M is requested or the
+    closed path has less than three splines, "banded" (tridiagonal system) otherwise, or "segmented" (overlapping
+    segments solved in parallel, see calc_splines_segmented) for closed paths. A MemoryError is raised up front if the
+    estimated memory of no strategy fits into max_memory_mb.
     """
 
     # check if path is closed
@@ -84,12 +125,298 @@ def calc_splines(path: np.ndarray,
     # get number of splines
     no_splines = path.shape[0] - 1
 
+    # choose strategy before any large allocation (segments are stitched with euclidean distance scaling)
+    strategy, no_segments, max_workers, memory_mb = select_strategy(no_splines=no_splines,
+                                                                    closed=closed,
+                                                                    calc_les_mat=calc_les_mat,
+                                                                    max_memory_mb=max_memory_mb,
+                                                                    no_segments=no_segments if use_dist_scaling else 1,
+                                                                    segment_overlap=segment_overlap)
+
+    if stats is not None:
+        stats["strategy"] = strategy
+        stats["memory_mb"] = memory_mb
+
+    if strategy == "segmented":
+        from helper_functions import calc_splines_segmented
+
+        return calc_splines_segmented.calc_splines_segmented(path=path,
+                                                             no_segments=no_segments,
+                                                             overlap=segment_overlap,
+                                                             max_workers=max_workers)
+
     # calculate scaling factors between every pair of splines
     if use_dist_scaling:
         scaling = el_lengths[:-1] / el_lengths[1:]
     else:
         scaling = np.ones(no_splines - 1)
 
+    # ------------------------------------------------------------------------------------------------------------------
+    # SOLVE ------------------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # the cyclic tridiagonal system is degenerated for less than three splines -> solve the dense system in this case
+    if closed and no_splines < 3:
+        M, b_x, b_y = _calc_les_mat(path=path,
+                                    el_lengths=el_lengths,
+                                    psi_s=psi_s,
+                                    psi_e=psi_e,
+                                    closed=closed,
+                                    scaling=scaling)
+
+        x_les = np.squeeze(np.linalg.solve(M, b_x))  # squeeze removes single-dimensional entries
+        y_les = np.squeeze(np.linalg.solve(M, b_y))
+
+        # get coefficients of every piece into one row -> reshape
+        coeffs_x = np.reshape(x_les, (no_splines, 4))
+        coeffs_y = np.reshape(y_les, (no_splines, 4))
+
+    else:
+        coeffs_x, coeffs_y = _calc_coeffs_banded(path=path,
+                                                 el_lengths=el_lengths,
+                                                 psi_s=psi_s,
+                                                 psi_e=psi_e,
+                                                 closed=closed,
+                                                 scaling=scaling)
+
+        if calc_les_mat:
+            M = _calc_les_mat(path=path,
+                              el_lengths=el_lengths,
+                              psi_s=psi_s,
+                              psi_e=psi_e,
+                              closed=closed,
+                              scaling=scaling)[0]
+        else:
+            M = None
+
+    # get normal vector (behind used here instead of ahead for consistency with other functions) (second coefficient of
+    # cubic splines is relevant for the heading)
+    normvec = np.stack((coeffs_y[:, 1], -coeffs_x[:, 1]), axis=1)
+
+    # normalize normal vectors
+    norm_factors = 1.0 / np.sqrt(np.sum(np.power(normvec, 2), axis=1))
+    normvec_normalized = np.expand_dims(norm_factors, axis=1) * normvec
+
+    return coeffs_x, coeffs_y, M, normvec_normalized
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# STRATEGY -------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------
+
+def select_strategy(no_splines: int,
+                    closed: bool = True,
+                    calc_les_mat: bool = False,
+                    max_memory_mb: float = None,
+                    no_segments: int = None,
+                    segment_overlap: int = 32) -> tuple:
+    """
+    Choose the strategy of calc_splines for no_splines splines (see calc_splines for the inputs). The candidates are
+    tried in the order of preference, the first one whose estimated memory fits into max_memory_mb is returned as
+    (strategy, number of segments, number of worker processes, estimated memory in MB). The segmented strategy uses as
+    many worker processes as fit into the budget (one meaning that the segments are solved one after another without
+    worker processes). Raises a MemoryError if no strategy fits.
+    """
+
+    if calc_les_mat or (closed and no_splines < 3):
+        candidates = ["dense"]
+    elif not closed or no_segments == 1:
+        candidates = ["banded"]
+    elif no_segments is None:
+        candidates = ["banded", "segmented"]
+    else:
+        candidates = ["segmented", "banded"]
+
+    # automatic number of segments: several per CPU and small segments for a small memory footprint, every segment at
+    # least segment_overlap splines long
+    if no_segments is None:
+        no_segments = max(4 * (os.cpu_count() or 1), math.ceil(no_splines / SEGMENT_SPLINES_MAX))
+
+    no_segments = min(no_segments, no_splines // max(segment_overlap, 1))
+
+    if no_segments < 2 and "segmented" in candidates:
+        candidates.remove("segmented")
+
+    memory_mb = {}
+
+    for strategy in candidates:
+        # segmented: try the most concurrent worker processes first
+        workers = range(min(no_segments, os.cpu_count() or 1), 0, -1) if strategy == "segmented" else [1]
+
+        for max_workers in workers:
+            memory_mb[strategy] = estimate_memory(no_splines=no_splines,
+                                                  strategy=strategy,
+                                                  no_segments=no_segments,
+                                                  segment_overlap=segment_overlap,
+                                                  max_workers=max_workers)
+
+            if max_memory_mb is None or memory_mb[strategy] <= max_memory_mb:
+                return strategy, no_segments if strategy == "segmented" else 1, max_workers, memory_mb[strategy]
+
+    raise MemoryError("Spline calculation of %i splines does not fit into the memory budget of %gMB (estimated %s),"
+                      " increase the budget or the stepsize!"
+                      % (no_splines, max_memory_mb,
+                         ", ".join("%s: %.2fMB" % (strategy, memory_mb[strategy]) for strategy in candidates)))
+
+
+def estimate_memory(no_splines: int,
+                    strategy: str,
+                    no_segments: int = 1,
+                    segment_overlap: int = 32,
+                    max_workers: int = 1) -> float:
+    """
+    Estimate the peak memory in MB of calc_splines for no_splines splines using the given strategy ("dense", "banded"
+    or "segmented" with max_workers concurrent worker processes, one meaning that the segments are solved one after
+    another without worker processes).
+    """
+
+    if strategy == "banded":
+        memory = MEMORY_BANDED * no_splines
+    elif strategy == "dense":
+        memory = MEMORY_DENSE * no_splines ** 2 + MEMORY_BANDED * no_splines
+    elif strategy == "segmented":
+        no_splines_seg = math.ceil(no_splines / no_segments) + 2 * segment_overlap
+        memory = MEMORY_SEGMENTED * no_splines + max_workers * MEMORY_BANDED * no_splines_seg
+
+        if max_workers > 1:
+            memory += max_workers * MEMORY_WORKER
+    else:
+        raise ValueError("Unknown spline calculation strategy %s!" % strategy)
+
+    return memory / 1024.0 ** 2
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# BANDED SOLUTION ------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------
+
+def _calc_coeffs_banded(path: np.ndarray,
+                        el_lengths: np.ndarray,
+                        psi_s: float,
+                        psi_e: float,
+                        closed: bool,
+                        scaling: np.ndarray) -> tuple:
+    """
+    Solve for the spline coefficients using the second derivatives K_i = 2 * a_2i at the beginning of every spline as
+    unknowns. Within spline i the remaining coefficients follow from the point and the curvature conditions:
+
+    a_0i = {x,y}_i
+    a_1i = d_i - K_i / 3 - L_i / 6
+    a_2i = K_i / 2
+    a_3i = (L_i - K_i) / 6
+
+    with d_i = {x,y}_i+1 - {x,y}_i and L_i = c_i * K_i+1 being the second derivative at the end of spline i (curvature
+    condition, c_i = scaling_i²). The heading condition between spline i and i + 1 then reads
+
+    K_i / 6 + (c_i + s_i) / 3 * K_i+1 + s_i * c_i+1 / 6 * K_i+2 = s_i * d_i+1 - d_i
+
+    which is a tridiagonal system (cyclic for a closed path). An unclosed path gets the end point second derivative
+    K_no_splines = L_no_splines-1 as additional unknown and the heading conditions at start and end point as first and
+    last row.
+    """
+
+    from scipy import linalg
+
+    no_splines = path.shape[0] - 1
+    d = np.diff(path, axis=0)
+
+    # scaling factors between every pair of splines (the one at the closing point is 1.0 if no scaling is used)
+    s = np.ones(no_splines)
+    s[:scaling.size] = scaling
+
+    if closed:
+        c = np.power(s, 2)
+
+        # row r contains the heading condition between spline r - 1 and spline r (wraps around for r = 0)
+        s_prev = np.roll(s, 1)
+        sub = np.full(no_splines, 1.0 / 6.0)
+        diag = (np.roll(c, 1) + s_prev) / 3.0
+        sup = s_prev * c / 6.0
+        rhs = np.expand_dims(s_prev, 1) * d - np.roll(d, 1, axis=0)
+
+        # corner elements of the cyclic system: A[0, -1] = sub[0], A[-1, 0] = sup[-1] -> Sherman-Morrison correction
+        # A = B + u * v^T with B being tridiagonal
+        gamma = -diag[0]
+        u = np.zeros(no_splines)
+        u[0] = gamma
+        u[-1] = sup[-1]
+        v = np.zeros(no_splines)
+        v[0] = 1.0
+        v[-1] = sub[0] / gamma
+
+        ab = np.zeros((3, no_splines))
+        ab[0, 1:] = sup[:-1]
+        ab[1] = diag
+        ab[1, 0] -= gamma
+        ab[1, -1] -= sup[-1] * sub[0] / gamma
+        ab[2, :-1] = sub[1:]
+
+        # solve for x, y and the correction vector at once
+        sol = linalg.solve_banded((1, 1), ab, np.column_stack((rhs, u)), check_finite=False)
+        z = sol[:, 2]
+        ys = sol[:, :2]
+        K = ys - np.outer(z, np.dot(v, ys) / (1.0 + np.dot(v, z)))
+
+        L = np.expand_dims(c, 1) * np.roll(K, -1, axis=0)
+
+    else:
+        # curvature at the end point is not linked to a following spline -> c = 1.0 for the last spline
+        c = np.ones(no_splines)
+        c[:-1] = np.power(s[:-1], 2)
+
+        el_length_s = 1.0 if el_lengths is None else el_lengths[0]
+        el_length_e = 1.0 if el_lengths is None else el_lengths[-1]
+
+        ab = np.zeros((3, no_splines + 1))
+        rhs = np.zeros((no_splines + 1, 2))
+
+        # heading start point (evaluated at t = 0)
+        ab[1, 0] = -1.0 / 3.0
+        ab[0, 1] = -c[0] / 6.0
+        rhs[0] = np.array([math.cos(psi_s + math.pi / 2), math.sin(psi_s + math.pi / 2)]) * el_length_s - d[0]
+
+        # heading conditions between the splines
+        if no_splines > 1:
+            ab[2, :no_splines - 1] = 1.0 / 6.0
+            ab[1, 1:no_splines] = (c[:-1] + s[:-1]) / 3.0
+            ab[0, 2:] = s[:-1] * c[1:] / 6.0
+            rhs[1:no_splines] = np.expand_dims(s[:-1], 1) * d[1:] - d[:-1]
+
+        # heading end point (evaluated at t = 1)
+        ab[2, no_splines - 1] = 1.0 / 6.0
+        ab[1, no_splines] = 1.0 / 3.0
+        rhs[-1] = np.array([math.cos(psi_e + math.pi / 2), math.sin(psi_e + math.pi / 2)]) * el_length_e - d[-1]
+
+        K_cl = linalg.solve_banded((1, 1), ab, rhs, check_finite=False)
+        K = K_cl[:-1]
+        L = np.expand_dims(c, 1) * K_cl[1:]
+
+    coeffs = np.zeros((no_splines, 4, 2))
+    coeffs[:, 0] = path[:-1]
+    coeffs[:, 1] = d - K / 3.0 - L / 6.0
+    coeffs[:, 2] = K / 2.0
+    coeffs[:, 3] = (L - K) / 6.0
+
+    return coeffs[:, :, 0], coeffs[:, :, 1]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# DENSE LINEAR EQUATION SYSTEM -----------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------
+
+def _calc_les_mat(path: np.ndarray,
+                  el_lengths: np.ndarray,
+                  psi_s: float,
+                  psi_e: float,
+                  closed: bool,
+                  scaling: np.ndarray) -> tuple:
+    """
+    Set up the dense LES M * {x; y} = {b_x; b_y} with four rows per spline (point, point, heading and curvature
+    conditions). Returns M, b_x and b_y.
+    """
+
+    no_splines = path.shape[0] - 1
+
     # ------------------------------------------------------------------------------------------------------------------
     # DEFINE LINEAR EQUATION SYSTEM ------------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
@@ -174,31 +501,11 @@ def calc_splines(path: np.ndarray,
         # b_x[-1] = 0
         # b_y[-1] = 0
 
-    # ------------------------------------------------------------------------------------------------------------------
-    # SOLVE ------------------------------------------------------------------------------------------------------------
-    # ------------------------------------------------------------------------------------------------------------------
-
-    x_les = np.squeeze(np.linalg.solve(M, b_x))  # squeeze removes single-dimensional entries
-    y_les = np.squeeze(np.linalg.solve(M, b_y))
-
-    # get coefficients of every piece into one row -> reshape
-    coeffs_x = np.reshape(x_les, (no_splines, 4))
-    coeffs_y = np.reshape(y_les, (no_splines, 4))
-
-    # get normal vector (behind used here instead of ahead for consistency with other functions) (second coefficient of
-    # cubic splines is relevant for the heading)
-    normvec = np.stack((coeffs_y[:, 1], -coeffs_x[:, 1]), axis=1)
-
-    # normalize normal vectors
-    norm_factors = 1.0 / np.sqrt(np.sum(np.power(normvec, 2), axis=1))
-    normvec_normalized = np.expand_dims(norm_factors, axis=1) * normvec
-
-    return coeffs_x, coeffs_y, M, normvec_normalized
+    return M, b_x, b_y
 
 
 # testing --------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
-    import os
     import sys
     import matplotlib.pyplot as plt
     sys.path.append(os.path.dirname(__file__))
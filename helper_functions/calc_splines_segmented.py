@@ -0,0 +1,119 @@
+import numpy as np
+import math
+import concurrent.futures
+from helper_functions import calc_splines
+
+
+def calc_splines_segmented(path: np.ndarray,
+                           no_segments: int,
+                           overlap: int = 32,
+                           max_workers: int = None) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Solve for the curvature continuous cubic splines of a closed path (same outputs as calc_splines) by splitting it
+    into no_segments segments which are calculated in parallel worker processes (domain decomposition for very long
+    tracks).
+
+    Every segment is extended by overlap points on both sides and solved as unclosed spline (calc_splines with psi_s and
+    psi_e) with the headings at its ends estimated from the neighbouring points. Only the second derivatives at the
+    points of the core of every segment are kept, the influence of the estimated headings decays by a factor of about
+    0.27 per spline towards the core. The splines of the whole track are then stitched together from the points and
+    the second derivatives (see calc_splines), i.e. the curvature is continuous at the joins by construction and the
+    heading is continuous within the tolerance given by the overlap (for the default overlap the result matches
+    calc_splines up to rounding errors on evenly spaced points).
+
+    Inputs:
+    path:               closed path [x, y] (first point = last point)
+    no_segments:        number of segments (reduced such that every segment is at least overlap splines long, the
+                        path is solved as one problem by calc_splines if less than two segments remain)
+    overlap:            number of points every segment is extended by on both sides
+    max_workers:        maximum number of worker processes (number of CPUs if None), 1 to solve the segments one after
+                        another in this process (smallest memory footprint, see calc_splines.select_strategy)
+
+    Outputs:
+    coeffs_x:           spline coefficients of the x-component
+    coeffs_y:           spline coefficients of the y-component
+    M:                  LES coefficients (always None, the dense LES is not built)
+    normvec_normalized: normalized normal vectors [x, y]
+    """
+
+    if not np.all(np.isclose(path[0], path[-1])):
+        raise RuntimeError("Segmented spline calculation requires a closed path!")
+
+    if overlap < 1:
+        raise ValueError("Segments must overlap by at least one point!")
+
+    no_splines = path.shape[0] - 1
+    no_segments = min(no_segments, no_splines // overlap)
+
+    if no_segments < 2:
+        return calc_splines.calc_splines(path=path)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SOLVE SEGMENTS ---------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    points = path[:-1]
+    bounds = np.round(np.linspace(0, no_splines, no_segments + 1)).astype(int)
+
+    # points of the extended segments (indices modulo no_splines) and headings at their ends
+    paths_seg = [points[np.mod(np.arange(a - overlap, b + overlap + 1), no_splines)]
+                 for a, b in zip(bounds[:-1], bounds[1:])]
+    psis_s = [_estimate_psi(points=points, ind=a - overlap) for a in bounds[:-1]]
+    psis_e = [_estimate_psi(points=points, ind=b + overlap) for b in bounds[1:]]
+
+    if max_workers == 1:
+        K_segs = list(map(_calc_segment, paths_seg, psis_s, psis_e))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            K_segs = list(executor.map(_calc_segment, paths_seg, psis_s, psis_e))
+
+    # second derivatives at the points of the segment cores
+    K = np.vstack([K_seg[overlap:overlap + b - a] for K_seg, a, b in zip(K_segs, bounds[:-1], bounds[1:])])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # STITCH SEGMENTS --------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # coefficients from the points and second derivatives as in calc_splines (scaling of a closed path)
+    d = np.diff(path, axis=0)
+    el_lengths = np.hypot(d[:, 0], d[:, 1])
+    c = np.power(el_lengths / np.roll(el_lengths, -1), 2)
+    L = np.expand_dims(c, 1) * np.roll(K, -1, axis=0)
+
+    coeffs = np.zeros((no_splines, 4, 2))
+    coeffs[:, 0] = points
+    coeffs[:, 1] = d - K / 3.0 - L / 6.0
+    coeffs[:, 2] = K / 2.0
+    coeffs[:, 3] = (L - K) / 6.0
+
+    normvec = np.column_stack((coeffs[:, 1, 1], -coeffs[:, 1, 0]))
+    normvec_normalized = normvec / np.expand_dims(np.hypot(normvec[:, 0], normvec[:, 1]), 1)
+
+    return coeffs[:, :, 0], coeffs[:, :, 1], None, normvec_normalized
+
+
+def _estimate_psi(points: np.ndarray,
+                  ind: int) -> float:
+    # heading at point ind (modulo the number of points) from its neighbours (psi = 0 pointing north, see calc_splines)
+    no_points = points.shape[0]
+    diff = points[(ind + 1) % no_points] - points[(ind - 1) % no_points]
+
+    return math.atan2(diff[1], diff[0]) - math.pi / 2
+
+
+def _calc_segment(path: np.ndarray,
+                  psi_s: float,
+                  psi_e: float) -> np.ndarray:
+    # evaluated in a worker process, returns the second derivatives [x, y] at the starting points of the splines
+    coeffs_x, coeffs_y = calc_splines.calc_splines(path=path, psi_s=psi_s, psi_e=psi_e)[:2]
+
+    return 2.0 * np.column_stack((coeffs_x[:, 2], coeffs_y[:, 2]))
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
@@ -3,13 +3,16 @@ import numpy as np
 
 def check_normals_crossing(track: np.ndarray,
                            normvec_normalized: np.ndarray,
-                           horizon: int = 10) -> bool:
+                           horizon: int = 10,
+                           global_check: bool = False,
+                           check_inds: np.ndarray = None) -> list:
     """
     author:
     Alexander Heilmeier
 
     .. description::
-    This function checks spline normals for crossings. Returns True if a crossing was found, otherwise False.
+    This function checks spline normals for crossings. Returns the index pairs of all crossing normals (an empty list,
+    i.e. False, if no crossing was found).
 
     .. inputs::
     :param track:               array containing the track [x, y, w_tr_right, w_tr_left] to check
@@ -20,60 +23,120 @@ def check_normals_crossing(track: np.ndarray,
     :param horizon:             determines the number of normals in forward and backward direction that are checked
                                 against each normal on the line
     :type horizon:              int
+    :param global_check:        if True, every pair of normals on the track is checked (using a spatial index over the
+                                normals) instead of only the neighbours within the horizon. This also finds crossings
+                                between distant parts of the track, e.g. where it doubles back.
+    :type global_check:         bool
+    :param check_inds:          if given, only the normals at these indices are checked (against all normals they are
+                                compared with otherwise), e.g. after the track was changed locally.
+    :type check_inds:           np.ndarray
 
     .. outputs::
-    :return found_crossing:     bool value indicating if a crossing was found or not
-    :rtype found_crossing:      bool
+    :return crossings:          list of index pairs (i, j) with i < j of the crossing normals
+    :rtype crossings:           list
 
     .. notes::
-    The checks can take a while if full check is performed. Inputs are unclosed.
+    Inputs are unclosed. The normals are considered between -w_tr_left and w_tr_right.
     """
 
     # check input
     no_points = track.shape[0]
 
-    if horizon >= no_points:
-        raise RuntimeError("Horizon of %i points is too large for a track with %i points, reduce horizon!"
-                           % (horizon, no_points))
+    if global_check:
+        from scipy import spatial
 
-    elif horizon >= no_points / 2:
-        print("WARNING: Horizon of %i points makes no sense for a track with %i points, reduce horizon!"
-              % (horizon, no_points))
+        # normals are line segments from the left to the right boundary -> two normals can only cross if the distance
+        # between their centers is less than the sum of their half lengths
+        half_lengths = 0.5 * (track[:, 2] + track[:, 3])
+        centers = track[:, :2] + normvec_normalized * np.expand_dims(0.5 * (track[:, 2] - track[:, 3]), axis=1)
 
-    # initialization
-    les_mat = np.zeros((2, 2))
-    idx_list = list(range(0, no_points))
-    idx_list = idx_list[-horizon:] + idx_list + idx_list[:horizon]
+        tree = spatial.cKDTree(centers)
 
-    # loop through all points of the track to check for crossings in their neighbourhoods
-    for idx in range(no_points):
+        try:
+            candidates = tree.query_pairs(r=2.0 * np.amax(half_lengths), output_type="ndarray")
+        except TypeError:
+            # scipy < 1.6 returns a set of pairs only
+            candidates = np.array(list(tree.query_pairs(r=2.0 * np.amax(half_lengths))), dtype=int)
 
-        # determine indices of points in the neighbourhood of the current index
-        idx_neighbours = idx_list[idx:idx + 2 * horizon + 1]
-        del idx_neighbours[horizon]
-        idx_neighbours = np.array(idx_neighbours)
+        candidates = np.reshape(candidates, (-1, 2))
 
-        # remove indices of normal vectors that are collinear to the current index
-        is_collinear_b = np.isclose(np.cross(normvec_normalized[idx], normvec_normalized[idx_neighbours]), 0.0)
-        idx_neighbours_rel = idx_neighbours[np.nonzero(np.invert(is_collinear_b))[0]]
+        rel = np.hypot(*(centers[candidates[:, 0]] - centers[candidates[:, 1]]).T) \
+            <= half_lengths[candidates[:, 0]] + half_lengths[candidates[:, 1]]
+        candidates = candidates[rel]
 
-        # check crossings solving an LES
-        for idx_comp in list(idx_neighbours_rel):
+        if check_inds is not None:
+            candidates = candidates[np.isin(candidates, check_inds).any(axis=1)]
 
-            # LES: x_1 + lambda_1 * nx_1 = x_2 + lambda_2 * nx_2; y_1 + lambda_1 * ny_1 = y_2 + lambda_2 * ny_2;
-            const = track[idx_comp, :2] - track[idx, :2]
-            les_mat[:, 0] = normvec_normalized[idx]
-            les_mat[:, 1] = -normvec_normalized[idx_comp]
+        crossing = _check_crossings(track=track,
+                                    normvec_normalized=normvec_normalized,
+                                    idx=candidates[:, 0],
+                                    idx_comp=candidates[:, 1])
+        crossings = candidates[crossing]
 
-            # solve LES
-            lambdas = np.linalg.solve(les_mat, const)
+    else:
+        if horizon >= no_points:
+            raise RuntimeError("Horizon of %i points is too large for a track with %i points, reduce horizon!"
+                               % (horizon, no_points))
 
-            # we have a crossing within the relevant part if both lambdas lie between -w_tr_left and w_tr_right
-            if -track[idx, 3] <= lambdas[0] <= track[idx, 2] \
-                    and -track[idx_comp, 3] <= lambdas[1] <= track[idx_comp, 2]:
-                return True  # found crossing
+        elif horizon >= no_points / 2:
+            print("WARNING: Horizon of %i points makes no sense for a track with %i points, reduce horizon!"
+                  % (horizon, no_points))
 
-    return False
+        # check every normal against its neighbours in forward direction (the backward direction is covered by the
+        # checks of the neighbours themselves), all points at once -> both directions if only some normals are checked
+        if check_inds is None:
+            idx = np.arange(no_points)
+            directions = (1,)
+        else:
+            idx = np.unique(np.mod(check_inds, no_points))
+            directions = (1, -1)
+
+        crossings = [np.zeros((0, 2), dtype=int)]
+
+        for k in range(1, horizon + 1):
+            for direction in directions:
+                idx_comp = np.mod(idx + direction * k, no_points)
+                crossing = _check_crossings(track=track,
+                                            normvec_normalized=normvec_normalized,
+                                            idx=idx,
+                                            idx_comp=idx_comp)
+                crossings.append(np.column_stack((idx[crossing], idx_comp[crossing])))
+
+        crossings = np.vstack(crossings)
+
+    # sort indices within and order of the pairs, remove duplicates (possible for large horizons)
+    crossings = np.unique(np.sort(crossings, axis=1), axis=0)
+
+    return [(int(i), int(j)) for i, j in crossings]
+
+
+def _check_crossings(track: np.ndarray,
+                     normvec_normalized: np.ndarray,
+                     idx: np.ndarray,
+                     idx_comp: np.ndarray) -> np.ndarray:
+    """
+    Check the normals at idx against the normals at idx_comp for crossings (elementwise). Returns a bool array.
+    """
+
+    # LES: x_1 + lambda_1 * nx_1 = x_2 + lambda_2 * nx_2; y_1 + lambda_1 * ny_1 = y_2 + lambda_2 * ny_2; solved
+    # analytically (Cramer's rule) for all pairs at once
+    n_1 = normvec_normalized[idx]
+    n_2 = normvec_normalized[idx_comp]
+    const = track[idx_comp, :2] - track[idx, :2]
+
+    det = n_1[:, 0] * n_2[:, 1] - n_1[:, 1] * n_2[:, 0]
+
+    # normal vectors that are collinear cannot cross
+    is_collinear_b = np.isclose(det, 0.0)
+    det[is_collinear_b] = 1.0
+
+    lambda_1 = (const[:, 0] * n_2[:, 1] - const[:, 1] * n_2[:, 0]) / det
+    lambda_2 = (const[:, 0] * n_1[:, 1] - const[:, 1] * n_1[:, 0]) / det
+
+    # we have a crossing within the relevant part if both lambdas lie between -w_tr_left and w_tr_right
+    return np.invert(is_collinear_b) \
+        & (-track[idx, 3] <= lambda_1) & (lambda_1 <= track[idx, 2]) \
+        & (-track[idx_comp, 3] <= lambda_2) & (lambda_2 <= track[idx_comp, 2])
 
 
 # testing --------------------------------------------------------------------------------------------------------------
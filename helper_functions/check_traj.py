@@ -8,7 +8,9 @@ def check_traj(reftrack: np.ndarray,
                length_veh: float,
                width_veh: float,
                debug: bool,
-               curvlim: float) -> tuple:
+               curvlim: float,
+               stats: dict = None,
+               report: bool = True) -> tuple:
     """
     Created by:
     Alexander Heilmeier
@@ -25,6 +27,10 @@ def check_traj(reftrack: np.ndarray,
     width_veh:          vehicle width in m
     debug:              boolean showing if debug messages should be printed
     curvlim:            [rad/m] maximum drivable curvature
+    stats:              dict the minimum distance to the boundaries and the maximum absolute curvature are written to
+                        (keys "min_dist" and "kappa_max"), None to deactivate
+    report:             print the results (see report_check_traj), False e.g. to print them later for results replayed
+                        from a cache
 
     Outputs:
     bound_r:            right track boundary [x_m, y_m]
@@ -43,17 +49,8 @@ def check_traj(reftrack: np.ndarray,
     bound_r_tmp = np.column_stack((bound_r, np.zeros((bound_r.shape[0], 2))))
     bound_l_tmp = np.column_stack((bound_l, np.zeros((bound_l.shape[0], 2))))
 
-    bound_r_interp = interp_track.interp_track(
-        track=bound_r_tmp, 
-        stepsize=1.0, 
-        original_figname = "original_right_boundary.png", 
-        linear_interpolated_figname = "linear_interpolated_right_boundary.png")[0]
-    
-    bound_l_interp = interp_track.interp_track(
-        track=bound_l_tmp, 
-        stepsize=1.0,
-        original_figname = "original_left_boundary.png", 
-        linear_interpolated_figname = "linear_interpolated_left_boundary.png")[0]
+    bound_r_interp = interp_track.interp_track(track=bound_r_tmp, stepsize=1.0)[:, :2]
+    bound_l_interp = interp_track.interp_track(track=bound_l_tmp, stepsize=1.0)[:, :2]
 
     # calculate minimum distances of every trajectory point to the boundaries
     min_dists = calc_min_bound_dists.calc_min_bound_dists(trajectory=trajectory,
@@ -63,9 +60,34 @@ def check_traj(reftrack: np.ndarray,
                                                           width_veh=width_veh)
 
     # calculate overall minimum distance
-    min_dist = np.amin(min_dists)
+    min_dist = float(np.amin(min_dists))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # CHECK FINAL TRAJECTORY FOR MAXIMUM CURVATURE ---------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # maximum (absolute) curvature
+    kappa_max = float(np.amax(np.abs(trajectory[:, 4])))
+
+    if stats is not None:
+        stats["min_dist"] = min_dist
+        stats["kappa_max"] = kappa_max
+
+    if report:
+        report_check_traj(min_dist=min_dist, kappa_max=kappa_max, curvlim=curvlim, debug=debug)
+
+    return bound_r, bound_l
+
+
+def report_check_traj(min_dist: float,
+                      kappa_max: float,
+                      curvlim: float,
+                      debug: bool) -> None:
+    """
+    Print the results of check_traj: warn if the minimum distance to the boundaries falls below a safety margin of 1.0m
+    or if the maximum absolute curvature kappa_max exceeds curvlim.
+    """
 
-    # warn if distance falls below a safety margin of 1.0 m
     if min_dist < 1.0:
         print("WARNING: Minimum distance to boundaries is estimated to %.2fm. Keep in mind that the distance can also"
               " lie on the outside of the track!" % min_dist)
@@ -73,15 +95,8 @@ def check_traj(reftrack: np.ndarray,
         print("INFO: Minimum distance to boundaries is estimated to %.2fm. Keep in mind that the distance can also lie"
               " on the outside of the track!" % min_dist)
 
-    # ------------------------------------------------------------------------------------------------------------------
-    # CHECK FINAL TRAJECTORY FOR MAXIMUM CURVATURE ---------------------------------------------------------------------
-    # ------------------------------------------------------------------------------------------------------------------
-
-    # check maximum (absolute) curvature
-    if np.amax(np.abs(trajectory[:, 4])) > curvlim:
-        print("WARNING: Curvature limit is exceeded: %.3frad/m" % np.amax(np.abs(trajectory[:, 4])))
-
-    return bound_r, bound_l
+    if kappa_max > curvlim:
+        print("WARNING: Curvature limit is exceeded: %.3frad/m" % kappa_max)
 
 
 # testing --------------------------------------------------------------------------------------------------------------
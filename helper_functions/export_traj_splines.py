@@ -1,11 +1,15 @@
 import numpy as np
-
+import json
+import os
 
 
 def export_traj_splines(file_paths: dict,
                         spline_data,
                         reftrack,
-                        normvec_normalized) -> None:
+                        normvec_normalized,
+                        file_format: str = "csv",
+                        trajectory: np.ndarray = None,
+                        metadata: dict = None) -> None:
     """
     Created by:
     Weiqi Lyu
@@ -22,8 +26,21 @@ def export_traj_splines(file_paths: dict,
     spline_data:        [spline_lengths, coeffs_x, coeffs_y]
     reftrack:           track definition [x_m, y_m, w_tr_right_m, w_tr_left_m]
     normvec_normalized: normalized normal vectors on the reference line [x_m, y_m]
+    file_format:        "csv" for ';'-separated text with a header line or "npy" for a binary little-endian float64
+                        array (numpy .npy format: small header followed by the raw rows, can be memory-mapped, see
+                        import_traj_splines)
+    trajectory:         resampled centerline [s_m, x_m, y_m, psi_rad, kappa_radpm], exported to
+                        file_paths["trajectory_export"] if given
+    metadata:           json serializable information on the run (e.g. the used smoothing parameters), exported to
+                        file_paths["metadata_export"] if given
+
+    Existing files are replaced. Every file is written to a temporary file first and renamed afterwards, i.e. readers
+    never see a partially written file.
     """
 
+    if file_format not in ("csv", "npy"):
+        raise ValueError("Unknown export format '%s', use 'csv' or 'npy'!" % file_format)
+
     # convert trajectory to desired format
     spline_lengths = spline_data[:,0]                    #lengths of the splines on the raceline in m
     coefficient_x = spline_data[:,1:5]
@@ -35,14 +52,62 @@ def export_traj_splines(file_paths: dict,
     # export trajectory data for local planner
     header_1 = "x_ref_m; y_ref_m; width_right_m; width_left_m; x_normvec_m; y_normvec_m" 
     fmt = "%.7f; %.7f; %.7f; %.7f; %.7f; %.7f"
-    with open(file_paths["traj_export"], 'ab') as fh:
-        np.savetxt(fh, traj, fmt=fmt, header=header_1, comments='')
+    _save_atomic(file_path=file_paths["traj_export"], data=traj, header=header_1, fmt=fmt, file_format=file_format)
 
     # export spline data for local planner
     header_2 = "s_m; a0; a1; a2; a3; b0; b1; b2; b3"
     fmt = "%.7f; %.7f; %.7f; %.7f; %.7f; %.7f; %.7f; %.7f; %.7f"
-    with open(file_paths["spline_export"], 'ab') as fh:
-        np.savetxt(fh, spline, fmt=fmt, header=header_2, comments='')
+    _save_atomic(file_path=file_paths["spline_export"], data=spline, header=header_2, fmt=fmt, file_format=file_format)
+
+    # export resampled centerline
+    if trajectory is not None:
+        export_trajectory(file_path=file_paths["trajectory_export"], trajectory=trajectory, file_format=file_format)
+
+    # export metadata of the run
+    if metadata is not None:
+        _write_atomic(file_path=file_paths["metadata_export"], write=lambda fh: json.dump(metadata, fh, indent=2),
+                      mode='w')
+
+
+def export_trajectory(file_path: str,
+                      trajectory: np.ndarray,
+                      file_format: str = "csv") -> None:
+    """
+    Export a resampled centerline [s_m, x_m, y_m, psi_rad, kappa_radpm] (e.g. one of several resolutions).
+    """
+
+    header = "s_m; x_m; y_m; psi_rad; kappa_radpm"
+    fmt = "%.7f; %.7f; %.7f; %.7f; %.7f"
+    _save_atomic(file_path=file_path, data=trajectory, header=header, fmt=fmt, file_format=file_format)
+
+
+def _save_atomic(file_path: str,
+                 data: np.ndarray,
+                 header: str,
+                 fmt: str,
+                 file_format: str) -> None:
+    if file_format == "npy":
+        _write_atomic(file_path=file_path, write=lambda fh: np.save(fh, np.ascontiguousarray(data, dtype='<f8')))
+    else:
+        _write_atomic(file_path=file_path, write=lambda fh: np.savetxt(fh, data, fmt=fmt, header=header, comments=''))
+
+
+def _write_atomic(file_path: str,
+                  write,
+                  mode: str = 'wb') -> None:
+    # temporary file per process, i.e. concurrent runs exporting into the same folder never share it
+    tmp_path = "%s.%i.tmp" % (file_path, os.getpid())
+
+    try:
+        with open(tmp_path, mode) as fh:
+            write(fh)
+
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 
 # testing --------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
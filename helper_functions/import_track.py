@@ -1,9 +1,13 @@
 import numpy as np
+import os
+import json
+import hashlib
 
 
 def import_track(file_path: str,
                  imp_opts: dict,
-                 width_veh: float) -> np.ndarray:
+                 width_veh: float,
+                 use_cache: bool = True) -> np.ndarray:
     """
     Created by:
     Alexander Heilmeier
@@ -17,12 +21,56 @@ def import_track(file_path: str,
     file_path:      file path of track.csv containing [x_m,y_m,w_tr_right_m,w_tr_left_m]
     imp_opts:       import options showing if a new starting point should be set or if the direction should be reversed
     width_veh:      vehicle width required to check against track width
+    use_cache:      use (and create) the binary track cache next to the track file, see load_track_cache
 
     Outputs:
     reftrack_imp:   imported track [x_m, y_m, w_tr_right_m, w_tr_left_m]
+
+    The returned array can be a read-only view of the memory-mapped track cache.
+    """
+
+    # load data from track cache or csv file
+    if use_cache:
+        reftrack_lap = load_track_cache(file_path=file_path)
+    else:
+        reftrack_lap = parse_track_csv(file_path=file_path)
+
+    # check if imported centerline should be flipped, i.e. reverse direction
+    if imp_opts["flip_imp_track"]:
+        reftrack_lap = np.flipud(reftrack_lap)
+
+    # check if imported centerline should be reordered for a new starting point (flipping and reordering are applied to
+    # a single lap, this is equivalent to applying them to all laps)
+    if imp_opts["set_new_start"]:
+        ind_start = np.argmin(np.power(reftrack_lap[:, 0] - imp_opts["new_start"][0], 2)
+                              + np.power(reftrack_lap[:, 1] - imp_opts["new_start"][1], 2))
+        reftrack_lap = np.roll(reftrack_lap, reftrack_lap.shape[0] - ind_start, axis=0)
+
+    # repeat the lap for the number of laps (single copy at the end, no copy for a single lap)
+    if imp_opts["num_laps"] > 1:
+        reftrack_imp = np.tile(reftrack_lap, (imp_opts["num_laps"], 1))
+    else:
+        reftrack_imp = reftrack_lap
+
+    # check minimum track width for vehicle width plus a small safety margin
+    w_tr_min = np.amin(reftrack_lap[:, 2] + reftrack_lap[:, 3])
+
+    if w_tr_min < width_veh + 0.5:
+        print("WARNING: Minimum track width %.2fm is close to or smaller than vehicle width!" % np.amin(w_tr_min))
+
+    return reftrack_imp
+
+
+def parse_track_csv(file_path: str) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Parse the track csv file into a single lap [x_m, y_m, w_tr_right_m, w_tr_left_m]. Files with 3 columns contain the
+    total track width, files with 5 columns contain a z coordinate which is omitted.
     """
 
-    # load data from csv file
     csv_data_temp = np.loadtxt(file_path, comments='#', delimiter=',')
 
     # get coords and track widths out of array
@@ -44,30 +92,75 @@ def import_track(file_path: str,
     else:
         raise IOError("Track file cannot be read!")
 
-    refline_ = np.tile(refline_, (imp_opts["num_laps"], 1))
-    w_tr_r = np.tile(w_tr_r, imp_opts["num_laps"])
-    w_tr_l = np.tile(w_tr_l, imp_opts["num_laps"])
-
     # assemble to a single array
-    reftrack_imp = np.column_stack((refline_, w_tr_r, w_tr_l))
+    return np.column_stack((refline_, w_tr_r, w_tr_l))
 
-    # check if imported centerline should be flipped, i.e. reverse direction
-    if imp_opts["flip_imp_track"]:
-        reftrack_imp = np.flipud(reftrack_imp)
 
-    # check if imported centerline should be reordered for a new starting point
-    if imp_opts["set_new_start"]:
-        ind_start = np.argmin(np.power(reftrack_imp[:, 0] - imp_opts["new_start"][0], 2)
-                              + np.power(reftrack_imp[:, 1] - imp_opts["new_start"][1], 2))
-        reftrack_imp = np.roll(reftrack_imp, reftrack_imp.shape[0] - ind_start, axis=0)
+def load_track_cache(file_path: str) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
 
-    # check minimum track width for vehicle width plus a small safety margin
-    w_tr_min = np.amin(reftrack_imp[:, 2] + reftrack_imp[:, 3])
+    Documentation:
+    Load a single lap of the track from the binary cache next to the track file (<file_path>.cache.npy, memory-mapped
+    read-only). The cache is keyed on modification time, size and SHA-1 hash of the track file
+    (<file_path>.cache.json). The csv file is only parsed again if its content changed. If the cache cannot be written
+    (e.g. read-only directory) the parsed track is returned without caching it.
+    """
 
-    if w_tr_min < width_veh + 0.5:
-        print("WARNING: Minimum track width %.2fm is close to or smaller than vehicle width!" % np.amin(w_tr_min))
+    cache_path = file_path + ".cache.npy"
+    meta_path = file_path + ".cache.json"
 
-    return reftrack_imp
+    stat = os.stat(file_path)
+    meta = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    try:
+        with open(meta_path, 'r') as fh:
+            meta_cache = json.load(fh)
+    except (OSError, ValueError):
+        meta_cache = {}
+
+    if os.path.isfile(cache_path) and meta_cache.get("size") == meta["size"]:
+        # cheap check first, the hash is only calculated if the modification time changed (e.g. after a checkout)
+        if meta_cache.get("mtime_ns") == meta["mtime_ns"] or meta_cache.get("sha1") == _calc_file_hash(file_path):
+            if meta_cache.get("mtime_ns") != meta["mtime_ns"]:
+                _write_json_atomic(file_path=meta_path, data=dict(meta_cache, **meta))
+
+            return np.asarray(np.load(cache_path, mmap_mode='r'))
+
+    reftrack_lap = parse_track_csv(file_path=file_path)
+    meta["sha1"] = _calc_file_hash(file_path)
+
+    try:
+        tmp_path = "%s.%i.tmp" % (cache_path, os.getpid())
+        with open(tmp_path, 'wb') as fh:
+            np.save(fh, reftrack_lap)
+        os.replace(tmp_path, cache_path)
+        _write_json_atomic(file_path=meta_path, data=meta)
+    except OSError:
+        pass
+
+    return reftrack_lap
+
+
+def _calc_file_hash(file_path: str) -> str:
+    sha1 = hashlib.sha1()
+
+    with open(file_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            sha1.update(block)
+
+    return sha1.hexdigest()
+
+
+def _write_json_atomic(file_path: str,
+                       data: dict) -> None:
+    tmp_path = "%s.%i.tmp" % (file_path, os.getpid())
+
+    with open(tmp_path, 'w') as fh:
+        json.dump(data, fh)
+
+    os.replace(tmp_path, file_path)
 
 
 # testing --------------------------------------------------------------------------------------------------------------
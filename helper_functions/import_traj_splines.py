@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def import_traj_splines(file_path: str) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    This function imports a file written by export_traj_splines (centerline or spline data). Binary .npy files are
+    memory-mapped read-only, i.e. the data is not copied and only the touched pages are read from disk. Text files are
+    parsed (';'-separated with one header line).
+
+    Inputs:
+    file_path:      path of the exported file (.npy or .csv)
+
+    Outputs:
+    data:           centerline [x_ref_m, y_ref_m, width_right_m, width_left_m, x_normvec_m, y_normvec_m] or spline data
+                    [s_m, a0, a1, a2, a3, b0, b1, b2, b3]
+    """
+
+    if file_path.endswith(".npy"):
+        data = np.load(file_path, mmap_mode='r')
+    else:
+        data = np.loadtxt(file_path, delimiter=';', skiprows=1, ndmin=2)
+
+    return data
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
@@ -8,7 +8,9 @@ def interp_splines(coeffs_x: np.ndarray,
                    spline_lengths: np.ndarray = None,
                    incl_last_point: bool = False,
                    stepsize_approx: float = None,
-                   stepnum_fixed: list = None) -> tuple:
+                   stepnum_fixed: list = None,
+                   chunk_size: int = None,
+                   dists_fixed: np.ndarray = None) -> tuple:
     """
     author:
     Alexander Heilmeier & Tim Stahl
@@ -31,6 +33,12 @@ def interp_splines(coeffs_x: np.ndarray,
     :type stepsize_approx:  float
     :param stepnum_fixed:   return a fixed number of coordinates per spline, list of length no_splines. \\ of these two!
     :type stepnum_fixed:    list
+    :param chunk_size:      number of points evaluated at once when using stepsize_approx (None evaluates all points at
+                            once). Limits the size of the temporary arrays for very fine resampling.
+    :type chunk_size:       int
+    :param dists_fixed:     distances along the path to interpolate at (increasing, without the total length), e.g. an
+                            adaptive sampling (see calc_adaptive_dists). Replaces stepsize_approx and stepnum_fixed.
+    :type dists_fixed:      np.ndarray
 
     .. outputs::
     :return path_interp:    interpolated path points.
@@ -46,6 +54,9 @@ def interp_splines(coeffs_x: np.ndarray,
     len(coeffs_x) = len(coeffs_y) = len(spline_lengths)
 
     len(path_interp = len(spline_inds) = len(t_values) = len(dists_interp)
+
+    Use iter_interp_splines to obtain the points of a stepsize based interpolation block by block instead of
+    allocating the whole output at once.
     """
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -64,27 +75,35 @@ def interp_splines(coeffs_x: np.ndarray,
         raise RuntimeError("Coefficient matrices do not have two dimensions!")
 
     # check if step size specification is valid
-    if (stepsize_approx is None and stepnum_fixed is None) \
-            or (stepsize_approx is not None and stepnum_fixed is not None):
-        raise RuntimeError("Provide one of 'stepsize_approx' and 'stepnum_fixed' and set the other to 'None'!")
+    if sum(opt is not None for opt in (stepsize_approx, stepnum_fixed, dists_fixed)) != 1:
+        raise RuntimeError("Provide one of 'stepsize_approx', 'stepnum_fixed' and 'dists_fixed' and set the others to"
+                           " 'None'!")
 
     if stepnum_fixed is not None and len(stepnum_fixed) != coeffs_x.shape[0]:
         raise RuntimeError("The provided list 'stepnum_fixed' must hold an entry for every spline!")
 
+    if chunk_size is not None and chunk_size < 1:
+        raise RuntimeError("chunk_size must be a positive number of points!")
+
     # ------------------------------------------------------------------------------------------------------------------
     # CALCULATE NUMBER OF INTERPOLATION POINTS AND ACCORDING DISTANCES -------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
 
-    if stepsize_approx is not None:
+    if stepnum_fixed is None:
         # get the total distance up to the end of every spline (i.e. cumulated distances)
         if spline_lengths is None:
             spline_lengths = calc_spline_lengths.calc_spline_lengths(coeffs_x=coeffs_x,coeffs_y=coeffs_y,quickndirty=False)
 
+        spline_lengths = np.atleast_1d(spline_lengths)
         dists_cum = np.cumsum(spline_lengths)
 
         # calculate number of interpolation points and distances (+1 because last point is included at first)
-        no_interp_points = math.ceil(dists_cum[-1] / stepsize_approx) + 1
-        dists_interp = np.linspace(0.0, dists_cum[-1], no_interp_points)
+        if dists_fixed is None:
+            no_interp_points = math.ceil(dists_cum[-1] / stepsize_approx) + 1
+            dists_interp = np.linspace(0.0, dists_cum[-1], no_interp_points)
+        else:
+            no_interp_points = dists_fixed.size + 1
+            dists_interp = np.append(dists_fixed, dists_cum[-1])
 
     else:
         # get total number of points to be sampled (subtract overlapping points)
@@ -100,37 +119,25 @@ def interp_splines(coeffs_x: np.ndarray,
     spline_inds = np.zeros(no_interp_points, dtype=int)  # save the spline index to which a point belongs
     t_values = np.zeros(no_interp_points)                   # save t values
 
-    if stepsize_approx is not None:
+    if stepnum_fixed is None:
 
         # --------------------------------------------------------------------------------------------------------------
         # APPROX. EQUAL STEP SIZE ALONG PATH OF ADJACENT SPLINES -------------------------------------------------------
         # --------------------------------------------------------------------------------------------------------------
 
-        # loop through all the elements and create steps with stepsize_approx
-        for i in range(no_interp_points - 1):
-            # find the spline that hosts the current interpolation point
-            j = np.argmax(dists_interp[i] < dists_cum)
-            spline_inds[i] = j
+        # evaluate all points (except the last one, see below) at once or block by block
+        if chunk_size is None:
+            chunk_size = no_interp_points
 
-            # get spline t value depending on the progress within the current element
-            if j > 0:
-                t_values[i] = (dists_interp[i] - dists_cum[j - 1]) / spline_lengths[j]
-            else:
-                if spline_lengths.ndim == 0:
-                    t_values[i] = dists_interp[i] / spline_lengths
-                else:
-                    t_values[i] = dists_interp[i] / spline_lengths[0]
-
-            # calculate coords
-            path_interp[i, 0] = coeffs_x[j, 0] \
-                                + coeffs_x[j, 1] * t_values[i]\
-                                + coeffs_x[j, 2] * math.pow(t_values[i], 2) \
-                                + coeffs_x[j, 3] * math.pow(t_values[i], 3)
-
-            path_interp[i, 1] = coeffs_y[j, 0]\
-                                + coeffs_y[j, 1] * t_values[i]\
-                                + coeffs_y[j, 2] * math.pow(t_values[i], 2) \
-                                + coeffs_y[j, 3] * math.pow(t_values[i], 3)
+        for i in range(0, no_interp_points - 1, chunk_size):
+            j = min(i + chunk_size, no_interp_points - 1)
+
+            path_interp[i:j], spline_inds[i:j], t_values[i:j] = \
+                _interp_dists(coeffs_x=coeffs_x,
+                              coeffs_y=coeffs_y,
+                              spline_lengths=spline_lengths,
+                              dists_cum=dists_cum,
+                              dists=dists_interp[i:j])
 
     else:
 
@@ -183,6 +190,78 @@ def interp_splines(coeffs_x: np.ndarray,
     return path_interp, spline_inds, t_values, dists_interp
 
 
+def iter_interp_splines(coeffs_x: np.ndarray,
+                        coeffs_y: np.ndarray,
+                        stepsize_approx: float,
+                        chunk_size: int,
+                        spline_lengths: np.ndarray = None,
+                        incl_last_point: bool = False):
+    """
+    Generator version of interp_splines for stepsize_approx. It yields the interpolated points in blocks of (at most)
+    chunk_size points as tuples (path_interp, spline_inds, t_values, dists_interp), such that very fine resampling can
+    be streamed (e.g. into a file) without allocating the whole output. Concatenating all blocks gives the same result
+    as interp_splines.
+    """
+
+    if coeffs_x.shape[0] != coeffs_y.shape[0]:
+        raise RuntimeError("Coefficient matrices must have the same length!")
+
+    if chunk_size < 1:
+        raise RuntimeError("chunk_size must be a positive number of points!")
+
+    if spline_lengths is None:
+        spline_lengths = calc_spline_lengths.calc_spline_lengths(coeffs_x=coeffs_x, coeffs_y=coeffs_y)
+
+    spline_lengths = np.atleast_1d(spline_lengths)
+    dists_cum = np.cumsum(spline_lengths)
+
+    # same distances as np.linspace(0.0, dists_cum[-1], no_interp_points) used in interp_splines
+    no_interp_points = math.ceil(dists_cum[-1] / stepsize_approx) + 1
+    step = dists_cum[-1] / (no_interp_points - 1)
+
+    for i in range(0, no_interp_points - 1, chunk_size):
+        dists = np.arange(i, min(i + chunk_size, no_interp_points - 1)) * step
+        path_interp, spline_inds, t_values = _interp_dists(coeffs_x=coeffs_x,
+                                                           coeffs_y=coeffs_y,
+                                                           spline_lengths=spline_lengths,
+                                                           dists_cum=dists_cum,
+                                                           dists=dists)
+
+        yield path_interp, spline_inds, t_values, dists
+
+    if incl_last_point:
+        yield np.array([[np.sum(coeffs_x[-1]), np.sum(coeffs_y[-1])]]), np.array([coeffs_x.shape[0] - 1]), \
+            np.array([1.0]), np.array([dists_cum[-1]])
+
+
+def _interp_dists(coeffs_x: np.ndarray,
+                  coeffs_y: np.ndarray,
+                  spline_lengths: np.ndarray,
+                  dists_cum: np.ndarray,
+                  dists: np.ndarray) -> tuple:
+    """
+    Evaluate the splines at the given distances along the path (t values are assumed to be proportional to the
+    distance within a spline). Returns path_interp, spline_inds and t_values.
+    """
+
+    # find the splines that host the interpolation points
+    spline_inds = np.minimum(np.searchsorted(dists_cum, dists, side="right"), dists_cum.size - 1)
+
+    # get spline t values depending on the progress within the current element
+    dists_start = np.where(spline_inds > 0, dists_cum[spline_inds - 1], 0.0)
+    t_values = (dists - dists_start) / spline_lengths[spline_inds]
+
+    # calculate coords (Horner scheme)
+    path_interp = np.zeros((dists.size, 2))
+
+    for i, coeffs in enumerate((coeffs_x, coeffs_y)):
+        coeffs_spls = coeffs[spline_inds]
+        path_interp[:, i] = ((coeffs_spls[:, 3] * t_values + coeffs_spls[:, 2]) * t_values + coeffs_spls[:, 1]) \
+            * t_values + coeffs_spls[:, 0]
+
+    return path_interp, spline_inds, t_values
+
+
 # testing --------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
     pass
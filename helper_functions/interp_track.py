@@ -1,11 +1,13 @@
 import numpy as np
 import math
-import matplotlib.pyplot as plt
+from helper_functions import artifact_sink
+
 
 def interp_track(track: np.ndarray,
                  stepsize: float,
-                 original_figname,
-                 linear_interpolated_figname) -> np.ndarray:
+                 original_figname: str = None,
+                 linear_interpolated_figname: str = None,
+                 artifacts: list = None) -> np.ndarray:
     """
     author:
     Alexander Heilmeier
@@ -18,6 +20,12 @@ def interp_track(track: np.ndarray,
     :type track:            np.ndarray
     :param stepsize:        desired stepsize after interpolation in m.
     :type stepsize:         float
+    :param original_figname:            file name of the figure of the original track.
+    :type original_figname:             str
+    :param linear_interpolated_figname: file name of the figure of the interpolated track.
+    :type linear_interpolated_figname:  str
+    :param artifacts:       list the figures are recorded to (see artifact_sink), None to deactivate recording.
+    :type artifacts:        list
 
     .. outputs::
     :return track_interp:   interpolated track [x, y, w_tr_right, w_tr_left, (banking)].
@@ -35,13 +43,10 @@ def interp_track(track: np.ndarray,
     # create closed track
     track_cl = np.vstack((track, track[0]))
 
-    plt.plot(track_cl[:, 0], track_cl[:, 1])
-    plt.grid()
-    plt.xlabel("x")
-    plt.ylabel("y")
-    plt.title("original reference track")
-    plt.show()
-    plt.savefig(original_figname, dpi=300)
+    artifact_sink.record_artifact(artifacts=artifacts,
+                                  figname=original_figname,
+                                  title="original reference track",
+                                  lines=[(track_cl[:, :2], "-", 1.5)])
 
     # calculate element lengths (euclidian distance)
     el_lengths_cl = np.sqrt(np.sum(np.power(np.diff(track_cl[:, :2], axis=0), 2), axis=1))
@@ -66,14 +71,11 @@ def interp_track(track: np.ndarray,
 
     if track_cl.shape[1] == 5:
         track_interp_cl[:, 4] = np.interp(dists_interp_cl, dists_cum_cl, track_cl[:, 4])
-    
-    plt.plot(track_interp_cl[:, 0], track_interp_cl[:, 1])
-    plt.grid()
-    plt.xlabel("x")
-    plt.ylabel("y")
-    plt.title("linear interpolation of track")
-    plt.show()
-    plt.savefig(linear_interpolated_figname, dpi=300)
+
+    artifact_sink.record_artifact(artifacts=artifacts,
+                                  figname=linear_interpolated_figname,
+                                  title="linear interpolation of track",
+                                  lines=[(track_interp_cl[:, :2], "-", 1.5)])
 
     return track_interp_cl[:-1]
 
@@ -0,0 +1,187 @@
+import numpy as np
+
+
+def local_resmoothing(reftrack: np.ndarray,
+                      normvec_normalized: np.ndarray,
+                      coeffs_x: np.ndarray,
+                      coeffs_y: np.ndarray,
+                      scaling: np.ndarray,
+                      crossings: list,
+                      margin: int,
+                      lam: float) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Re-smooth the closed spline of prep_track (see calc_splines) only in windows around the given crossing normals
+    instead of smoothing the whole track again. Within a window from point a to point b the interior points q and the
+    second derivatives K at the interior points (K_i = 2 * a_2i) are chosen such that
+
+    sum(|q_i - p_i|²) + lam * sum(K_i²)
+
+    is minimal (p being the current points), subject to the heading conditions of calc_splines at all points from a to
+    b. The points, second derivatives and splines outside of the window stay untouched, i.e. the re-fitted splines are
+    stitched into the track with continuous heading and curvature at the window edges. The scaling factors between the
+    splines are kept from the current points. The effort is linear in the size of the windows.
+
+    Inputs:
+    reftrack:           track [x_m, y_m, w_tr_right_m, w_tr_left_m] (unclosed, points of the splines)
+    normvec_normalized: normalized normal vectors on the track [x_m, y_m]
+    coeffs_x:           spline coefficients of the x-component (closed track)
+    coeffs_y:           spline coefficients of the y-component (closed track)
+    scaling:            scaling factors between spline i and i + 1 the splines were calculated with (see calc_splines)
+    crossings:          index pairs of the crossing normals (see check_normals_crossing)
+    margin:             number of points the windows are extended by on both sides of the crossing normals
+    lam:                weight of the curvature penalty (larger values result in a smoother track within the windows)
+
+    Outputs:
+    reftrack:           re-smoothed track, the track widths are adapted such that the bounds stay in place
+    normvec_normalized: normalized normal vectors on the re-smoothed track
+    coeffs_x:           spline coefficients of the x-component
+    coeffs_y:           spline coefficients of the y-component
+    changed_inds:       indices of the changed points and splines
+    """
+
+    reftrack = np.copy(reftrack)
+    normvec_normalized = np.copy(normvec_normalized)
+    coeffs_x = np.copy(coeffs_x)
+    coeffs_y = np.copy(coeffs_y)
+
+    no_points = reftrack.shape[0]
+    changed_inds = []
+
+    for a, b in calc_windows(crossings=crossings, no_points=no_points, margin=margin):
+        q, K = _fit_window(points=reftrack[:, :2],
+                           K=2.0 * np.column_stack((coeffs_x[:, 2], coeffs_y[:, 2])),
+                           scaling=scaling,
+                           a=a,
+                           b=b,
+                           lam=lam)
+
+        # splines a to b - 1 from the points and second derivatives a to b + 1 (the ones of b and b + 1 are unchanged)
+        inds = np.mod(np.arange(a, b), no_points)
+        inds_ext = np.mod(np.arange(a, b + 2), no_points)
+        points_ext = reftrack[inds_ext, :2]
+        points_ext[1:-2] = q
+        K_ext = 2.0 * np.column_stack((coeffs_x[inds_ext, 2], coeffs_y[inds_ext, 2]))
+        K_ext[1:-2] = K
+
+        d = np.diff(points_ext[:-1], axis=0)
+        L = np.expand_dims(np.power(scaling[inds], 2), 1) * K_ext[1:-1]
+
+        for coeffs, i in ((coeffs_x, 0), (coeffs_y, 1)):
+            coeffs[inds, 0] = points_ext[:-2, i]
+            coeffs[inds, 1] = d[:, i] - K_ext[:-2, i] / 3.0 - L[:, i] / 6.0
+            coeffs[inds, 2] = K_ext[:-2, i] / 2.0
+            coeffs[inds, 3] = (L[:, i] - K_ext[:-2, i]) / 6.0
+
+        normvec = np.column_stack((coeffs_y[inds, 1], -coeffs_x[inds, 1]))
+        normvec_normalized[inds] = normvec / np.expand_dims(np.hypot(normvec[:, 0], normvec[:, 1]), 1)
+
+        # keep the bounds in place, i.e. shift the track widths by the movement of the points along their normals
+        shift = np.sum((points_ext[:-2] - reftrack[inds, :2]) * normvec_normalized[inds], axis=1)
+        reftrack[inds, :2] = points_ext[:-2]
+        reftrack[inds, 2] -= shift
+        reftrack[inds, 3] += shift
+
+        changed_inds.append(inds)
+
+    return reftrack, normvec_normalized, coeffs_x, coeffs_y, np.unique(np.concatenate(changed_inds))
+
+
+def calc_windows(crossings: list,
+                 no_points: int,
+                 margin: int) -> list:
+    """
+    Return the windows [(a, b), ...] (a in [0, no_points), b > a, indices modulo no_points) covering the crossing normals
+    extended by margin points on both sides. The shorter way around the track is covered for every pair, overlapping
+    windows are merged.
+    """
+
+    spans = []
+
+    for i, j in crossings:
+        if j - i <= no_points / 2:
+            spans.append([i - margin, j + margin])
+        else:
+            spans.append([j - margin, i + no_points + margin])
+
+    spans = sorted([a % no_points, a % no_points + b - a] for a, b in spans)
+    windows = []
+
+    for a, b in spans:
+        if windows and a <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], b)
+        else:
+            windows.append([a, b])
+
+    # merge the last window into the first one if it wraps around onto it
+    while len(windows) > 1 and windows[-1][1] >= windows[0][0] + no_points:
+        a, b = windows.pop()
+        windows[0] = [a, max(b, windows[0][1] + no_points)]
+
+    if any(b - a >= no_points - 2 for a, b in windows):
+        raise IOError("Crossing normals cover the whole track, local re-smoothing is not possible!")
+
+    return [(a, b) for a, b in windows]
+
+
+def _fit_window(points: np.ndarray,
+                K: np.ndarray,
+                scaling: np.ndarray,
+                a: int,
+                b: int,
+                lam: float) -> tuple:
+    # solve the equality constrained least squares problem of the window (KKT system) for x and y at once, the unknowns
+    # are the interior points q_a+1 ... q_b-1 and their second derivatives K_a+1 ... K_b-1
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+
+    no_points = points.shape[0]
+    n = b - a - 1
+
+    # heading condition at point r (between spline r - 1 and r) for r = a ... b:
+    # K_r-1 / 6 + (c_r-1 + s_r-1) / 3 * K_r + s_r-1 * c_r / 6 * K_r+1 - s_r-1 * q_r+1 + (1 + s_r-1) * q_r - q_r-1 = 0
+    r = np.arange(a, b + 1)
+    s_prev = scaling[np.mod(r - 1, no_points)]
+    c = np.power(scaling[np.mod(r, no_points)], 2)
+    c_prev = np.power(s_prev, 2)
+
+    coeffs_K = np.column_stack((np.full(r.size, 1.0 / 6.0), (c_prev + s_prev) / 3.0, s_prev * c / 6.0))
+    coeffs_q = np.column_stack((-np.ones(r.size), 1.0 + s_prev, -s_prev))
+
+    rows = []
+    cols = []
+    vals = []
+    rhs_con = np.zeros((r.size, 2))
+
+    for offset in range(3):
+        inds = r - 1 + offset                   # point r - 1, r, r + 1 of every row
+        var = inds - a - 1                      # index of the unknown (outside of [0, n) -> fixed)
+        free = (var >= 0) & (var < n)
+
+        # unknowns: q at columns [0, n), K at columns [n, 2n)
+        rows.extend([np.nonzero(free)[0]] * 2)
+        cols.extend([var[free], var[free] + n])
+        vals.extend([coeffs_q[free, offset], coeffs_K[free, offset]])
+
+        # fixed points and second derivatives go to the right hand side
+        fixed = np.nonzero(np.invert(free))[0]
+        rhs_con[fixed] -= np.expand_dims(coeffs_q[fixed, offset], 1) * points[np.mod(inds[fixed], no_points)] \
+            + np.expand_dims(coeffs_K[fixed, offset], 1) * K[np.mod(inds[fixed], no_points)]
+
+    con = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(r.size, 2 * n))
+    hess = sparse.diags(np.concatenate((np.ones(n), np.full(n, lam))))
+
+    kkt = sparse.bmat([[hess, con.T], [con, None]], format="csc")
+    rhs = np.vstack((points[np.mod(np.arange(a + 1, b), no_points)], np.zeros((n, 2)), rhs_con))
+
+    sol = sparse_linalg.spsolve(kkt, rhs)
+
+    return sol[:n], sol[n:2 * n]
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
@@ -1,7 +1,8 @@
 import numpy as np
-from helper_functions import spline_approximation, check_normals_crossing, calc_splines
+from helper_functions import spline_approximation, check_normals_crossing, calc_splines, artifact_sink, stage_profiler
+from helper_functions import local_resmoothing
+import math
 import sys
-import matplotlib.pyplot as plt
 
 
 def prep_track(reftrack_imp: np.ndarray,
@@ -9,9 +10,13 @@ def prep_track(reftrack_imp: np.ndarray,
                stepsize_opts: dict,
                debug: bool = True,
                min_width: float = None,
-               original_figname = None,
-               linear_interpolated_figname = None,
-               cubic_spline_figname = None) -> tuple:
+               original_figname: str = None,
+               linear_interpolated_figname: str = None,
+               cubic_spline_figname: str = None,
+               artifacts: list = None,
+               stats: dict = None,
+               max_memory_mb: float = None,
+               profiler: stage_profiler.StageProfiler = None) -> tuple:
     """
     Created by:
     Alexander Heilmeier
@@ -25,11 +30,20 @@ def prep_track(reftrack_imp: np.ndarray,
     stepsize_opts:              dict containing the stepsizes before spline approximation and after spline interpolation
     debug:                      boolean showing if debug messages should be printed
     min_width:                  [m] minimum enforced track width (None to deactivate)
+    original_figname:           file name of the figure of the imported track
+    linear_interpolated_figname: file name of the figure of the linearly interpolated track
+    cubic_spline_figname:       file name of the figure of the smoothed track
+    artifacts:                  list the figures are recorded to (see artifact_sink), None to deactivate recording
+    stats:                      dict the deviations of the smoothed track (see spline_approximation) and the strategy
+                                of the spline calculation (keys "spline_strategy" and "spline_memory_mb", see
+                                calc_splines) are written to
+    max_memory_mb:              [MB] memory budget of the spline calculation (None for no limit)
+    profiler:                   profiler recording the stages (see stage_profiler), None to deactivate profiling
 
     Outputs:
     reftrack_interp:            track after smoothing and interpolation [x_m, y_m, w_tr_right_m, w_tr_left_m]
     normvec_normalized_interp:  normalized normal vectors on the reference line [x_m, y_m]
-    a_interp:                   LES coefficients when calculating the splines
+    a_interp:                   LES coefficients when calculating the splines (None, the dense LES is not built)
     coeffs_x_interp:            spline coefficients of the x-component
     coeffs_y_interp:            spline coefficients of the y-component
     """
@@ -38,51 +52,127 @@ def prep_track(reftrack_imp: np.ndarray,
     # INTERPOLATE REFTRACK AND CALCULATE INITIAL SPLINES ---------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
 
+    # choose the strategy of the spline calculation before the smoothing, i.e. fail early if no strategy fits into the
+    # memory budget
+    no_splines_est, spline_strategy, spline_memory_mb = select_spline_strategy(reftrack_imp=reftrack_imp,
+                                                                               reg_smooth_opts=reg_smooth_opts,
+                                                                               stepsize_opts=stepsize_opts,
+                                                                               max_memory_mb=max_memory_mb)
+
+    if debug:
+        print("INFO: Expecting %i splines, using the %s spline calculation (estimated memory %.1fMB)"
+              % (no_splines_est, spline_strategy, spline_memory_mb))
+
     # smoothing and interpolating reference track
     reftrack_interp = spline_approximation.spline_approximation(track=reftrack_imp,
                                                                 k_reg=reg_smooth_opts["k_reg"],
                                                                 s_reg=reg_smooth_opts["s_reg"],
                                                                 stepsize_prep=stepsize_opts["stepsize_prep"],
                                                                 stepsize_reg=stepsize_opts["stepsize_reg"],
+                                                                method=reg_smooth_opts.get("method", "splprep"),
+                                                                knot_spacing=reg_smooth_opts.get("knot_spacing", 0.5),
+                                                                lam=reg_smooth_opts.get("lambda", 1.0),
                                                                 debug=debug,
-                                                                original_figname = original_figname,
-                                                                linear_interpolated_figname = linear_interpolated_figname,
-                                                                cubic_spline_figname = cubic_spline_figname
-                                                                )
+                                                                original_figname=original_figname,
+                                                                linear_interpolated_figname=linear_interpolated_figname,
+                                                                cubic_spline_figname=cubic_spline_figname,
+                                                                artifacts=artifacts,
+                                                                stats=stats,
+                                                                profiler=profiler)
 
     # calculate splines
     refpath_interp_cl = np.vstack((reftrack_interp[:, :2], reftrack_interp[0, :2]))
 
-    coeffs_x_interp, coeffs_y_interp, a_interp, normvec_normalized_interp = calc_splines.calc_splines(path=refpath_interp_cl)
+    spline_stats = {}
+
+    with stage_profiler.profile_stage(profiler, "calc_splines"):
+        coeffs_x_interp, coeffs_y_interp, a_interp, normvec_normalized_interp = \
+            calc_splines.calc_splines(path=refpath_interp_cl,
+                                      max_memory_mb=max_memory_mb,
+                                      no_segments=reg_smooth_opts.get("spline_segments"),
+                                      segment_overlap=reg_smooth_opts.get("segment_overlap", 32),
+                                      stats=spline_stats)
+        stage_profiler.record_arrays(profiler, path=refpath_interp_cl, coeffs_x=coeffs_x_interp,
+                                     coeffs_y=coeffs_y_interp)
+
+    if stats is not None:
+        stats["spline_strategy"] = spline_stats["strategy"]
+        stats["spline_memory_mb"] = spline_stats["memory_mb"]
+
+    if debug and spline_stats["strategy"] != spline_strategy:
+        print("INFO: Used the %s spline calculation for %i splines (estimated memory %.1fMB)"
+              % (spline_stats["strategy"], coeffs_x_interp.shape[0], spline_stats["memory_mb"]))
 
     # ------------------------------------------------------------------------------------------------------------------
     # CHECK SPLINE NORMALS FOR CROSSING POINTS -------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
 
-    normals_crossing = check_normals_crossing.check_normals_crossing(track=reftrack_interp,
+    horizon = 10
+
+    with stage_profiler.profile_stage(profiler, "check_normals_crossing"):
+        normals_crossing = check_normals_crossing.check_normals_crossing(track=reftrack_interp,
                                                                          normvec_normalized=normvec_normalized_interp,
-                                                                         horizon=10)
+                                                                         horizon=horizon)
+
+    # re-smooth only windows around the crossing normals (increasing the smoothing until they are resolved) instead of
+    # requiring a stronger smoothing of the whole track
+    if normals_crossing and reg_smooth_opts.get("local_resmoothing", False):
+        with stage_profiler.profile_stage(profiler, "local_resmoothing"):
+            # scaling factors between the splines as used in calc_splines
+            el_lengths_cl = np.sqrt(np.sum(np.power(np.diff(refpath_interp_cl, axis=0), 2), axis=1))
+            scaling = el_lengths_cl / np.roll(el_lengths_cl, -1)
+
+            points_smoothed = np.copy(reftrack_interp[:, :2])
+            changed_inds_all = np.zeros(0, dtype=int)
+
+            for i in range(6):
+                lam = reg_smooth_opts.get("lambda_local", 10.0) * 10.0 ** i
+                reftrack_interp, normvec_normalized_interp, coeffs_x_interp, coeffs_y_interp, changed_inds = \
+                    local_resmoothing.local_resmoothing(reftrack=reftrack_interp,
+                                                        normvec_normalized=normvec_normalized_interp,
+                                                        coeffs_x=coeffs_x_interp,
+                                                        coeffs_y=coeffs_y_interp,
+                                                        scaling=scaling,
+                                                        crossings=normals_crossing,
+                                                        margin=horizon,
+                                                        lam=lam)
+                changed_inds_all = np.union1d(changed_inds_all, changed_inds)
+
+                # only the normals around the changed points can cross newly
+                normals_crossing = check_normals_crossing.check_normals_crossing(
+                    track=reftrack_interp,
+                    normvec_normalized=normvec_normalized_interp,
+                    horizon=horizon,
+                    check_inds=changed_inds)
+
+                if not normals_crossing:
+                    break
+
+            # the re-smoothed points moved away from the smoothed track -> the maximum deviation from the imported
+            # track is at least their displacement
+            if stats is not None:
+                shifts = np.hypot(*(reftrack_interp[changed_inds_all, :2] - points_smoothed[changed_inds_all]).T)
+                stats["max_deviation"] = max(stats["max_deviation"], float(np.amax(shifts)))
+
+        if debug:
+            print("INFO: Re-smoothed %i points around crossing normals locally (lambda %g)"
+                  % (changed_inds_all.size, lam))
 
     if normals_crossing:
         bound_1_tmp = reftrack_interp[:, :2] + normvec_normalized_interp * np.expand_dims(reftrack_interp[:, 2], axis=1)
         bound_2_tmp = reftrack_interp[:, :2] - normvec_normalized_interp * np.expand_dims(reftrack_interp[:, 3], axis=1)
 
-        plt.figure()
-
-        plt.plot(reftrack_interp[:, 0], reftrack_interp[:, 1], 'k-')
-        for i in range(bound_1_tmp.shape[0]):
-            temp = np.vstack((bound_1_tmp[i], bound_2_tmp[i]))
-            plt.plot(temp[:, 0], temp[:, 1], "r-", linewidth=0.7)
-
-        plt.grid()
-        ax = plt.gca()
-        ax.set_aspect("equal", "datalim")
-        plt.xlabel("east in m")
-        plt.ylabel("north in m")
-        plt.title("Error: at least one pair of normals is crossed!")
+        # normals as line segments separated by NaN rows
+        normals_tmp = np.stack((bound_1_tmp, bound_2_tmp, np.full(bound_1_tmp.shape, np.nan)), axis=1).reshape(-1, 2)
 
-        plt.show()
-        plt.savefig("cross_error.png", dpi=300)
+        artifact_sink.record_artifact(artifacts=artifacts,
+                                      figname="cross_error.png",
+                                      title="Error: at least one pair of normals is crossed!",
+                                      lines=[(reftrack_interp[:, :2], "k-", 1.5),
+                                             (normals_tmp, "r-", 0.7)],
+                                      equal_aspect=True,
+                                      xlabel="east in m",
+                                      ylabel="north in m")
 
         raise IOError("At least two spline normals are crossed, check input or increase smoothing factor!")
 
@@ -110,6 +200,27 @@ def prep_track(reftrack_imp: np.ndarray,
     return reftrack_interp, normvec_normalized_interp, a_interp, coeffs_x_interp, coeffs_y_interp
 
 
+def select_spline_strategy(reftrack_imp: np.ndarray,
+                           reg_smooth_opts: dict,
+                           stepsize_opts: dict,
+                           max_memory_mb: float = None) -> tuple:
+    """
+    Choose the strategy of the spline calculation of prep_track (see calc_splines.select_strategy) for the number of
+    splines expected from the length of the imported track and stepsize_reg. Returns (expected number of splines,
+    strategy, estimated memory in MB), raises a MemoryError if no strategy fits into max_memory_mb.
+    """
+
+    el_lengths_imp_cl = np.hypot(*np.diff(np.vstack((reftrack_imp[:, :2], reftrack_imp[0, :2])), axis=0).T)
+    no_splines_est = math.ceil(np.sum(el_lengths_imp_cl) / stepsize_opts["stepsize_reg"])
+
+    strategy, _, _, memory_mb = calc_splines.select_strategy(no_splines=no_splines_est,
+                                                             max_memory_mb=max_memory_mb,
+                                                             no_segments=reg_smooth_opts.get("spline_segments"),
+                                                             segment_overlap=reg_smooth_opts.get("segment_overlap", 32))
+
+    return no_splines_est, strategy, memory_mb
+
+
 # testing --------------------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
     pass
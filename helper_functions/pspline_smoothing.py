@@ -0,0 +1,126 @@
+import numpy as np
+import math
+
+
+def pspline_smoothing(path: np.ndarray,
+                      knot_spacing: float,
+                      lam: float = 1.0) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Smooth a closed path by a periodic cubic penalized regression spline (P-spline): a periodic cubic B-spline on uniform
+    knots (about knot_spacing meters apart) is fitted to the path points in the least squares sense, the second
+    differences of its coefficients are penalized by lam. The normal equations form a symmetric cyclic banded system
+    (bandwidth 3) which is solved by a banded LU decomposition and a Woodbury correction of its corners, i.e. the effort
+    is linear in the number of path points and knots.
+
+    The returned spline uses the same representation as scipy.interpolate.splprep(per=1), i.e. it can be evaluated by
+    scipy.interpolate.splev() on the parameter range [0.0, 1.0].
+
+    Inputs:
+    path:           unclosed path [x, y] (e.g. the linearly interpolated track)
+    knot_spacing:   [m] approximate distance between two knots along the path
+    lam:            weight of the penalty, it is relative to the average number of path points per knot interval such
+                    that the smoothing does not depend on the point density of the path
+
+    Outputs:
+    tck:            tuple (knots, [coefficients x, coefficients y], degree 3) of the spline
+    u:              spline parameters of the path points (normalized cumulative chord length)
+    """
+
+    from scipy import linalg
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # PREPARATIONS -----------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    no_points = path.shape[0]
+
+    # parametrize the path by its normalized cumulative chord length (as splprep does)
+    el_lengths_cl = np.hypot(*np.diff(np.vstack((path, path[0])), axis=0).T)
+    dists_cum_cl = np.insert(np.cumsum(el_lengths_cl), 0, 0.0)
+    u = dists_cum_cl[:-1] / dists_cum_cl[-1]
+
+    # number of knot intervals (the corners of the cyclic system must not overlap)
+    no_intervals = max(math.ceil(dists_cum_cl[-1] / knot_spacing), 8)
+
+    if no_points < no_intervals:
+        raise RuntimeError("P-spline smoothing requires at least one path point per knot interval, increase the knot"
+                           " spacing or decrease the stepsize of the path!")
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # NORMAL EQUATIONS -------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # knot interval and local coordinate of every point -> the four uniform cubic B-splines being non-zero there
+    t_loc = u * no_intervals
+    ints = np.minimum(np.floor(t_loc).astype(int), no_intervals - 1)
+    x = t_loc - ints
+
+    basis = np.column_stack(((1.0 - x) ** 3,
+                             3.0 * x ** 3 - 6.0 * x ** 2 + 4.0,
+                             -3.0 * x ** 3 + 3.0 * x ** 2 + 3.0 * x + 1.0,
+                             x ** 3)) / 6.0
+    inds = np.mod(np.expand_dims(ints, 1) + np.arange(4), no_intervals)
+
+    # diagonals of B^T * B (offset o: entry [i, i + o] with periodic column index) and B^T * y
+    lam_scaled = lam * no_points / no_intervals
+    penalty = (6.0, -4.0, 1.0, 0.0)                 # diagonals of D^T * D of the periodic second differences D
+    diags = np.zeros((4, no_intervals))
+
+    for o in range(4):
+        for m in range(4 - o):
+            diags[o] += np.bincount(inds[:, m], weights=basis[:, m] * basis[:, m + o], minlength=no_intervals)
+
+        diags[o] += lam_scaled * penalty[o]
+
+    rhs = np.column_stack([np.bincount(inds.ravel(), weights=(basis * np.expand_dims(path[:, i], 1)).ravel(),
+                                       minlength=no_intervals) for i in range(2)])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SOLVE CYCLIC BANDED SYSTEM ---------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # banded part of the (symmetric) system
+    ab = np.zeros((7, no_intervals))
+    ab[3] = diags[0]
+
+    for o in range(1, 4):
+        ab[3 - o, o:] = diags[o, :-o]
+        ab[3 + o, :-o] = diags[o, :-o]
+
+    # corner elements [i, i + o - no_intervals] (and their symmetric counterparts) as correction A = A_band + P * W * P^T
+    # with P selecting the first and last three rows
+    corner_inds = np.array([0, 1, 2, no_intervals - 3, no_intervals - 2, no_intervals - 1])
+    w = np.zeros((6, 6))
+
+    for o in range(1, 4):
+        for i in range(no_intervals - o, no_intervals):
+            j = i + o - no_intervals
+            w[i - no_intervals + 6, j] = w[j, i - no_intervals + 6] = diags[o, i]
+
+    p = np.zeros((no_intervals, 6))
+    p[corner_inds, np.arange(6)] = 1.0
+
+    # Woodbury: A^-1 * b = z - y * (I + W * P^T * y)^-1 * W * P^T * z with z = A_band^-1 * b and y = A_band^-1 * P
+    sol = linalg.solve_banded((3, 3), ab, np.column_stack((rhs, p)), check_finite=False)
+    z = sol[:, :2]
+    y = sol[:, 2:]
+    theta = z - np.dot(y, np.linalg.solve(np.eye(6) + np.dot(w, y[corner_inds]), np.dot(w, z[corner_inds])))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SPLINE REPRESENTATION --------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    # uniform knots extended periodically by three knots on both sides, the first three coefficients are repeated
+    knots = np.arange(-3, no_intervals + 4) / no_intervals
+    coeffs_inds = np.mod(np.arange(no_intervals + 3), no_intervals)
+
+    return (knots, [theta[coeffs_inds, 0], theta[coeffs_inds, 1]], 3), u
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,70 @@
+import numpy as np
+
+
+def reorient_splines(reftrack: np.ndarray,
+                     normvec_normalized: np.ndarray,
+                     coeffs_x: np.ndarray,
+                     coeffs_y: np.ndarray,
+                     flip: bool = False,
+                     new_start: np.ndarray = None) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Reverse the driving direction and/or set a new starting point of a smoothed closed track (outputs of prep_track)
+    without smoothing it again, i.e. the geometry of the closed spline stays the same.
+
+    Reversing reparametrizes every spline by t -> 1 - t (a_0 + a_1 + a_2 + a_3, -(a_1 + 2a_2 + 3a_3), a_2 + 3a_3, -a_3)
+    and reverses their order, the normal vectors are negated and the right and left track widths are swapped such that
+    the bounds stay in place. A new starting point rotates the points and splines such that the point closest to
+    new_start becomes the first one (the distances s along the track then start there).
+
+    Inputs:
+    reftrack:           track [x_m, y_m, w_tr_right_m, w_tr_left_m] (unclosed, points of the splines)
+    normvec_normalized: normalized normal vectors on the track [x_m, y_m]
+    coeffs_x:           spline coefficients of the x-component (closed track)
+    coeffs_y:           spline coefficients of the y-component (closed track)
+    flip:               reverse the driving direction
+    new_start:          [x_m, y_m] new starting point (None to keep the starting point), applied after flipping
+
+    Outputs:
+    reftrack:           reoriented track
+    normvec_normalized: normalized normal vectors on the reoriented track
+    coeffs_x:           spline coefficients of the x-component of the reoriented track
+    coeffs_y:           spline coefficients of the y-component of the reoriented track
+    """
+
+    if flip:
+        # point i of the reversed track is point -i, spline i of the reversed track is spline -i - 1 reversed
+        inds_points = np.mod(-np.arange(reftrack.shape[0]), reftrack.shape[0])
+        inds_splines = np.arange(reftrack.shape[0])[::-1]
+
+        reftrack = reftrack[inds_points][:, [0, 1, 3, 2] + list(range(4, reftrack.shape[1]))]
+        normvec_normalized = -normvec_normalized[inds_points]
+        coeffs_x = _reverse_coeffs(coeffs=coeffs_x[inds_splines])
+        coeffs_y = _reverse_coeffs(coeffs=coeffs_y[inds_splines])
+
+    if new_start is not None:
+        ind_start = int(np.argmin(np.power(reftrack[:, 0] - new_start[0], 2)
+                                  + np.power(reftrack[:, 1] - new_start[1], 2)))
+
+        reftrack = np.roll(reftrack, -ind_start, axis=0)
+        normvec_normalized = np.roll(normvec_normalized, -ind_start, axis=0)
+        coeffs_x = np.roll(coeffs_x, -ind_start, axis=0)
+        coeffs_y = np.roll(coeffs_y, -ind_start, axis=0)
+
+    return reftrack, normvec_normalized, coeffs_x, coeffs_y
+
+
+def _reverse_coeffs(coeffs: np.ndarray) -> np.ndarray:
+    # coefficients of p(1 - t) for the splines p(t) = a_0 + a_1 * t + a_2 * t² + a_3 * t³
+    return np.column_stack((np.sum(coeffs, axis=1),
+                            -(coeffs[:, 1] + 2.0 * coeffs[:, 2] + 3.0 * coeffs[:, 3]),
+                            coeffs[:, 2] + 3.0 * coeffs[:, 3],
+                            -coeffs[:, 3]))
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
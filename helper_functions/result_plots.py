@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 def result_plots(plot_opts: dict,
@@ -26,6 +25,8 @@ def result_plots(plot_opts: dict,
     bound2_interp:  second track boundary (interpolated) (mostly left) [x_m, y_m]
     """
 
+    import matplotlib.pyplot as plt
+
     if plot_opts["centerline"]:
 
         point1_arrow = refline[0]
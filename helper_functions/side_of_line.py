@@ -4,7 +4,7 @@ from typing import Union
 
 def side_of_line(a: Union[tuple, np.ndarray],
                  b: Union[tuple, np.ndarray],
-                 z: Union[tuple, np.ndarray]) -> float:
+                 z: Union[tuple, np.ndarray]) -> Union[float, np.ndarray]:
     """
     author:
     Alexander Heilmeier
@@ -14,6 +14,8 @@ def side_of_line(a: Union[tuple, np.ndarray],
     orientation of the cross product, see question on
     https://stackoverflow.com/questions/1560492/how-to-tell-whether-a-point-is-to-the-right-or-left-side-of-a-line
 
+    Several lines and points can be checked at once by inserting arrays of coordinates [x_array, y_array] (size 2 x n).
+
     .. inputs::
     :param a:       point coordinates [x, y]
     :type a:        Union[tuple, np.ndarray]
@@ -23,8 +25,8 @@ def side_of_line(a: Union[tuple, np.ndarray],
     :type z:        Union[tuple, np.ndarray]
 
     .. outputs::
-    :return side:   0.0 = on line, 1.0 = left side, -1.0 = right side.
-    :rtype side:    float
+    :return side:   0.0 = on line, 1.0 = left side, -1.0 = right side (array of size n for arrays of coordinates).
+    :rtype side:    Union[float, np.ndarray]
     """
 
     # calculate side
@@ -1,20 +1,23 @@
-from scipy import interpolate
-from scipy import optimize
-from scipy import spatial
 import numpy as np
 import math
-from helper_functions import interp_track, side_of_line
-import matplotlib.pyplot as plt
+from helper_functions import interp_track, side_of_line, artifact_sink, stage_profiler, pspline_smoothing
+
 
 def spline_approximation(track: np.ndarray,
                          k_reg: int = 3,
                          s_reg: int = 10,
                          stepsize_prep: float = 1.0,
                          stepsize_reg: float = 3.0,
+                         method: str = "splprep",
+                         knot_spacing: float = 0.5,
+                         lam: float = 1.0,
                          debug: bool = False,
-                         original_figname = None,
-                         linear_interpolated_figname = None,
-                         cubic_spline_figname = None) -> np.ndarray:
+                         original_figname: str = None,
+                         linear_interpolated_figname: str = None,
+                         cubic_spline_figname: str = None,
+                         artifacts: list = None,
+                         stats: dict = None,
+                         profiler: stage_profiler.StageProfiler = None) -> np.ndarray:
     """
     author:
     Fabian Christ
@@ -36,8 +39,28 @@ def spline_approximation(track: np.ndarray,
     :type stepsize_prep:    float
     :param stepsize_reg:    stepsize after smoothing.
     :type stepsize_reg:     float
+    :param method:          smoothing engine, "splprep" (FITPACK, s_reg is used) or "pspline" (periodic cubic P-spline
+                            with uniform knots, knot_spacing and lam are used, see pspline_smoothing).
+    :type method:           str
+    :param knot_spacing:    [m] distance between the knots of the P-spline.
+    :type knot_spacing:     float
+    :param lam:             penalty weight of the P-spline (larger values result in a smoother track).
+    :type lam:              float
     :param debug:           flag for printing debug messages
     :type debug:            bool
+    :param original_figname:            file name of the figure of the original track.
+    :type original_figname:             str
+    :param linear_interpolated_figname: file name of the figure of the linearly interpolated track.
+    :type linear_interpolated_figname:  str
+    :param cubic_spline_figname:        file name of the figure of the smoothed track.
+    :type cubic_spline_figname:         str
+    :param artifacts:       list the figures are recorded to (see artifact_sink), None to deactivate recording.
+    :type artifacts:        list
+    :param stats:           dict the mean and maximum deviation (keys "mean_deviation" and "max_deviation" in m) of the
+                            smoothed track from the input track are written to, None to deactivate.
+    :type stats:            dict
+    :param profiler:        profiler recording the stages (see stage_profiler), None to deactivate profiling.
+    :type profiler:         stage_profiler.StageProfiler
 
     .. outputs::
     :return track_reg:      [x, y, w_tr_right, w_tr_left, (banking)] (always unclosed).
@@ -48,14 +71,20 @@ def spline_approximation(track: np.ndarray,
     The banking angle is optional and must not be provided!
     """
 
+    from scipy import interpolate, spatial
+
     # ------------------------------------------------------------------------------------------------------------------
     # LINEAR INTERPOLATION BEFORE SMOOTHING ----------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
 
-    track_interp = interp_track.interp_track(track=track,
-                                            stepsize=stepsize_prep,
-                                            original_figname = original_figname,
-                                            linear_interpolated_figname = linear_interpolated_figname)
+    with stage_profiler.profile_stage(profiler, "interp_track"):
+        track_interp = interp_track.interp_track(track=track,
+                                                 stepsize=stepsize_prep,
+                                                 original_figname=original_figname,
+                                                 linear_interpolated_figname=linear_interpolated_figname,
+                                                 artifacts=artifacts)
+        stage_profiler.record_arrays(profiler, track=track, track_interp=track_interp)
+
     track_interp_cl = np.vstack((track_interp, track_interp[0]))
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -64,17 +93,33 @@ def spline_approximation(track: np.ndarray,
 
     # create closed track (original track)
     track_cl = np.vstack((track, track[0]))
-    no_points_track_cl = track_cl.shape[0]
     el_lengths_cl = np.sqrt(np.sum(np.power(np.diff(track_cl[:, :2], axis=0), 2), axis=1))
     dists_cum_cl = np.cumsum(el_lengths_cl)
     dists_cum_cl = np.insert(dists_cum_cl, 0, 0.0)
 
     # find B spline representation of the inserted path and smooth it in this process
     # (tck_cl: tuple (vector of knots, the B-spline coefficients, and the degree of the spline))
-    tck_cl, t_glob_cl = interpolate.splprep([track_interp_cl[:, 0], track_interp_cl[:, 1]],
-                                            k=k_reg,
-                                            s=s_reg,
-                                            per=1)[:2]
+    if method == "splprep":
+        with stage_profiler.profile_stage(profiler, "splprep"):
+            tck_cl, t_glob_cl = interpolate.splprep([track_interp_cl[:, 0], track_interp_cl[:, 1]],
+                                                    k=k_reg,
+                                                    s=s_reg,
+                                                    per=1)[:2]
+            stage_profiler.record_arrays(profiler, track_interp_cl=track_interp_cl, knots=tck_cl[0])
+
+    elif method == "pspline":
+        # FITPACK's knot search gets slow for large tracks -> P-spline with a fixed number of knots (linear effort)
+        if k_reg != 3:
+            raise ValueError("P-spline smoothing only supports cubic splines (k_reg = 3)!")
+
+        with stage_profiler.profile_stage(profiler, "pspline"):
+            tck_cl, t_glob_cl = pspline_smoothing.pspline_smoothing(path=track_interp[:, :2],
+                                                                    knot_spacing=knot_spacing,
+                                                                    lam=lam)
+            stage_profiler.record_arrays(profiler, track_interp=track_interp, knots=tck_cl[0])
+
+    else:
+        raise ValueError("Unknown smoothing method %s!" % method)
 
     # calculate total length of smooth approximating spline based on euclidian distance with points at every 0.25m
     no_points_lencalc_cl = math.ceil(dists_cum_cl[-1]) * 4
@@ -84,51 +129,48 @@ def spline_approximation(track: np.ndarray,
     # get smoothed path
     no_points_reg_cl = math.ceil(len_path_smoothed_tmp / stepsize_reg) + 1
     path_smoothed = np.array(interpolate.splev(np.linspace(0.0, 1.0, no_points_reg_cl), tck_cl)).T[:-1]
-    
-    path_smoothed_cl = np.vstack((path_smoothed, path_smoothed[0]))
-    plt.plot(path_smoothed_cl[:, 0], path_smoothed_cl[:, 1])
-    plt.grid()
-    plt.xlabel("x")
-    plt.ylabel("y")
-    plt.title("cubic spline track")
-    plt.show()
-    plt.savefig(cubic_spline_figname, dpi=300)
+
+    artifact_sink.record_artifact(artifacts=artifacts,
+                                  figname=cubic_spline_figname,
+                                  title="cubic spline track",
+                                  lines=[(np.vstack((path_smoothed, path_smoothed[0])), "-", 1.5)])
 
     # ------------------------------------------------------------------------------------------------------------------
     # PROCESS TRACK WIDTHS (AND BANKING ANGLE IF GIVEN) ----------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
 
-    # find the closest points on the B spline to input points
-    dists_cl = np.zeros(no_points_track_cl)                 # contains (min) distances between input points and spline
-    closest_point_cl = np.zeros((no_points_track_cl, 2))    # contains the closest points on the spline
-    closest_t_glob_cl = np.zeros(no_points_track_cl)        # containts the t_glob values for closest points
-    t_glob_guess_cl = dists_cum_cl / dists_cum_cl[-1]       # start guess for the minimization
+    # find the closest points on the B spline to input points (all points at once): seed the spline parameter with the
+    # nearest point of the densely sampled smoothed path and refine it using Newton iterations
+    with stage_profiler.profile_stage(profiler, "projection"):
+        t_glob_guess_cl = dists_cum_cl / dists_cum_cl[-1]       # reference for the unwrapping of the periodic parameter
+        t_samples = np.linspace(0.0, 1.0, no_points_lencalc_cl)
+        closest_t_glob_cl = t_samples[spatial.cKDTree(path_smoothed_tmp).query(track_cl[:, :2])[1]]
 
-    for i in range(no_points_track_cl):
-        # get t_glob value for the point on the B spline with a minimum distance to the input points
-        closest_t_glob_cl[i] = optimize.fmin(dist_to_p,
-                                             x0=t_glob_guess_cl[i],
-                                             args=(tck_cl, track_cl[i, :2]),
-                                             disp=False)
+        closest_t_glob_cl = calc_closest_t_glob(t_glob=closest_t_glob_cl,
+                                                tck=tck_cl,
+                                                p=track_cl[:, :2],
+                                                max_step=1.0 / (no_points_lencalc_cl - 1))
 
-        # evaluate B spline on the basis of t_glob to obtain the closest point
-        closest_point_cl[i] = interpolate.splev(closest_t_glob_cl[i], tck_cl)
+        # keep the parameter of every point in the period of its start guess such that it increases along the track
+        closest_t_glob_cl = t_glob_guess_cl + np.mod(closest_t_glob_cl - t_glob_guess_cl + 0.5, 1.0) - 0.5
 
-        # save distance from closest point to input point
-        dists_cl[i] = math.sqrt(math.pow(closest_point_cl[i, 0] - track_cl[i, 0], 2)
-                                + math.pow(closest_point_cl[i, 1] - track_cl[i, 1], 2))
+        # evaluate B spline on the basis of t_glob to obtain the closest points and their distances to the input points
+        closest_point_cl = np.array(interpolate.splev(closest_t_glob_cl, tck_cl)).T
+        dists_cl = np.hypot(closest_point_cl[:, 0] - track_cl[:, 0], closest_point_cl[:, 1] - track_cl[:, 1])
+        stage_profiler.record_arrays(profiler, track_cl=track_cl, path_smoothed_tmp=path_smoothed_tmp)
+
+    if stats is not None:
+        stats["mean_deviation"] = float(np.mean(dists_cl))
+        stats["max_deviation"] = float(np.amax(np.abs(dists_cl)))
 
     if debug:
         print("Spline approximation: mean deviation %.2fm, maximum deviation %.2fm"
               % (float(np.mean(dists_cl)), float(np.amax(np.abs(dists_cl)))))
 
     # get side of smoothed track compared to the inserted track
-    sides = np.zeros(no_points_track_cl - 1)
-
-    for i in range(no_points_track_cl - 1):
-        sides[i] = side_of_line.side_of_line(a=track_cl[i, :2],
-                                                 b=track_cl[i+1, :2],
-                                                 z=closest_point_cl[i])
+    sides = side_of_line.side_of_line(a=track_cl[:-1, :2].T,
+                                      b=track_cl[1:, :2].T,
+                                      z=closest_point_cl[:-1].T)
 
     sides_cl = np.hstack((sides, sides[0]))
 
@@ -151,13 +193,46 @@ def spline_approximation(track: np.ndarray,
 
 
 # ----------------------------------------------------------------------------------------------------------------------
-# DISTANCE CALCULATION FOR OPTIMIZATION --------------------------------------------------------------------------------
+# DISTANCE MINIMIZATION ------------------------------------------------------------------------------------------------
 # ----------------------------------------------------------------------------------------------------------------------
 
-# return distance from point p to a point on the spline at spline parameter t_glob
-def dist_to_p(t_glob: np.ndarray, path: list, p: np.ndarray):
-    s = interpolate.splev(t_glob, path)
-    return spatial.distance.euclidean(p, s)
+def calc_closest_t_glob(t_glob: np.ndarray,
+                        tck: tuple,
+                        p: np.ndarray,
+                        max_step: float,
+                        max_iter: int = 20,
+                        tol: float = 1e-10) -> np.ndarray:
+    """
+    Refine the start guesses t_glob of the spline parameters of the closest points on a closed B spline to the points p
+    [x, y] using Newton iterations on the squared distance. All points are processed at once, steps are limited to
+    max_step (e.g. the spacing of the samples the guesses were taken from).
+    """
+
+    from scipy import interpolate
+
+    t_glob = np.copy(t_glob)
+
+    for _ in range(max_iter):
+        t_eval = np.mod(t_glob, 1.0)
+        s = np.array(interpolate.splev(t_eval, tck)).T
+        s_d = np.array(interpolate.splev(t_eval, tck, der=1)).T
+        s_dd = np.array(interpolate.splev(t_eval, tck, der=2)).T
+
+        # first and second derivative of 0.5 * |s(t) - p|² with respect to t
+        diff = s - p
+        f_d = np.sum(diff * s_d, axis=1)
+        f_dd = np.sum(s_d * s_d, axis=1) + np.sum(diff * s_dd, axis=1)
+
+        # Newton step (only where the distance function is locally convex)
+        step = np.zeros(t_glob.size)
+        convex = f_dd > 0.0
+        step[convex] = np.clip(f_d[convex] / f_dd[convex], -max_step, max_step)
+        t_glob -= step
+
+        if np.amax(np.abs(step)) < tol:
+            break
+
+    return t_glob
 
 
 # testing --------------------------------------------------------------------------------------------------------------
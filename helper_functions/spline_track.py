@@ -0,0 +1,216 @@
+import numpy as np
+import math
+from helper_functions import calc_spline_lengths, calc_head_curv_an, import_traj_splines, normalize_psi
+
+
+class SplineTrack(object):
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Runtime representation of a closed track given by its cubic splines (e.g. outputs/<map>_splines.csv) for the
+    conversion between Cartesian poses and Frenet coordinates (s, d). Single poses and batches of poses (e.g. the
+    particles of a particle filter) are processed in one vectorized call.
+
+    Conventions (same as in the other helper functions):
+    s:      distance along the track starting at the first spline (wraps around at the track length s_tot)
+    d:      lateral distance along the normal vector [y', -x'] / |P'|, i.e. positive to the right
+    psi:    heading with psi = 0 being north, normalized to [-pi, pi[
+
+    The progress within a spline is assumed to be proportional to the spline parameter t (as in interp_splines).
+
+    Inputs:
+    coeffs_x:           coefficient matrix of the x splines with size (no_splines x 4)
+    coeffs_y:           coefficient matrix of the y splines with size (no_splines x 4)
+    spline_lengths:     lengths of the splines (calculated if not provided)
+    samples_per_spline: number of points per spline used for the initial guess of the projection
+    """
+
+    def __init__(self,
+                 coeffs_x: np.ndarray,
+                 coeffs_y: np.ndarray,
+                 spline_lengths: np.ndarray = None,
+                 samples_per_spline: int = 10):
+
+        from scipy import spatial
+
+        if coeffs_x.shape[0] != coeffs_y.shape[0]:
+            raise RuntimeError("Coefficient matrices must have the same length!")
+
+        if spline_lengths is None:
+            spline_lengths = calc_spline_lengths.calc_spline_lengths(coeffs_x=coeffs_x, coeffs_y=coeffs_y)
+
+        self.coeffs_x = np.asarray(coeffs_x, dtype=float)
+        self.coeffs_y = np.asarray(coeffs_y, dtype=float)
+        self.spline_lengths = np.asarray(spline_lengths, dtype=float)
+        self.no_splines = self.coeffs_x.shape[0]
+
+        # arc length table
+        self.s_start = np.concatenate(([0.0], np.cumsum(self.spline_lengths)[:-1]))
+        self.s_tot = float(np.sum(self.spline_lengths))
+
+        # segment index: KD-tree on densely sampled points of all splines
+        t_samples = np.arange(samples_per_spline) / samples_per_spline
+        self._sample_inds = np.repeat(np.arange(self.no_splines), samples_per_spline)
+        self._sample_t = np.tile(t_samples, self.no_splines)
+        self._tree = spatial.cKDTree(self._eval(self._sample_inds, self._sample_t)[0])
+
+    @classmethod
+    def from_file(cls,
+                  file_path: str,
+                  samples_per_spline: int = 10):
+        """
+        Create the track from a spline file written by export_traj_splines [s_m, a0, a1, a2, a3, b0, b1, b2, b3].
+        """
+
+        spline_data = import_traj_splines.import_traj_splines(file_path=file_path)
+
+        return cls(coeffs_x=spline_data[:, 1:5],
+                   coeffs_y=spline_data[:, 5:9],
+                   spline_lengths=spline_data[:, 0],
+                   samples_per_spline=samples_per_spline)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # CARTESIAN -> FRENET ----------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def project(self,
+                xy: np.ndarray,
+                psi: np.ndarray = None,
+                newton_iters: int = 5) -> tuple:
+        """
+        Project poses onto the track.
+
+        Inputs:
+        xy:             positions [x, y] (single position or array of positions with size (n x 2))
+        psi:            headings of the poses (optional)
+        newton_iters:   number of Newton iterations refining the closest point on the splines
+
+        Outputs:
+        s:              distance along the track of the closest points
+        d:              lateral distances of the positions (positive to the right)
+        psi_err:        heading errors psi - psi_track (None if psi is not provided)
+        """
+
+        xy = np.asarray(xy, dtype=float)
+        single = xy.ndim == 1
+        xy = np.atleast_2d(xy)
+
+        # initial guess from the closest sample
+        idx_sample = self._tree.query(xy)[1]
+        ind_spls = self._sample_inds[idx_sample]
+        t_spls = self._sample_t[idx_sample]
+
+        # refine the closest points by Newton iterations on the squared distance, move to the neighbouring spline if
+        # the parameter leaves [0, 1]
+        for _ in range(newton_iters):
+            p, p_d, p_dd = self._eval(ind_spls, t_spls, derivatives=True)
+            diff = p - xy
+            f_d = np.sum(diff * p_d, axis=1)
+            f_dd = np.sum(p_d * p_d, axis=1) + np.sum(diff * p_dd, axis=1)
+
+            step = np.zeros(t_spls.size)
+            convex = f_dd > 0.0
+            step[convex] = np.clip(f_d[convex] / f_dd[convex], -0.5, 0.5)
+            t_spls = t_spls - step
+
+            shift = np.floor(t_spls).astype(int)
+            ind_spls = np.mod(ind_spls + shift, self.no_splines)
+            t_spls = t_spls - shift
+
+        t_spls = np.clip(t_spls, 0.0, 1.0)
+
+        p, p_d = self._eval(ind_spls, t_spls, derivatives=True)[:2]
+        normvec = np.column_stack((p_d[:, 1], -p_d[:, 0])) / np.expand_dims(np.hypot(p_d[:, 0], p_d[:, 1]), axis=1)
+
+        s = np.mod(self.s_start[ind_spls] + t_spls * self.spline_lengths[ind_spls], self.s_tot)
+        d = np.sum((xy - p) * normvec, axis=1)
+
+        if psi is not None:
+            psi_track = normalize_psi.normalize_psi(np.arctan2(p_d[:, 1], p_d[:, 0]) - math.pi / 2)
+            psi_err = normalize_psi.normalize_psi(np.atleast_1d(np.asarray(psi, dtype=float)) - psi_track)
+        else:
+            psi_err = None
+
+        if single:
+            return s[0], d[0], None if psi_err is None else psi_err[0]
+
+        return s, d, psi_err
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # FRENET -> CARTESIAN ----------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def to_cartesian(self,
+                     s: np.ndarray,
+                     d: np.ndarray = 0.0) -> np.ndarray:
+        """
+        Calculate the positions [x, y] of the Frenet coordinates (s, d) (s wraps around at the track length).
+        """
+
+        single = np.ndim(s) == 0
+        ind_spls, t_spls = self.calc_spline_coords(s=np.atleast_1d(s))
+
+        p, p_d = self._eval(ind_spls, t_spls, derivatives=True)[:2]
+        normvec = np.column_stack((p_d[:, 1], -p_d[:, 0])) / np.expand_dims(np.hypot(p_d[:, 0], p_d[:, 1]), axis=1)
+        xy = p + normvec * np.expand_dims(np.broadcast_to(d, t_spls.shape), axis=1)
+
+        return xy[0] if single else xy
+
+    def calc_head_curv(self,
+                       s: np.ndarray,
+                       calc_dcurv: bool = False) -> tuple:
+        """
+        Calculate heading psi, curvature kappa (and its derivative dkappa if calc_dcurv is True) of the track at the
+        distances s, see calc_head_curv_an.
+        """
+
+        ind_spls, t_spls = self.calc_spline_coords(s=np.atleast_1d(s))
+
+        return calc_head_curv_an.calc_head_curv_an(coeffs_x=self.coeffs_x,
+                                                   coeffs_y=self.coeffs_y,
+                                                   ind_spls=ind_spls,
+                                                   t_spls=t_spls,
+                                                   calc_dcurv=calc_dcurv)
+
+    def calc_spline_coords(self,
+                           s: np.ndarray) -> tuple:
+        """
+        Get the spline indices and spline parameters t of the distances s (s wraps around at the track length).
+        """
+
+        s = np.mod(np.asarray(s, dtype=float), self.s_tot)
+        ind_spls = np.minimum(np.searchsorted(self.s_start, s, side="right") - 1, self.no_splines - 1)
+        t_spls = np.clip((s - self.s_start[ind_spls]) / self.spline_lengths[ind_spls], 0.0, 1.0)
+
+        return ind_spls, t_spls
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # SPLINE EVALUATION ------------------------------------------------------------------------------------------------
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def _eval(self,
+              ind_spls: np.ndarray,
+              t_spls: np.ndarray,
+              derivatives: bool = False) -> tuple:
+
+        c_x = self.coeffs_x[ind_spls]
+        c_y = self.coeffs_y[ind_spls]
+        t = np.expand_dims(t_spls, axis=1)
+
+        c = np.stack((c_x, c_y), axis=2)        # n x 4 x 2
+        p = ((c[:, 3] * t + c[:, 2]) * t + c[:, 1]) * t + c[:, 0]
+
+        if not derivatives:
+            return p,
+
+        p_d = (3 * c[:, 3] * t + 2 * c[:, 2]) * t + c[:, 1]
+        p_dd = 6 * c[:, 3] * t + 2 * c[:, 2]
+
+        return p, p_d, p_dd
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
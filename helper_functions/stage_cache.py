@@ -0,0 +1,172 @@
+import numpy as np
+import hashlib
+import json
+import os
+
+# increase if the results of the cached stages change for identical inputs (invalidates all existing cache entries)
+STAGE_CACHE_VERSION = 4
+
+
+class StageCache(object):
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Content-addressed on-disk cache for the outputs of the pipeline stages in centerline_generation.py. Every stage
+    output is stored under a key built from the hash of the stage's inputs and of the parameters it actually uses.
+    Downstream stages use the key of their upstream stage as input, i.e. a changed parameter invalidates the stage using
+    it and all stages downstream of it, while the upstream stages are replayed from the cache.
+
+    The entries are .npz files, the least recently used ones are evicted if the total size exceeds max_bytes.
+
+    Inputs:
+    cache_dir:      folder of the cache entries (created if it does not exist)
+    max_bytes:      maximum total size of the cache entries in bytes
+    """
+
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int = 1 << 30):
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def run(self,
+            stage: str,
+            inputs: dict,
+            func,
+            debug: bool = False) -> tuple:
+        """
+        Return the cached outputs of a stage or run the stage and cache its outputs.
+
+        Inputs:
+        stage:          name of the stage
+        inputs:         everything the stage outputs depend on {name: value} (arrays, bytes, upstream keys or json
+                        serializable parameters)
+        func:           function without arguments running the stage, returns a tuple of arrays (or None)
+        debug:          print whether the stage was replayed from the cache
+
+        Outputs:
+        outputs:        outputs of the stage
+        key:            key of the stage outputs (input of downstream stages)
+        """
+
+        key = self.calc_key(stage=stage, inputs=inputs)
+        outputs = self.load(key=key)
+
+        if outputs is not None:
+            if debug:
+                print("INFO: Stage %s replayed from stage cache" % stage)
+
+            return outputs, key
+
+        outputs = func()
+        self.store(key=key, outputs=outputs)
+
+        return outputs, key
+
+    @staticmethod
+    def calc_key(stage: str,
+                 inputs: dict) -> str:
+
+        sha1 = hashlib.sha1()
+        sha1.update(("%s;%i" % (stage, STAGE_CACHE_VERSION)).encode())
+
+        for name in sorted(inputs):
+            value = inputs[name]
+            sha1.update((";" + name + "=").encode())
+
+            if isinstance(value, np.ndarray):
+                value = np.ascontiguousarray(value)
+                sha1.update(("%s%s" % (value.dtype.str, value.shape)).encode())
+                sha1.update(value.tobytes())
+            elif isinstance(value, bytes):
+                sha1.update(value)
+            else:
+                sha1.update(json.dumps(value, sort_keys=True, default=_to_json).encode())
+
+        return stage + "_" + sha1.hexdigest()
+
+    def load(self,
+             key: str):
+
+        file_path = os.path.join(self.cache_dir, key + ".npz")
+
+        try:
+            with np.load(file_path) as data:
+                outputs = tuple(data["out_%i" % i] if "out_%i" % i in data.files else None
+                                for i in range(int(data["no_outputs"])))
+
+            # mark entry as recently used
+            os.utime(file_path)
+
+        except (OSError, KeyError, ValueError):
+            return None
+
+        return outputs
+
+    def store(self,
+              key: str,
+              outputs: tuple) -> None:
+
+        file_path = os.path.join(self.cache_dir, key + ".npz")
+        data = {"out_%i" % i: np.asarray(output) for i, output in enumerate(outputs) if output is not None}
+
+        try:
+            tmp_path = "%s.%i.tmp" % (file_path, os.getpid())
+            with open(tmp_path, 'wb') as fh:
+                np.savez(fh, no_outputs=len(outputs), **data)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            # caching is optional, e.g. in case of a read-only file system
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the total size of the cache is below max_bytes.
+        """
+
+        entries = []
+
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".npz"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, file_name))
+                except OSError:
+                    # removed by a concurrent process
+                    continue
+
+                entries.append((stat.st_mtime_ns, stat.st_size, file_name))
+
+        entries.sort()
+        total_bytes = sum(entry[1] for entry in entries)
+
+        for _, size, file_name in entries:
+            if total_bytes <= self.max_bytes:
+                break
+
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except OSError:
+                pass
+
+            total_bytes -= size
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError("Stage input of type %s cannot be hashed!" % type(value).__name__)
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
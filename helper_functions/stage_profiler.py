@@ -0,0 +1,235 @@
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+
+
+class StageHooks(object):
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Hook interface of StageProfiler. Subclass it and override the methods to attach an own tracer (e.g. to open and close
+    spans), then register it by StageProfiler.add_hook().
+    """
+
+    def on_stage_start(self,
+                       path: str,
+                       depth: int) -> None:
+        """
+        Called when the stage path (names of the nested stages joined by "/") starts.
+        """
+
+        pass
+
+    def on_stage_end(self,
+                     record: dict) -> None:
+        """
+        Called with the record of a stage (see StageProfiler) when it ends (also if it raised an exception).
+        """
+
+        pass
+
+
+class StageProfiler(object):
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Records wall time, CPU time, peak traced memory and array sizes of the (nested) stages of the pipeline. The helper
+    functions take an optional profiler argument and wrap their stages by profile_stage(), which does nothing if no
+    profiler is given.
+
+    The peak memory is traced by tracemalloc (only allocations by Python and numpy are covered). It is the peak of the
+    traced memory during the stage relative to the memory traced at its start. Python < 3.9 cannot reset the peak, the
+    peak since the start of the profiler is reported there instead.
+
+    Inputs:
+    trace_memory:   trace memory allocations (slows down the execution)
+    hooks:          list of StageHooks
+    """
+
+    def __init__(self,
+                 trace_memory: bool = True,
+                 hooks: list = None):
+
+        self.trace_memory = trace_memory
+        self.hooks = list(hooks) if hooks is not None else []
+        self.records = []
+
+        self._stack = []
+        self._started_tracing = False
+
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def add_hook(self,
+                 hook: StageHooks) -> None:
+
+        self.hooks.append(hook)
+
+    def close(self) -> None:
+        """
+        Stop the memory tracing if it was started by the profiler.
+        """
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self,
+              name: str):
+
+        path = "/".join([frame["record"]["path"] for frame in self._stack[-1:]] + [name])
+        record = {"path": path,
+                  "name": name,
+                  "depth": len(self._stack),
+                  "wall_time": None,
+                  "cpu_time": None,
+                  "peak_memory": None,
+                  "arrays": {}}
+        self.records.append(record)
+
+        frame = {"record": record, "mem_start": 0, "mem_peak": 0}
+
+        if self.trace_memory:
+            self._update_peak()
+            frame["mem_start"] = frame["mem_peak"] = tracemalloc.get_traced_memory()[0]
+            _reset_peak()
+
+        self._stack.append(frame)
+
+        for hook in self.hooks:
+            hook.on_stage_start(path=path, depth=record["depth"])
+
+        t_wall = time.perf_counter()
+        t_cpu = time.process_time()
+
+        try:
+            yield record
+
+        finally:
+            record["wall_time"] = time.perf_counter() - t_wall
+            record["cpu_time"] = time.process_time() - t_cpu
+
+            if self.trace_memory:
+                self._update_peak()
+                record["peak_memory"] = frame["mem_peak"] - frame["mem_start"]
+
+            self._stack.pop()
+
+            # the peak of a nested stage is part of the peak of its parent
+            if self.trace_memory and self._stack:
+                self._stack[-1]["mem_peak"] = max(self._stack[-1]["mem_peak"], frame["mem_peak"])
+                _reset_peak()
+
+            for hook in self.hooks:
+                hook.on_stage_end(record=record)
+
+    def record_arrays(self,
+                      **arrays) -> None:
+        """
+        Record shape and size of arrays (given as keyword arguments) in the currently running stage.
+        """
+
+        import numpy as np
+
+        if not self._stack:
+            return
+
+        for name, array in arrays.items():
+            if array is not None:
+                array = np.asarray(array)
+                self._stack[-1]["record"]["arrays"][name] = {"shape": list(array.shape), "nbytes": int(array.nbytes)}
+
+    def _update_peak(self) -> None:
+        if self._stack:
+            self._stack[-1]["mem_peak"] = max(self._stack[-1]["mem_peak"], tracemalloc.get_traced_memory()[1])
+
+    def get_report(self) -> dict:
+
+        return {"stages": self.records}
+
+    def write_json(self,
+                   file_path: str) -> None:
+
+        with open(file_path, 'w') as fh:
+            json.dump(self.get_report(), fh, indent=2)
+
+    def write_prometheus(self,
+                         file_path: str,
+                         labels: dict = None) -> None:
+        """
+        Write the stage metrics in the Prometheus text exposition format (e.g. for the node exporter's textfile
+        collector). The file is replaced atomically such that a scraper never reads a partial file.
+        """
+
+        metrics = [("wall_time", "centerline_stage_wall_seconds", "Wall time of the pipeline stage"),
+                   ("cpu_time", "centerline_stage_cpu_seconds", "CPU time of the pipeline stage"),
+                   ("peak_memory", "centerline_stage_peak_memory_bytes", "Peak traced memory of the pipeline stage"),
+                   ("array_bytes", "centerline_stage_array_bytes", "Size of the recorded arrays of the pipeline stage")]
+
+        label_str = "".join(',%s="%s"' % (key, _escape_label(value)) for key, value in sorted((labels or {}).items()))
+        lines = []
+
+        for key, metric, description in metrics:
+            lines.append("# HELP %s %s" % (metric, description))
+            lines.append("# TYPE %s gauge" % metric)
+
+            for record in self.records:
+                if key == "array_bytes":
+                    value = sum(array["nbytes"] for array in record["arrays"].values())
+                else:
+                    value = record[key]
+
+                if value is not None:
+                    lines.append('%s{stage="%s"%s} %s' % (metric, _escape_label(record["path"]), label_str, repr(value)))
+
+        tmp_path = "%s.%i.tmp" % (file_path, os.getpid())
+
+        with open(tmp_path, 'w') as fh:
+            fh.write("\n".join(lines) + "\n")
+
+        os.replace(tmp_path, file_path)
+
+
+def profile_stage(profiler: StageProfiler,
+                  name: str):
+    """
+    Context manager profiling a stage if a profiler is given (does nothing otherwise).
+    """
+
+    if profiler is None:
+        return contextlib.nullcontext()
+
+    return profiler.stage(name=name)
+
+
+def record_arrays(profiler: StageProfiler,
+                  **arrays) -> None:
+    """
+    Record array sizes in the currently running stage if a profiler is given (does nothing otherwise).
+    """
+
+    if profiler is not None:
+        profiler.record_arrays(**arrays)
+
+
+def _reset_peak() -> None:
+    # available from Python 3.9
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# testing --------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,380 @@
+import numpy as np
+import argparse
+import os
+
+"""
+This script converts a map (.png or .pgm + .yaml) into a reference track .csv (centerline + track widths) that can be
+fed into centerline_generation.py. It replaces the cells of map_converter.ipynb by a non-recursive pipeline:
+
+1. threshold the map image (free space is white)
+2. Euclidean distance transform (distance of every free pixel to the nearest wall)
+3. threshold the distance transform and skeletonize it to extract the centerline pixels
+4. build the 8-neighbour adjacency of the skeleton pixels and prune spurs
+5. order the centerline pixels by an iterative depth-first search
+6. transform from the pixel to the meter coordinate frame
+"""
+
+# neighbour order of the depth-first search (same as in map_converter.ipynb)
+DIRECTIONS = np.array([(0, -1), (-1, 0), (0, 1), (1, 0), (-1, 1), (-1, -1), (1, 1), (1, -1)])
+
+
+def load_map(map_name: str,
+             map_dir: str) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Load the map image (flipped such that the row index increases with y) and its metadata. The image is kept as uint8
+    grid, binary PGM files are memory-mapped instead of being read into memory.
+
+    Inputs:
+    map_name:       name of the map
+    map_dir:        folder containing <map_name>.png or <map_name>.pgm and <map_name>.yaml
+
+    Outputs:
+    raw_map_img:    map image (uint8)
+    resolution:     map resolution in m/pixel
+    origin:         map origin [x_m, y_m, yaw]
+    """
+
+    import yaml
+    from PIL import Image
+
+    if os.path.exists(os.path.join(map_dir, map_name + ".png")):
+        # compressed format -> has to be decoded, but only as 8 bit grayscale
+        raw_map_img = np.asarray(Image.open(os.path.join(map_dir, map_name + ".png")).convert("L"))
+    elif os.path.exists(os.path.join(map_dir, map_name + ".pgm")):
+        raw_map_img = _load_pgm(os.path.join(map_dir, map_name + ".pgm"))
+    else:
+        raise IOError("Map %s not found in %s!" % (map_name, map_dir))
+
+    with open(os.path.join(map_dir, map_name + ".yaml"), 'r') as fh:
+        map_metadata = yaml.safe_load(fh)
+
+    # flipped view, no copy
+    return raw_map_img[::-1], map_metadata['resolution'], map_metadata['origin']
+
+
+def _load_pgm(file_path: str) -> np.ndarray:
+    # header: magic number, width, height, maxval separated by whitespace (comments start with #), then a single
+    # whitespace character followed by the pixel data
+    with open(file_path, 'rb') as fh:
+        data = fh.read(1024)
+
+    tokens = []
+    pos = 0
+
+    while len(tokens) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+
+        if data[pos:pos + 1] == b"#":
+            pos = data.index(b"\n", pos)
+            continue
+
+        start = pos
+        while not data[pos:pos + 1].isspace():
+            pos += 1
+        tokens.append(data[start:pos])
+
+    if tokens[0] != b"P5":
+        # ASCII or other formats cannot be memory-mapped
+        from PIL import Image
+
+        return np.asarray(Image.open(file_path).convert("L"))
+
+    width, height, maxval = int(tokens[1]), int(tokens[2]), int(tokens[3])
+
+    if maxval > 255:
+        raise IOError("Only 8 bit PGM maps are supported!")
+
+    return np.memmap(file_path, dtype=np.uint8, mode='r', offset=pos + 1, shape=(height, width))
+
+
+def calc_skeleton(raw_map_img: np.ndarray,
+                  threshold: float = 0.17,
+                  crop_margin: int = 2) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Extract the centerline pixels of the map by skeletonizing the thresholded distance transform. The map is cropped to
+    the bounding box of the free space before the distance transform, the unknown area around the track is not
+    processed. The result is exact as long as crop_margin >= 1, since the crop border then consists of walls only.
+
+    Inputs:
+    raw_map_img:    map image (free space > 210, walls and unknown space <= 210)
+    threshold:      pixels with a distance to the walls below threshold * maximum distance are removed before
+                    skeletonizing (increase it if hairy lines are generated)
+    crop_margin:    margin around the bounding box of the free space in pixels
+
+    Outputs:
+    dist_transform: distance of every pixel of the cropped map to the nearest wall in pixels
+    skeleton:       boolean image of the centerline pixels of the cropped map
+    offset:         [x, y] pixel coordinates of the cropped map's origin in the full map
+    """
+
+    from scipy import ndimage
+    from skimage.morphology import skeletonize
+
+    if crop_margin < 1:
+        raise ValueError("crop_margin must be at least 1 pixel!")
+
+    map_img = raw_map_img > 210
+
+    rows = np.flatnonzero(np.any(map_img, axis=1))
+    cols = np.flatnonzero(np.any(map_img, axis=0))
+
+    if rows.size == 0:
+        raise RuntimeError("Map does not contain any free space!")
+
+    # crop (padding with walls where the margin exceeds the map)
+    row_start = rows[0] - crop_margin
+    col_start = cols[0] - crop_margin
+    map_img_crop = np.zeros((rows[-1] - row_start + crop_margin + 1, cols[-1] - col_start + crop_margin + 1),
+                            dtype=bool)
+    map_img_crop[rows[0] - row_start:rows[-1] - row_start + 1, cols[0] - col_start:cols[-1] - col_start + 1] = \
+        map_img[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    del map_img
+
+    dist_transform = ndimage.distance_transform_edt(map_img_crop).astype(np.float32)
+    skeleton = skeletonize(dist_transform > threshold * dist_transform.max())
+
+    return dist_transform, skeleton, np.array([col_start, row_start])
+
+
+def calc_skeleton_graph(skeleton: np.ndarray) -> tuple:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Build the 8-neighbour adjacency of the skeleton pixels in CSR layout. The neighbours of every pixel are stored in
+    the order of DIRECTIONS.
+
+    Inputs:
+    skeleton:       boolean image of the centerline pixels
+
+    Outputs:
+    pixels:         [x, y] coordinates of the skeleton pixels
+    indptr:         neighbours of pixel i are indices[indptr[i]:indptr[i + 1]]
+    indices:        pixel indices of the neighbours
+    """
+
+    ys, xs = np.nonzero(skeleton)
+    pixels = np.column_stack((xs, ys))
+    no_pixels = pixels.shape[0]
+
+    # pixel index image with a border of -1 such that no bounds checks are required
+    idx_img = np.full((skeleton.shape[0] + 2, skeleton.shape[1] + 2), -1, dtype=np.int32)
+    idx_img[ys + 1, xs + 1] = np.arange(no_pixels)
+
+    # neighbour table (no_pixels x 8), -1 where there is no neighbour
+    nbrs = idx_img[ys[:, None] + 1 + DIRECTIONS[:, 1], xs[:, None] + 1 + DIRECTIONS[:, 0]]
+
+    mask = nbrs >= 0
+    indptr = np.concatenate(([0], np.cumsum(np.sum(mask, axis=1))))
+    indices = nbrs[mask]
+
+    return pixels, indptr, indices
+
+
+def prune_skeleton_graph(indptr: np.ndarray,
+                         indices: np.ndarray) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Remove spurs (branches ending in a dead end) from the skeleton graph by repeatedly peeling off pixels with at most
+    one remaining neighbour. Only the closed loops of the skeleton remain. The runtime is linear in the number of
+    pixels.
+
+    Inputs:
+    indptr:         CSR index pointer of the skeleton graph
+    indices:        CSR neighbour indices of the skeleton graph
+
+    Outputs:
+    keep:           boolean mask of the pixels that remain after pruning
+    """
+
+    degree = np.diff(indptr)
+    keep = np.ones(degree.size, dtype=bool)
+    stack = list(np.flatnonzero(degree <= 1))
+    keep[stack] = False
+
+    while stack:
+        i = stack.pop()
+
+        for j in indices[indptr[i]:indptr[i + 1]]:
+            if keep[j]:
+                degree[j] -= 1
+
+                if degree[j] <= 1:
+                    keep[j] = False
+                    stack.append(j)
+
+    return keep
+
+
+def order_skeleton(indptr: np.ndarray,
+                   indices: np.ndarray,
+                   start: int,
+                   keep: np.ndarray = None) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Order the skeleton pixels by a depth-first search starting at pixel start. The visiting order is the same as the one
+    of the recursive search in map_converter.ipynb, but an explicit stack is used such that no recursion limit applies.
+    The runtime is linear in the number of pixels.
+
+    Inputs:
+    indptr:         CSR index pointer of the skeleton graph
+    indices:        CSR neighbour indices of the skeleton graph
+    start:          index of the start pixel
+    keep:           boolean mask of the pixels to consider (all pixels if None)
+
+    Outputs:
+    order:          pixel indices in the order of visiting
+    """
+
+    visited = np.zeros(indptr.size - 1, dtype=bool) if keep is None else ~keep
+    visited[start] = True
+    order = [start]
+
+    # stack of [pixel index, position of the next neighbour to check]
+    stack = [[start, indptr[start]]]
+
+    while stack:
+        top = stack[-1]
+        i, pos = top
+
+        while pos < indptr[i + 1] and visited[indices[pos]]:
+            pos += 1
+
+        if pos == indptr[i + 1]:
+            stack.pop()
+            continue
+
+        top[1] = pos + 1
+        j = indices[pos]
+        visited[j] = True
+        order.append(j)
+        stack.append([j, indptr[j]])
+
+    return np.array(order)
+
+
+def calc_start_pixel(pixels: np.ndarray,
+                     keep: np.ndarray,
+                     start_row: int,
+                     offset: np.ndarray) -> int:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Get the start pixel of the search: the first remaining skeleton pixel in row start_row scanning from the left (as
+    in map_converter.ipynb) or, if there is none, the remaining pixel closest to the left end of this row. start_row
+    and the distances refer to the full map, pixels to the cropped map with its origin at offset [x, y] (see
+    calc_skeleton), i.e. the result does not depend on the cropping.
+    """
+
+    inds = np.flatnonzero(keep)
+
+    if inds.size == 0:
+        raise RuntimeError("No closed centerline found, check the map or decrease the threshold!")
+
+    in_row = inds[pixels[inds, 1] + offset[1] == start_row]
+
+    if in_row.size > 0:
+        return in_row[np.argmin(pixels[in_row, 0])]
+
+    return inds[np.argmin(np.hypot(pixels[inds, 0] + offset[0], pixels[inds, 1] + offset[1] - start_row))]
+
+
+def convert_map(map_name: str,
+                map_dir: str = "maps",
+                threshold: float = 0.17,
+                track_width_margin: float = 0.0,
+                start_row: int = None) -> np.ndarray:
+    """
+    Created by:
+    Weiqi Lyu
+
+    Documentation:
+    Convert a map into a reference track.
+
+    Inputs:
+    map_name:           name of the map
+    map_dir:            folder containing the map image and .yaml
+    threshold:          relative threshold of the distance transform before skeletonizing
+    track_width_margin: extra safety margin subtracted from the track widths in m
+    start_row:          image row (from the bottom) in which the ordered centerline starts (200 rows above the map
+                        center if None as in map_converter.ipynb, the map center if this row is outside of the map)
+
+    Outputs:
+    track:              [x_m, y_m, w_tr_right_m, w_tr_left_m]
+    """
+
+    raw_map_img, resolution, origin = load_map(map_name=map_name, map_dir=map_dir)
+    map_height = raw_map_img.shape[0]
+    dist_transform, skeleton, offset = calc_skeleton(raw_map_img=raw_map_img, threshold=threshold)
+    del raw_map_img
+
+    pixels, indptr, indices = calc_skeleton_graph(skeleton=skeleton)
+    keep = prune_skeleton_graph(indptr=indptr, indices=indices)
+
+    if start_row is None:
+        start_row = map_height // 2 + 200 if map_height // 2 + 200 < map_height else map_height // 2
+
+    start = calc_start_pixel(pixels=pixels, keep=keep, start_row=start_row, offset=offset)
+    order = order_skeleton(indptr=indptr, indices=indices, start=start, keep=keep)
+
+    # the skeleton pixels have the track width encoded (distance to the nearest wall)
+    waypoints = pixels[order]
+    widths = dist_transform[waypoints[:, 1], waypoints[:, 0]]
+
+    # pixel -> meter coordinate frame
+    track = np.column_stack((waypoints + offset, widths, widths)) * resolution
+    track += np.array([origin[0], origin[1], -track_width_margin, -track_width_margin])
+
+    return track
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Convert a map (.png/.pgm + .yaml) into a reference track .csv.')
+    parser.add_argument('--map_name', type=str, default='e7_floor5_square', help='Name of the map')
+    parser.add_argument('--map_dir', type=str, default='maps', help='Folder containing the map image and .yaml')
+    parser.add_argument('--output_path', type=str, default='',
+                        help='Path of the exported .csv, defaults to grob_tracks/<map_name>.csv')
+    parser.add_argument('--threshold', type=float, default=0.17,
+                        help='Relative threshold of the distance transform, increase it if hairy lines are generated')
+    parser.add_argument('--track_width_margin', type=float, default=0.0, help='Extra safety margin in m')
+    parser.add_argument('--start_row', type=int, default=None,
+                        help='Image row (from the bottom) in which the centerline starts, defaults to 200 rows above'
+                             ' the map center (as in map_converter.ipynb)')
+    args = parser.parse_args()
+
+    track = convert_map(map_name=args.map_name,
+                        map_dir=args.map_dir,
+                        threshold=args.threshold,
+                        track_width_margin=args.track_width_margin,
+                        start_row=args.start_row)
+
+    output_path = args.output_path
+    if output_path == '':
+        output_path = os.path.join("grob_tracks", args.map_name + ".csv")
+
+    with open(output_path, 'wb') as fh:
+        np.savetxt(fh, track, fmt='%0.4f', delimiter=',', header='x_m,y_m,w_tr_right_m,w_tr_left_m')
+
+    print("Exported %i centerline points to %s" % (track.shape[0], output_path))
+
+
+if __name__ == "__main__":
+    main()